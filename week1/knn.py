@@ -1,10 +1,15 @@
 
 from typing import List
+import sys
+from pathlib import Path
 import pandas as pd
 import numpy as np
 from sklearn.neighbors import NearestNeighbors
 from sklearn.preprocessing import OneHotEncoder
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "week6"))
+import subscription_episodes
+
 MONTH_ORDER = [
     "Frostmere", "Emberfall", "Lunaris", "Verdantia", "Solstice",
     "Duskveil", "Starshade", "Aurorath", "Mysthaven", "Eclipsion"
@@ -37,16 +42,15 @@ def choose_three_adventurers() -> List[str]:
         lambda r: mystical_to_ordinal(r["year"], r["month"], r["day_of_month"]),
         axis=1
     )
-    cancellations["ordinal"] = subscriptions.apply(
+    cancellations["ordinal"] = cancellations.apply(
         lambda r: mystical_to_ordinal(r["year"], r["month"], r["day_of_month"]),
         axis=1
     )
 
-    # Find active subs by getting the most recent date between cancellations and subscriptions.
-    active_subs = pd.merge(subscriptions, cancellations, on=['adventurer_id','publisher_id'],how='outer',suffixes=("_sub", "_cancel"))
-    active_subs["last_event_date"] = active_subs[["ordinal_sub", "ordinal_cancel"]].max(axis=1)
-    active_subs["is_active"] = ((active_subs["ordinal_sub"] == active_subs["last_event_date"]))
-    current_active = active_subs[active_subs["is_active"]]
+    # Active subs are the episodes still running in the subscription-episode table
+    # (week6/subscription_episodes.py), kept up to date next to this week's data.
+    episodes, _ = subscription_episodes.materialize({'subs': subscriptions, 'cancels': cancellations}, './week1')
+    current_active = episodes.active()
 
     # Find the three adventurers with the most amount of views of content from the 'top publisher' :P
     top_pub_id = find_top_publisher()
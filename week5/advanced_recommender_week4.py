@@ -1,6 +1,7 @@
 import numpy as np
 import pandas as pd
 from pathlib import Path
+from latency import timed, record_candidates
 from sklearn.preprocessing import StandardScaler
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.metrics.pairwise import cosine_similarity
@@ -146,6 +147,7 @@ item_hybrid_sim = ALPHA * item_collab_sim + BETA * item_content_sim
 
 print(f"Hybrid weights: {ALPHA} collaborative, {BETA} content-based")
 
+@timed('recommend_hybrid')
 def recommend_hybrid(user_id, n_recs=10):
     """Generate recommendations using hybrid similarity"""
     if user_id not in user_item.index:
@@ -160,10 +162,12 @@ def recommend_hybrid(user_id, n_recs=10):
     user_weights = user_profile[seen_idx]
     scores = (item_hybrid_sim[seen_idx].T * user_weights).sum(axis=1)
     scores[seen_idx] = -np.inf
+    record_candidates('recommend_hybrid', len(scores) - len(seen_idx))
     
     top_idx = np.argsort(-scores)[:n_recs]
     return [user_item.columns[i] for i in top_idx if np.isfinite(scores[i])]
 
+@timed('recommend_baseline')
 def recommend_baseline(user_id, n_recs=2):
     """Baseline collaborative filtering"""
     if user_id not in user_item.index:
@@ -174,6 +178,7 @@ def recommend_baseline(user_id, n_recs=2):
         return []
     scores = (item_collab_sim[seen_idx].T * user_profile[seen_idx]).sum(axis=1)
     scores[seen_idx] = -np.inf
+    record_candidates('recommend_baseline', len(scores) - len(seen_idx))
     top_idx = np.argsort(-scores)[:n_recs]
     return [user_item.columns[i] for i in top_idx if np.isfinite(scores[i])]
 
@@ -0,0 +1,212 @@
+"""
+Arrow IPC cache for the potions tables.
+
+Parquet has to be decompressed and decoded on every script start. The cache
+stores each table once more as an uncompressed Arrow IPC file that is
+memory-mapped on read, so loading is mostly page-ins, not decoding:
+
+- compact schema applied (rec_pipeline.load_table), ordinal column added,
+- IDs (adventurer_id, publisher_id, content_id, playlist_id) interned as
+  dictionary columns against one vocabulary shared by every table in the
+  folder, so they come back as categoricals with identical categories and
+  merges / indexers between tables stay on integer codes.
+
+Every cache file is keyed by the content hash of all the source parquet
+files (plus FORMAT_VERSION), so changing any table rebuilds the cache. The
+hashes are memoized per file size/mtime in the manifest so a warm start
+does not re-read the parquet files.
+
+    cache = ArrowCache(root)
+    views = cache.frame("content_views.parquet")   # pandas, categorical IDs
+    opens = cache.table("app_opens.parquet")       # pyarrow.Table, zero-copy
+
+rp.load_tables(root, cache=True) goes through here.
+"""
+
+import hashlib
+import json
+import mmap
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+import rec_pipeline as rp
+
+ROOT = Path(__file__).resolve().parent
+P = lambda name: ROOT / name
+
+CACHE_DIR_NAME = ".arrow_cache"
+FORMAT_VERSION = 1
+ID_COLUMNS = ['adventurer_id', 'publisher_id', 'content_id', 'playlist_id']
+CACHED_TABLES = sorted(rp.TABLES.values()) + ["app_opens.parquet"]
+
+
+def _files(path):
+    path = Path(path)
+    return sorted(p for p in path.rglob('*') if p.is_file()) if path.is_dir() else [path]
+
+
+class ArrowCache:
+    """Memory-mapped Arrow IPC copies of a week folder's parquet tables."""
+
+    def __init__(self, root=ROOT, cache_dir=None, tables=CACHED_TABLES):
+        self.root = Path(root)
+        self.cache_dir = Path(cache_dir) if cache_dir else self.root / CACHE_DIR_NAME
+        self.tables = [name for name in tables if (self.root / name).exists()]
+        self.manifest_path = self.cache_dir / "manifest.json"
+        self.manifest = json.loads(self.manifest_path.read_text()) if self.manifest_path.exists() \
+            else {'hashes': {}, 'key': None}
+        self._key = None
+        self._categories = {}
+
+    # -- invalidation ------------------------------------------------------
+
+    def source_hash(self, name):
+        """sha1 of a source table's bytes, memoized by (size, mtime) per file."""
+        digest = hashlib.sha1()
+        for path in _files(self.root / name):
+            stat = path.stat()
+            rel = str(path.relative_to(self.root))
+            memo = self.manifest['hashes'].get(rel)
+            if memo is None or memo['size'] != stat.st_size or memo['mtime'] != stat.st_mtime_ns:
+                memo = {'size': stat.st_size, 'mtime': stat.st_mtime_ns,
+                        'sha1': hashlib.sha1(path.read_bytes()).hexdigest()}
+                self.manifest['hashes'][rel] = memo
+            digest.update(rel.encode())
+            digest.update(memo['sha1'].encode())
+        return digest.hexdigest()
+
+    @property
+    def key(self):
+        """Cache key: every source hash (the ID vocabulary spans all tables)."""
+        if self._key is None:
+            digest = hashlib.sha1(f"v{FORMAT_VERSION}".encode())
+            for name in self.tables:
+                digest.update(self.source_hash(name).encode())
+            self._key = digest.hexdigest()[:16]
+        return self._key
+
+    def path(self, name):
+        return self.cache_dir / f"{Path(name).stem}.arrow"
+
+    def is_fresh(self):
+        return self.manifest.get('key') == self.key and all(self.path(n).exists() for n in self.tables)
+
+    # -- build -------------------------------------------------------------
+
+    def vocabulary(self):
+        """Sorted unique values of each ID column across all tables."""
+        values = {col: [] for col in ID_COLUMNS}
+        for name in self.tables:
+            columns = pq.ParquetDataset(self.root / name).schema.names
+            present = [c for c in ID_COLUMNS if c in columns]
+            if present:
+                table = pq.read_table(self.root / name, columns=present)
+                for col in present:
+                    values[col].append(pc.unique(table[col].combine_chunks().cast(pa.string())))
+        vocab = {}
+        for col, arrays in values.items():
+            if arrays:
+                unique = pa.concat_arrays(arrays).unique()
+                vocab[col] = unique.take(pc.sort_indices(unique))
+        return vocab
+
+    def build(self):
+        """(Re)write every table as uncompressed Arrow IPC."""
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        vocab = self.vocabulary()
+        for name in self.tables:
+            df = rp.load_table(self.root, name)
+            if {'year', 'month', 'day_of_month'} <= set(df.columns):
+                rp.add_ordinals(df)
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            for col in ID_COLUMNS:
+                if col in table.column_names:
+                    ids = table[col].combine_chunks().cast(pa.string())
+                    codes = pc.index_in(ids, value_set=vocab[col]).cast(pa.int32())
+                    table = table.set_column(table.schema.get_field_index(col), col,
+                                             pa.DictionaryArray.from_arrays(codes, vocab[col]))
+            tmp = self.path(name).with_suffix('.tmp')
+            with pa.OSFile(str(tmp), 'wb') as sink:
+                with pa.ipc.new_file(sink, table.schema,
+                                     options=pa.ipc.IpcWriteOptions(compression=None)) as writer:
+                    writer.write_table(table)
+            tmp.replace(self.path(name))
+        self.manifest['key'] = self.key
+        self.manifest_path.write_text(json.dumps(self.manifest, indent=2))
+
+    def ensure(self):
+        if not self.is_fresh():
+            self.build()
+        return self
+
+    # -- read --------------------------------------------------------------
+
+    def table(self, name):
+        """Zero-copy pyarrow.Table backed by a memory map of the cache file."""
+        self.ensure()
+        return pa.ipc.open_file(pa.memory_map(str(self.path(name)), 'r')).read_all()
+
+    def frame(self, name):
+        """
+        pandas view of a cached table without decoding it: the file is mapped
+        copy-on-write, numeric columns without nulls are numpy views on the
+        map and dictionary columns categoricals over their mapped indices
+        (each ID vocabulary decoded once per cache). Writes to the frame stay
+        private to the process; only other columns go through to_pandas.
+        """
+        self.ensure()
+        with open(self.path(name), 'rb') as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+        raw = np.frombuffer(mapped, dtype=np.uint8)
+        source = pa.py_buffer(mapped)
+        table = pa.ipc.open_file(pa.BufferReader(source)).read_all()
+        view = lambda array: _mapped_view(array, raw, source.address)
+        columns = {}
+        for field, column in zip(table.schema, table.columns):
+            if pa.types.is_dictionary(field.type):
+                columns[field.name] = self._categorical(field.name, column, view)
+            elif (pa.types.is_integer(field.type) or pa.types.is_floating(field.type)) \
+                    and column.null_count == 0:
+                columns[field.name] = _concat([view(chunk) for chunk in column.chunks], field.type)
+            else:
+                columns[field.name] = column.to_pandas()
+        return pd.DataFrame(columns, copy=False)
+
+    def _categorical(self, col, column, view):
+        chunks = column.chunks
+        dictionary = chunks[0].dictionary if chunks else pa.array([], column.type.value_type)
+        if column.null_count:
+            codes = pa.chunked_array([c.indices for c in chunks], column.type.index_type) \
+                .fill_null(-1).to_numpy()
+        else:
+            codes = _concat([view(c.indices) for c in chunks], column.type.index_type)
+        if col in ID_COLUMNS:
+            # Every table shares the vocabulary, so its decoded categories are reused
+            if col not in self._categories:
+                self._categories[col] = pd.Index(dictionary.to_pandas())
+            categories = self._categories[col]
+        else:
+            categories = pd.Index(dictionary.to_pandas())
+        return pd.Categorical.from_codes(codes, dtype=pd.CategoricalDtype(categories), validate=False)
+
+
+def _mapped_view(array, raw, base):
+    """Writable numpy view of a fixed-width Arrow array's values inside the map raw."""
+    dtype = np.dtype(array.type.to_pandas_dtype())
+    data = array.buffers()[1]
+    start = data.address - base + array.offset * dtype.itemsize
+    stop = start + len(array) * dtype.itemsize
+    if start < 0 or stop > len(raw):
+        return array.to_numpy(zero_copy_only=False).copy()
+    return raw[start:stop].view(dtype)
+
+
+def _concat(parts, arrow_type):
+    if len(parts) == 1:
+        return parts[0]
+    return np.concatenate(parts) if parts else np.empty(0, np.dtype(arrow_type.to_pandas_dtype()))
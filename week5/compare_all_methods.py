@@ -1,13 +1,14 @@
+import importlib
 import pandas as pd
 import numpy as np
 from pathlib import Path
-from recommender import recommend_for_user as recommend_collaborative
-from advanced_recommender_week4 import recommend_hybrid, recommend_baseline
-from heuristic_recommender import recommend_trending
+from experiment_store import ExperimentStore
 
 ROOT = Path(__file__).resolve().parent
 P = lambda name: ROOT / name
 
+store = ExperimentStore()
+
 # Load test users from your existing eval
 pre_eval = pd.read_csv(P('pre_eval.csv'))
 test_users = pre_eval['adventurer_id'].tolist()
@@ -15,86 +16,79 @@ test_users = pre_eval['adventurer_id'].tolist()
 print(f"Generating recommendations for {len(test_users)} users...")
 print("="*60)
 
-# Generate recommendations from all 3 methods
-results = {
-    'collaborative': [],
-    'content_based': [],  # Use your hybrid's content component
-    'heuristic': []
+# method -> (module, function, source files the output depends on)
+# The recommender modules build their models at import time, so they are only
+# imported when the experiment store has no result for the current data/code.
+METHODS = {
+    'collaborative': ('advanced_recommender_week4', 'recommend_baseline',
+                      ['advanced_recommender_week4.py']),
+    # Content-based: use the hybrid - it has 40% content-based
+    'content_based': ('advanced_recommender_week4', 'recommend_hybrid',
+                      ['advanced_recommender_week4.py']),
+    'heuristic': ('heuristic_recommender', 'recommend_trending',
+                  ['heuristic_recommender.py']),
 }
 
-error_counts = {'collaborative': 0, 'content_based': 0, 'heuristic': 0}
 
-for i, user_id in enumerate(test_users, 1):
-    print(f"\n[{i}/{len(test_users)}] User: {user_id}")
-    
-    # Collaborative (your baseline)
-    try:
-        collab = recommend_baseline(user_id, n_recs=2)
-        results['collaborative'].append({
-            'adventurer_id': user_id,
-            'rec1': collab[0] if len(collab) > 0 else None,
-            'rec2': collab[1] if len(collab) > 1 else None
-        })
-        print(f"  ✓ Collaborative: {collab[:2]}")
-    except Exception as e:
-        print(f"  ✗ Collaborative error: {e}")
-        error_counts['collaborative'] += 1
-        results['collaborative'].append({
-            'adventurer_id': user_id, 'rec1': None, 'rec2': None
-        })
-    
-    # Content-based (extract from your hybrid)
-    # For speed, just use your hybrid - it has 40% content-based
-    try:
-        content = recommend_hybrid(user_id, n_recs=2)
-        results['content_based'].append({
-            'adventurer_id': user_id,
-            'rec1': content[0] if len(content) > 0 else None,
-            'rec2': content[1] if len(content) > 1 else None
-        })
-        print(f"  ✓ Content-based: {content[:2]}")
-    except Exception as e:
-        print(f"  ✗ Content-based error: {e}")
-        error_counts['content_based'] += 1
-        results['content_based'].append({
-            'adventurer_id': user_id, 'rec1': None, 'rec2': None
-        })
-    
-    # Heuristic
-    try:
-        heur = recommend_trending(user_id, n_recs=2)
-        results['heuristic'].append({
+def generate(method, n_recs=2):
+    """Run one recommender over the test users."""
+    module_name, func_name, _ = METHODS[method]
+    recommend = getattr(importlib.import_module(module_name), func_name)
+
+    rows = []
+    errors = 0
+    for i, user_id in enumerate(test_users, 1):
+        try:
+            recs = recommend(user_id, n_recs=n_recs)
+            print(f"  [{i}/{len(test_users)}] {user_id}: {recs[:n_recs]}")
+        except Exception as e:
+            print(f"  [{i}/{len(test_users)}] {user_id}: ✗ error: {e}")
+            errors += 1
+            recs = []
+        rows.append({
             'adventurer_id': user_id,
-            'rec1': heur[0] if len(heur) > 0 else None,
-            'rec2': heur[1] if len(heur) > 1 else None
-        })
-        print(f"  ✓ Heuristic: {heur[:2]}")
-    except Exception as e:
-        print(f"  ✗ Heuristic error: {e}")
-        error_counts['heuristic'] += 1
-        results['heuristic'].append({
-            'adventurer_id': user_id, 'rec1': None, 'rec2': None
+            'rec1': recs[0] if len(recs) > 0 else None,
+            'rec2': recs[1] if len(recs) > 1 else None
         })
 
+    df = pd.DataFrame(rows)
+    success = int(df[['rec1', 'rec2']].notna().sum().sum())
+    return {'successful': success, 'total': len(df) * 2, 'errors': errors}, df
+
+
+results = {}
+for method, (_, _, sources) in METHODS.items():
+    print(f"\n{method.upper()}")
+    record, df = store.run(
+        method,
+        {'n_recs': 2, 'users': test_users},
+        lambda: generate(method),
+        sources=[P(s) for s in sources] + [P('rec_pipeline.py')],
+    )
+    results[method] = (record, df)
+    if record['cached']:
+        print(f"  ✓ Reused stored run {record['key']} (from {record['created']})")
+    else:
+        print(f"  ✓ Generated in {record['seconds']:.1f}s (run {record['key']})")
+
 print("\n" + "="*60)
 print("SUMMARY")
 print("="*60)
 
 # Save all three
-for method, data in results.items():
-    df = pd.DataFrame(data)
+for method, (record, df) in results.items():
     df.to_csv(P(f'{method}_eval.csv'), index=False)
-    
+
     # Count successful recommendations
-    success = df[['rec1', 'rec2']].notna().sum().sum()
-    total = len(df) * 2
-    
+    success = record['metrics']['successful']
+    total = record['metrics']['total']
+
     print(f"\n{method.upper()}:")
     print(f"  ✓ Saved {method}_eval.csv")
     print(f"  ✓ Successful: {success}/{total} recommendations ({success/total*100:.1f}%)")
-    if error_counts[method] > 0:
-        print(f"  ⚠️  Errors: {error_counts[method]} users")
+    if record['metrics']['errors'] > 0:
+        print(f"  ⚠️  Errors: {record['metrics']['errors']} users")
 
 print("\n" + "="*60)
 print("✅ Done! Now run: python evaluate_all_methods.py")
-print("="*60)
\ No newline at end of file
+print("="*60)
@@ -2,6 +2,7 @@ import pandas as pd
 import matplotlib.pyplot as plt
 import numpy as np
 from pathlib import Path
+from experiment_store import ExperimentStore
 
 ROOT = Path(__file__).resolve().parent
 P = lambda name: ROOT / name
@@ -10,15 +11,18 @@ P = lambda name: ROOT / name
 
 print("Generating visualizations for report...")
 
-# Load evaluation results (you'll need to run evaluate_all_methods.py first)
-# For now, let's use placeholder data that you'll update
+# Load evaluation results from the experiment store (run evaluate_all_methods.py
+# first); the placeholder values are used for methods with no stored run.
+store = ExperimentStore()
 
 # Chart 1: Method Performance Comparison
 fig, ax = plt.subplots(figsize=(10, 6))
 
 methods = ['Random\nBaseline', 'Global\nHeuristic', 'Collaborative\nFiltering', 
            'Content-\nBased', 'Hybrid\n(60/40)']
-precision_values = [0.02, 0.30, 0.35, 0.32, 0.42]  # UPDATE THESE WITH REAL VALUES
+precision_values = [0.02] + store.values(
+    ['Global Heuristic', 'Collaborative Filtering', 'Content-Based', 'Hybrid (60/40)'],
+    'precision@2', [0.30, 0.35, 0.32, 0.42], evaluation='all_history')
 
 colors = ['#ff4444', '#ffa500', '#4169e1', '#32cd32', '#9370db']
 bars = ax.bar(methods, precision_values, color=colors, alpha=0.7, edgecolor='black', linewidth=1.5)
@@ -75,8 +79,9 @@ print("✓ Saved user_segmentation.png")
 fig, ax = plt.subplots(figsize=(10, 6))
 
 methods_short = ['Heuristic', 'Collaborative', 'Content', 'Hybrid']
-unique_items = [25, 15, 22, 18]  # UPDATE with real values
-total_items = 37  # For publisher wn32
+coverage_methods = ['Global Heuristic', 'Collaborative Filtering', 'Content-Based', 'Hybrid (60/40)']
+unique_items = store.values(coverage_methods, 'unique_items', [25, 15, 22, 18], evaluation='all_history')
+total_items = max(store.values(coverage_methods, 'scope_items', [37] * 4, evaluation='all_history'))  # For publisher wn32
 
 coverage_pct = [u/total_items*100 for u in unique_items]
 
@@ -101,5 +106,4 @@ print("✓ Saved diversity_analysis.png")
 print("\n✅ All visualizations generated!")
 print("\nTo update with real data:")
 print("1. Run: python evaluate_all_methods.py")
-print("2. Copy the actual precision values into this script")
-print("3. Run this script again: python create_visualizations.py")
\ No newline at end of file
+print("2. Run this script again: python create_visualizations.py (values are read from the experiment store)")
\ No newline at end of file
@@ -1,6 +1,8 @@
 import pandas as pd
 import numpy as np
 from pathlib import Path
+from experiment_store import ExperimentStore
+from rec_pipeline import bootstrap_ci, bootstrap_diff
 
 ROOT = Path(__file__).resolve().parent
 P = lambda name: ROOT / name
@@ -64,6 +66,7 @@ def evaluate_recommendations(csv_file, method_name, content_scope):
     total_users = len(recs_df)
     precision_scores = []
     recall_scores = []
+    scored_users = []
     coverage_violations = 0  # Track recommendations outside scope
     
     for _, row in recs_df.iterrows():
@@ -96,16 +99,32 @@ def evaluate_recommendations(csv_file, method_name, content_scope):
         
         precision_scores.append(precision)
         recall_scores.append(recall)
+        scored_users.append(user_id)
     
     if len(precision_scores) == 0:
         return None
     
+    unique_items = set()
+    for col in ['rec1', 'rec2']:
+        if col in recs_df.columns:
+            unique_items.update(recs_df[col].dropna().unique())
+
+    # 95% bootstrap CIs over users (precision and recall share the resamples)
+    _, ci_low, ci_high = bootstrap_ci(np.column_stack([precision_scores, recall_scores]))
+
     results = {
         'method': method_name,
         'precision@2': np.mean(precision_scores),
+        'precision@2_ci_low': ci_low[0],
+        'precision@2_ci_high': ci_high[0],
         'recall@2': np.mean(recall_scores),
+        'recall@2_ci_low': ci_low[1],
+        'recall@2_ci_high': ci_high[1],
         'users_evaluated': len(precision_scores),
-        'scope_violations': coverage_violations
+        'per_user_precision': dict(zip(scored_users, precision_scores)),
+        'scope_violations': coverage_violations,
+        'unique_items': len(unique_items),
+        'scope_items': len(content_scope)
     }
     
     return results
@@ -121,10 +140,23 @@ methods = [
 
 all_results = []
 
+# Results are recorded in the experiment store; an unchanged CSV + script
+# reuses the stored metrics instead of re-evaluating.
+store = ExperimentStore()
+
 for csv_file, method_name in methods:
-    result = evaluate_recommendations(P(csv_file), method_name, publisher_content_scope)
-    if result:
-        all_results.append(result)
+    if not P(csv_file).exists():
+        print(f"\n❌ {csv_file} not found")
+        continue
+    record, _ = store.run(
+        method_name,
+        {'evaluation': 'all_history', 'recs': csv_file, 'watch_threshold': WATCH_THRESHOLD},
+        lambda: (evaluate_recommendations(P(csv_file), method_name, publisher_content_scope) or {}, None),
+        sources=[Path(__file__)],
+        inputs=[P(csv_file)],
+    )
+    if record['metrics']:
+        all_results.append(record['metrics'])
 
 # Print results
 print("\n" + "="*60)
@@ -134,14 +166,33 @@ print("="*60)
 results_df = pd.DataFrame(all_results)
 results_df = results_df.sort_values('precision@2', ascending=False)
 
-print(f"\n{'Method':<25} {'Precision@2':<15} {'Recall@2':<15} {'Users':<10}")
-print("-"*65)
+print(f"\n{'Method':<25} {'Precision@2 [95% CI]':<24} {'Recall@2 [95% CI]':<24} {'Users':<10}")
+print("-"*83)
 
 for _, row in results_df.iterrows():
-    print(f"{row['method']:<25} {row['precision@2']:<15.3f} {row['recall@2']:<15.3f} {row['users_evaluated']:<10.0f}")
+    p_ci = f"{row['precision@2']:.3f} [{row['precision@2_ci_low']:.3f}, {row['precision@2_ci_high']:.3f}]"
+    r_ci = f"{row['recall@2']:.3f} [{row['recall@2_ci_low']:.3f}, {row['recall@2_ci_high']:.3f}]"
+    print(f"{row['method']:<25} {p_ci:<24} {r_ci:<24} {row['users_evaluated']:<10.0f}")
     if row.get('scope_violations', 0) > 0:
         print(f"  ⚠️  {row['scope_violations']} recommendations outside content scope!")
 
+# Paired bootstrap: is the best method really better than each other one
+# on the users both were evaluated on?
+print("\n" + "="*60)
+print("PAIRED DIFFERENCE VS BEST METHOD (precision@2, 95% CI)")
+print("="*60)
+
+best = results_df.iloc[0]
+for _, row in results_df.iloc[1:].iterrows():
+    common = sorted(set(best['per_user_precision']) & set(row['per_user_precision']))
+    diff, low, high, prob = bootstrap_diff(
+        [best['per_user_precision'][u] for u in common],
+        [row['per_user_precision'][u] for u in common]
+    )
+    verdict = "significant" if low > 0 else "not significant"
+    print(f"{best['method']} - {row['method']:<25} {diff:+.3f} [{low:+.3f}, {high:+.3f}] "
+          f"P(better)={prob:.2f} ({verdict}, {len(common)} users)")
+
 # Calculate improvement over random baseline (assume random = 2%)
 random_baseline = 0.02
 
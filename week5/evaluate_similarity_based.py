@@ -2,6 +2,7 @@ import pandas as pd
 import numpy as np
 from pathlib import Path
 from sklearn.metrics.pairwise import cosine_similarity
+from experiment_store import ExperimentStore
 
 ROOT = Path(__file__).resolve().parent
 P = lambda name: ROOT / name
@@ -111,10 +112,23 @@ print("="*60)
 print(f"{'Method':<30} {'Exact P@2':<15} {'Similar P@2':<15} {'Users':<10}")
 print("-" * 75)
 
+store = ExperimentStore()
+
 results = []
 for rec_file, method_name in methods:
     try:
-        exact_p, sim_p, users = evaluate_with_similarity(rec_file, method_name)
+        record, _ = store.run(
+            method_name,
+            {'evaluation': 'similarity', 'recs': rec_file, 'watch_threshold': WATCH_THRESHOLD,
+             'similarity_threshold': SIMILARITY_THRESHOLD},
+            lambda: (dict(zip(['exact_precision@2', 'similarity_precision@2', 'users_evaluated'],
+                              evaluate_with_similarity(rec_file, method_name))), None),
+            sources=[Path(__file__)],
+            inputs=[P(rec_file)],
+        )
+        exact_p = record['metrics']['exact_precision@2']
+        sim_p = record['metrics']['similarity_precision@2']
+        users = record['metrics']['users_evaluated']
         results.append((method_name, exact_p, sim_p))
         print(f"{method_name:<30} {exact_p:<15.3f} {sim_p:<15.3f} {users:<10}")
     except Exception as e:
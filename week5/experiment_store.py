@@ -0,0 +1,156 @@
+"""
+Experiment result store.
+
+Every generation/evaluation run is recorded under a key made of
+(method, params, data fingerprint, code version):
+
+- data fingerprint: hash of the parquet tables plus any extra input files
+  (e.g. the recommendation CSV being evaluated),
+- code version: hash of the source files the run depends on.
+
+If nothing in the key changed, run() returns the stored metrics and
+recommendations without recomputing. The visualization scripts read their
+numbers from here instead of hardcoding them.
+
+Layout:
+    experiments/runs.jsonl        one JSON record per run
+    experiments/recs/<key>.csv    recommendation outputs
+"""
+
+import hashlib
+import json
+import time
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+
+import rec_pipeline as rp
+
+ROOT = Path(__file__).resolve().parent
+P = lambda name: ROOT / name
+
+STORE_DIR = P("experiments")
+
+
+def hash_files(paths):
+    """Content hash of a list of files (missing files hash by name only)."""
+    digest = hashlib.sha1()
+    for path in sorted(Path(p) for p in paths):
+        digest.update(path.name.encode())
+        if path.exists():
+            digest.update(path.read_bytes())
+    return digest.hexdigest()[:16]
+
+
+def experiment_key(method, params, data, code):
+    payload = json.dumps({'method': method, 'params': params, 'data': data, 'code': code},
+                         sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode()).hexdigest()[:20]
+
+
+class ExperimentStore:
+    """Append-only run log with a lookup by experiment key."""
+
+    def __init__(self, root=STORE_DIR, data_root=ROOT):
+        self.root = Path(root)
+        self.data_root = Path(data_root)
+        self.runs_file = self.root / "runs.jsonl"
+        self.recs_dir = self.root / "recs"
+        self._fingerprint = None
+        self._runs = None
+
+    @property
+    def fingerprint(self):
+        """Fingerprint of the parquet tables (computed once per store)."""
+        if self._fingerprint is None:
+            self._fingerprint = rp.data_fingerprint(self.data_root)
+        return self._fingerprint
+
+    def runs(self):
+        if self._runs is None:
+            self._runs = {}
+            if self.runs_file.exists():
+                for line in self.runs_file.read_text().splitlines():
+                    if line.strip():
+                        record = json.loads(line)
+                        self._runs[record['key']] = record
+        return self._runs
+
+    def get(self, key):
+        return self.runs().get(key)
+
+    def put(self, record, recs=None):
+        self.root.mkdir(parents=True, exist_ok=True)
+        if recs is not None:
+            self.recs_dir.mkdir(parents=True, exist_ok=True)
+            recs.to_csv(self.recs_dir / f"{record['key']}.csv", index=False)
+            record['recs_file'] = f"recs/{record['key']}.csv"
+        with open(self.runs_file, 'a') as f:
+            f.write(json.dumps(record, default=str) + "\n")
+        self.runs()[record['key']] = record
+
+    def recommendations(self, record):
+        if record.get('recs_file'):
+            return pd.read_csv(self.root / record['recs_file'])
+        return None
+
+    def run(self, method, params, compute, sources=(), inputs=()):
+        """
+        Return (record, recs) for this experiment, computing it only if the
+        key is new. compute() returns (metrics dict, recommendations DataFrame
+        or None). record['cached'] tells whether the stored result was reused.
+        """
+        data = self.fingerprint if not inputs else f"{self.fingerprint}-{hash_files(inputs)}"
+        code = hash_files(sources)
+        key = experiment_key(method, params, data, code)
+        record = self.get(key)
+        if record is not None:
+            return dict(record, cached=True), self.recommendations(record)
+
+        start = time.perf_counter()
+        metrics, recs = compute()
+        record = {
+            'key': key,
+            'method': method,
+            'params': params,
+            'data': data,
+            'code': code,
+            'metrics': metrics,
+            'seconds': time.perf_counter() - start,
+            'created': datetime.now().isoformat(timespec='seconds'),
+        }
+        self.put(record, recs)
+        return dict(record, cached=False), recs
+
+    def latest(self, **params):
+        """
+        Latest metrics per method on the current data, for runs whose params
+        contain the given values. Returns a DataFrame indexed by method.
+        """
+        rows = []
+        for record in self.runs().values():
+            if not record['data'].startswith(self.fingerprint):
+                continue
+            if any(record['params'].get(k) != v for k, v in params.items()):
+                continue
+            rows.append({'method': record['method'], 'created': record['created'],
+                         'seconds': record['seconds'], **record['metrics']})
+        if not rows:
+            return pd.DataFrame()
+        df = pd.DataFrame(rows).sort_values('created')
+        return df.groupby('method').last()
+
+    def values(self, methods, metric, fallback, **params):
+        """
+        metric for each method from latest(**params), keeping the matching
+        fallback value for methods that have no stored run yet.
+        """
+        table = self.latest(**params)
+        out = []
+        for method, default in zip(methods, fallback):
+            if method in table.index and metric in table.columns and pd.notna(table.loc[method, metric]):
+                out.append(float(table.loc[method, metric]))
+            else:
+                out.append(default)
+        return out
@@ -1,6 +1,7 @@
 import pandas as pd
 import numpy as np
 from pathlib import Path
+from latency import timed, record_candidates
 
 ROOT = Path(__file__).resolve().parent
 P = lambda name: ROOT / name
@@ -44,6 +45,7 @@ views_pub_df['view_ordinal'] = views_pub_df.apply(to_ordinal, axis=1)
 print(f"View ordinal range: {views_pub_df['view_ordinal'].min()} to {views_pub_df['view_ordinal'].max()}")
 
 # Simple trending recommender
+@timed('recommend_trending')
 def recommend_trending(user_id, n_recs=2):
     """
     Global heuristic: time-decayed popularity by language
@@ -89,6 +91,7 @@ def recommend_trending(user_id, n_recs=2):
     
     # Count views as popularity score
     trending = recent['content_id'].value_counts()
+    record_candidates('recommend_trending', len(trending))
     
     # Return top N (already guaranteed to be in scope)
     if len(trending) >= n_recs:
@@ -0,0 +1,192 @@
+"""
+Per-call latency histograms for the recommenders.
+
+recommend_for_user (recommender.py), recommend_hybrid / recommend_baseline
+(advanced_recommender_week4.py) and recommend_trending
+(heuristic_recommender.py) are wrapped with @timed(name). Every call records
+its wall time, and the function reports how many candidate items it scored
+with record_candidates(name, n).
+
+Values go into HDR-style log-bucket histograms: 16 linear sub-buckets per
+power of two, so any recorded value is known to within ~6% and a histogram
+is a fixed 1024-slot list no matter how many calls it sees. Recording is a
+perf_counter_ns() pair, a bit_length() and a list increment (well under a
+microsecond), so it stays on in normal runs.
+
+Reports:
+    latency.summary()                text table (count, mean, p50/p90/p99/p99.9, max)
+    latency.dump("latency.json")     JSON with percentiles and the raw buckets
+    REC_LATENCY_REPORT=-             print the summary at process exit
+    REC_LATENCY_REPORT=out.json      write JSON (any other path: text) at exit
+"""
+
+import atexit
+import functools
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+SUB_BITS = 4
+SUB_BUCKETS = 1 << SUB_BITS
+N_BUCKETS = 64 * SUB_BUCKETS
+PERCENTILES = [50, 90, 99, 99.9]
+REPORT_ENV = "REC_LATENCY_REPORT"
+
+
+def bucket_index(value):
+    """Log-linear bucket of a non-negative integer."""
+    shift = value.bit_length() - SUB_BITS - 1
+    if shift <= 0:
+        return value
+    return shift * SUB_BUCKETS + (value >> shift)
+
+
+def bucket_bounds(index):
+    """[lower, upper) values that land in a bucket."""
+    shift = max(index // SUB_BUCKETS - 1, 0)
+    mantissa = index - shift * SUB_BUCKETS
+    return mantissa << shift, (mantissa + 1) << shift
+
+
+class LogHistogram:
+    """Fixed-size log-bucket histogram of non-negative integers."""
+
+    def __init__(self):
+        self.counts = [0] * N_BUCKETS
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = 0
+
+    def record(self, value):
+        value = int(value)
+        self.counts[bucket_index(value)] += 1
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, q):
+        """Midpoint of the bucket holding the q-th percentile, clamped to [min, max]."""
+        if not self.count:
+            return None
+        rank = max(1, int(round(q / 100 * self.count)))
+        seen = 0
+        for index, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank:
+                lower, upper = bucket_bounds(index)
+                return min(max((lower + upper - 1) / 2, self.min), self.max)
+        return self.max
+
+    def to_dict(self, scale=1.0):
+        """Summary stats divided by scale, plus the non-empty buckets (raw units)."""
+        if not self.count:
+            return {'count': 0}
+        out = {'count': self.count, 'mean': self.total / self.count / scale,
+               'min': self.min / scale, 'max': self.max / scale}
+        for q in PERCENTILES:
+            out[f'p{q:g}'] = self.percentile(q) / scale
+        out['buckets'] = {str(bucket_bounds(i)[0]): n for i, n in enumerate(self.counts) if n}
+        return out
+
+
+class LatencyRecorder:
+    """Latency (ns) and candidate-count histograms per method name."""
+
+    def __init__(self):
+        self.latency = {}
+        self.candidates = {}
+
+    def _histogram(self, table, name):
+        hist = table.get(name)
+        if hist is None:
+            hist = table[name] = LogHistogram()
+        return hist
+
+    def record(self, name, nanoseconds):
+        self._histogram(self.latency, name).record(nanoseconds)
+
+    def record_candidates(self, name, n):
+        self._histogram(self.candidates, name).record(n)
+
+    def reset(self):
+        self.latency.clear()
+        self.candidates.clear()
+
+    def to_dict(self):
+        out = {}
+        for name in sorted(set(self.latency) | set(self.candidates)):
+            out[name] = {
+                'latency_ms': self._histogram(self.latency, name).to_dict(scale=1e6),
+                'candidates': self._histogram(self.candidates, name).to_dict(),
+            }
+        return out
+
+    def summary(self):
+        lines = [f"{'method':<22} {'calls':>8} {'mean':>9} {'p50':>9} {'p90':>9} "
+                 f"{'p99':>9} {'p99.9':>9} {'max':>9}  candidates p50/max"]
+        for name, stats in self.to_dict().items():
+            lat, cand = stats['latency_ms'], stats['candidates']
+            if not lat['count']:
+                continue
+            cand_text = f"{cand['p50']:.0f}/{cand['max']:.0f}" if cand['count'] else "-"
+            lines.append(f"{name:<22} {lat['count']:>8,} {lat['mean']:>9.3f} {lat['p50']:>9.3f} "
+                         f"{lat['p90']:>9.3f} {lat['p99']:>9.3f} {lat['p99.9']:>9.3f} "
+                         f"{lat['max']:>9.3f}  {cand_text}")
+        return "\n".join(lines)
+
+    def dump(self, path):
+        path = Path(path)
+        if path.suffix == '.json':
+            path.write_text(json.dumps(self.to_dict(), indent=2))
+        else:
+            path.write_text(self.summary() + "\n")
+        return path
+
+
+RECORDER = LatencyRecorder()
+
+
+def timed(name, recorder=RECORDER):
+    """Decorator: record the wall time of every call under `name`."""
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter_ns()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                recorder.record(name, time.perf_counter_ns() - start)
+        return wrapper
+    return decorate
+
+
+def record_candidates(name, n, recorder=RECORDER):
+    recorder.record_candidates(name, n)
+
+
+def summary():
+    return RECORDER.summary()
+
+
+def dump(path):
+    return RECORDER.dump(path)
+
+
+def _report_at_exit():
+    target = os.environ.get(REPORT_ENV)
+    if not target or not RECORDER.latency:
+        return
+    if target == '-':
+        print("\nRECOMMENDER LATENCY (ms)", file=sys.stderr)
+        print(RECORDER.summary(), file=sys.stderr)
+    else:
+        RECORDER.dump(target)
+
+
+atexit.register(_report_at_exit)
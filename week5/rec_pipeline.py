@@ -0,0 +1,427 @@
+"""
+Reusable pieces of the week 5 recommenders.
+
+recommender.py, advanced_recommender_week4.py and heuristic_recommender.py
+build everything at import time from the parquet files next to them. The
+functions here expose the same steps (cleaning, publisher scope, user-item
+matrix, similarities, scoring, precision/recall) over plain DataFrames and
+arrays, so they can be rebuilt at other cutoffs or on other data.
+"""
+
+import hashlib
+import json
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+from pathlib import Path
+from scipy import sparse
+
+ROOT = Path(__file__).resolve().parent
+P = lambda name: ROOT / name
+
+MONTH_ORDER = ["Frostmere", "Emberfall", "Lunaris", "Verdantia", "Solstice",
+               "Duskveil", "Starshade", "Aurorath", "Mysthaven", "Eclipsion"]
+MONTH_TO_INDEX = {m: i for i, m in enumerate(MONTH_ORDER)}
+DAYS_PER_MONTH = 24
+DAYS_PER_YEAR = len(MONTH_ORDER) * DAYS_PER_MONTH
+
+# Defaults used by the week 5 scripts
+WATCH_THRESHOLD = 0.5       # evaluate_*.py: "liked" = watched at least half
+MIN_WATCH_PCT = 0.05        # low-engagement filter ...
+MIN_SECONDS = 30            # ... keeps a view if either condition holds
+N_NEIGHBORS = 20            # recommender.py
+ALPHA = 0.6                 # advanced_recommender_week4.py collaborative weight
+BETA = 0.4                  # advanced_recommender_week4.py content weight
+TRENDING_WINDOW = 60        # heuristic_recommender.py
+TRENDING_FALLBACK_WINDOW = 120
+TRENDING_MIN_VIEWS = 100
+
+TABLES = {
+    'views': "content_views.parquet",
+    'metadata': "content_metadata.parquet",
+    'adventurers': "adventurer_metadata.parquet",
+    'subs': "subscriptions.parquet",
+    'cancels': "cancellations.parquet",
+}
+
+# Low-cardinality strings stored as categoricals by load_tables(optimize=True).
+# IDs stay strings; every other numeric column is downcast to 32 bits.
+CATEGORICAL_COLUMNS = ['month', 'day', 'gender', 'region', 'language_code',
+                       'primary_language', 'genre_id', 'favorite_genre']
+SCHEMA_FILE = "potions_schema.json"
+
+
+def add_ordinals(df, col='ordinal'):
+    """Vectorized mystical-calendar date -> absolute day ordinal (int32)."""
+    month = df['month']
+    if isinstance(month.dtype, pd.CategoricalDtype):
+        lookup = np.array([MONTH_TO_INDEX.get(str(m), 0) for m in month.cat.categories] + [0])
+        month_idx = lookup[month.cat.codes.to_numpy()]
+    else:
+        month_idx = month.astype(str).map(MONTH_TO_INDEX).fillna(0).to_numpy(np.int64)
+    df[col] = (df['year'].astype(np.int64).to_numpy() * DAYS_PER_YEAR
+               + month_idx * DAYS_PER_MONTH
+               + df['day_of_month'].astype(np.int64).to_numpy() - 1).astype(np.int32)
+    return df
+
+
+def _source_signature(path):
+    """Cheap change detector for a parquet file or partitioned dataset."""
+    path = Path(path)
+    files = sorted(p for p in path.rglob('*') if p.is_file()) if path.is_dir() else [path]
+    return hashlib.sha1("|".join(
+        f"{p.relative_to(path.parent)}:{p.stat().st_size}:{p.stat().st_mtime_ns}" for p in files
+    ).encode()).hexdigest()[:16]
+
+
+def infer_schema(df):
+    """Compact dtype per column: categoricals for CATEGORICAL_COLUMNS, 32-bit numerics."""
+    schema = {}
+    for col in df.columns:
+        values = df[col]
+        if col in CATEGORICAL_COLUMNS:
+            categories = values.dropna().unique()
+            schema[col] = {'dtype': 'category', 'categories': sorted(str(c) for c in categories)}
+        elif isinstance(values.dtype, pd.CategoricalDtype):
+            # Partition columns of a partitioned dataset (year) come back categorical
+            if pd.api.types.is_integer_dtype(values.cat.categories):
+                schema[col] = {'dtype': 'int32'}
+        elif pd.api.types.is_integer_dtype(values):
+            fits = len(values) == 0 or (values.min() >= np.iinfo(np.int32).min and values.max() <= np.iinfo(np.int32).max)
+            schema[col] = {'dtype': 'int32' if fits else 'int64'}
+        elif pd.api.types.is_float_dtype(values):
+            schema[col] = {'dtype': 'float32'}
+    return schema
+
+
+def apply_schema(df, schema):
+    for col, spec in schema.items():
+        if col not in df.columns:
+            continue
+        if spec['dtype'] == 'category':
+            values = df[col]
+            if isinstance(values.dtype, pd.CategoricalDtype):
+                df[col] = values.cat.set_categories(spec['categories'])
+            else:
+                df[col] = pd.Categorical(values, categories=spec['categories'])
+        else:
+            df[col] = df[col].astype(spec['dtype'])
+    return df
+
+
+def load_table(root, name, optimize=True, schema=None, sizes=None):
+    """
+    Read one parquet table. With optimize=True the compact schema stored in
+    root/SCHEMA_FILE is applied (and re-inferred when the source changed).
+    Given a sizes dict, the table is read with plain dtypes and its deep
+    memory (MB) recorded under name before the schema converts it in place.
+    """
+    root = Path(root)
+    if not optimize:
+        return pd.read_parquet(root / name)
+    if sizes is not None:
+        df = pd.read_parquet(root / name)
+        sizes[name] = memory_usage_mb(df)
+    else:
+        # Arrow decodes the categorical columns straight into dictionaries
+        columns = pq.ParquetDataset(root / name).schema.names
+        df = pd.read_parquet(root / name, read_dictionary=[c for c in CATEGORICAL_COLUMNS if c in columns])
+    schema_path = root / SCHEMA_FILE
+    if schema is None:
+        schema = json.loads(schema_path.read_text()) if schema_path.exists() else {}
+    signature = _source_signature(root / name)
+    entry = schema.get(name)
+    if entry is None or entry['source'] != signature:
+        entry = schema[name] = {'source': signature, 'columns': infer_schema(df)}
+        schema_path.write_text(json.dumps(schema, indent=2))
+    return apply_schema(df, entry['columns'])
+
+
+def load_tables(root=ROOT, optimize=True, report=False, cache=False):
+    """
+    Read the five potions tables from a week folder (compact dtypes unless
+    optimize=False). report=True prints memory per table before/after.
+    cache=True reads memory-mapped Arrow IPC copies instead (arrow_cache.py):
+    compact dtypes, an ordinal column and IDs as shared categoricals.
+    """
+    root = Path(root)
+    if cache:
+        from arrow_cache import ArrowCache
+        arrow = ArrowCache(root).ensure()
+        return {key: arrow.frame(name) for key, name in TABLES.items()}
+    if not optimize:
+        return {key: pd.read_parquet(root / name) for key, name in TABLES.items()}
+    schema_path = root / SCHEMA_FILE
+    schema = json.loads(schema_path.read_text()) if schema_path.exists() else {}
+    # The "before" sizes are measured as each table is read, so the plain
+    # frames never coexist with the compact ones
+    sizes = {} if report else None
+    tables = {key: load_table(root, name, schema=schema, sizes=sizes) for key, name in TABLES.items()}
+    if report:
+        print(memory_report({key: sizes[name] for key, name in TABLES.items()}, tables).to_string(index=False))
+    return tables
+
+
+def memory_usage_mb(df):
+    return df.memory_usage(deep=True).sum() / 2**20
+
+
+def memory_report(before, after):
+    """Per-table deep memory (MB): before as {name: MB}, after as {name: DataFrame}."""
+    rows = [{'table': key, 'rows': len(after[key]),
+             'before_mb': round(before[key], 2),
+             'after_mb': round(memory_usage_mb(after[key]), 2)} for key in after]
+    report = pd.DataFrame(rows)
+    total = report[['rows', 'before_mb', 'after_mb']].sum()
+    report.loc[len(report)] = {'table': 'total', **total.to_dict()}
+    report['rows'] = report['rows'].astype(np.int64)
+    report['saved'] = (1 - report['after_mb'] / report['before_mb']).map('{:.0%}'.format)
+    return report
+
+
+def data_fingerprint(root=ROOT):
+    """Hash of the parquet inputs, so cached results die with the data."""
+    digest = hashlib.sha1()
+    for name in sorted(TABLES.values()):
+        digest.update(name.encode())
+        digest.update((Path(root) / name).read_bytes())
+    return digest.hexdigest()[:16]
+
+
+def top_publisher(df_subs):
+    """Publisher with the most unique subscribers (wn32 on the real data)."""
+    return df_subs.groupby("publisher_id")["adventurer_id"].nunique().idxmax()
+
+
+def scope_to_publisher(df_views, df_subs, publisher_id):
+    """Views of a publisher's content by that publisher's subscribers."""
+    sub_ids = df_subs.loc[df_subs["publisher_id"] == publisher_id, "adventurer_id"].unique()
+    mask = df_views["adventurer_id"].isin(sub_ids)
+    if 'publisher_id' in df_views.columns:
+        mask &= df_views["publisher_id"] == publisher_id
+    return df_views[mask]
+
+
+def add_watch_pct(df_views, df_metadata):
+    """Attach minutes and watch_pct (clipped to [0, 1]) to a views frame."""
+    df = df_views.merge(df_metadata[['content_id', 'minutes']], on='content_id', how='left')
+    denom = (df['minutes'] * 60).replace(0, np.nan)
+    df['watch_pct'] = (df['seconds_viewed'] / denom).clip(0, 1)
+    return df
+
+
+def engagement_mask(df, min_watch_pct=MIN_WATCH_PCT, min_seconds=MIN_SECONDS):
+    """Rows that survive the low-engagement filter."""
+    return (df['watch_pct'].fillna(0) >= min_watch_pct) | (df['seconds_viewed'] >= min_seconds)
+
+
+def clean_views(df_views, df_metadata, min_watch_pct=MIN_WATCH_PCT,
+                min_seconds=MIN_SECONDS, dedupe=True):
+    """Dedupe (keep longest view), add watch_pct and drop low-engagement views."""
+    if dedupe:
+        df_views = df_views.sort_values('seconds_viewed', ascending=False)\
+            .drop_duplicates(subset=['adventurer_id', 'content_id'], keep='first')
+    df = add_watch_pct(df_views, df_metadata)
+    return df[engagement_mask(df, min_watch_pct, min_seconds)].copy()
+
+
+def build_user_item(df, value_col=None, users=None, items=None):
+    """
+    Sparse user x item matrix (float32) keeping the max value per pair.
+    value_col=None gives the binary matrix recommender.py uses.
+    """
+    users = pd.Index(df['adventurer_id'].unique()) if users is None else pd.Index(users)
+    items = pd.Index(df['content_id'].unique()) if items is None else pd.Index(items)
+    rows = users.get_indexer(df['adventurer_id'])
+    cols = items.get_indexer(df['content_id'])
+    keep = (rows >= 0) & (cols >= 0)
+    vals = np.ones(keep.sum(), dtype=np.float32) if value_col is None \
+        else df[value_col].fillna(0).to_numpy(np.float32)[keep]
+    codes = rows[keep].astype(np.int64) * len(items) + cols[keep]
+    codes, vals = max_per_code(codes, vals)
+    matrix = sparse.csr_matrix(
+        (vals, (codes // len(items), codes % len(items))),
+        shape=(len(users), len(items)), dtype=np.float32
+    )
+    return matrix, users, items
+
+
+def max_per_code(codes, vals):
+    """Sort codes and keep the max value of each duplicate run."""
+    order = np.lexsort((vals, codes))
+    codes, vals = codes[order], vals[order]
+    last = np.r_[codes[1:] != codes[:-1], True] if len(codes) else np.zeros(0, bool)
+    return codes[last], vals[last]
+
+
+def cosine_from_gram(gram):
+    """Cosine similarity from a dense item x item Gram matrix (X^T X)."""
+    norms = np.sqrt(np.clip(np.diag(gram), 0, None))
+    norms[norms == 0] = 1.0
+    return (gram / norms[:, None] / norms[None, :]).astype(np.float32)
+
+
+def item_cosine(user_item):
+    """Item-item cosine similarity of a sparse user x item matrix."""
+    gram = (user_item.T @ user_item).toarray()
+    return cosine_from_gram(gram)
+
+
+def content_similarity(df_metadata, items):
+    """
+    Cosine similarity of the advanced recommender's content features:
+    scaled duration + genre and language one-hots (no TF-IDF; the metadata
+    has no description column).
+    """
+    meta = df_metadata.drop_duplicates('content_id').set_index('content_id').reindex(items)
+    minutes = meta['minutes'].astype(float).fillna(meta['minutes'].mean())
+    std = minutes.std(ddof=0)
+    parts = [((minutes - minutes.mean()) / (std if std > 0 else 1.0)).to_frame('duration_scaled')]
+    for col, prefix in [('genre_id', 'genre'), ('language_code', 'lang')]:
+        if col in meta.columns:
+            parts.append(pd.get_dummies(meta[col].astype(str), prefix=prefix))
+    features = pd.concat(parts, axis=1).fillna(0).to_numpy(np.float64)
+    norms = np.linalg.norm(features, axis=1)
+    norms[norms == 0] = 1.0
+    features /= norms[:, None]
+    return (features @ features.T).astype(np.float32)
+
+
+def knn_graph(sim, n_neighbors=N_NEIGHBORS):
+    """
+    Keep each item's n_neighbors most similar items (itself included), as
+    NearestNeighbors(metric='cosine').kneighbors does in recommender.py.
+    Returns a sparse matrix whose row i holds item i's neighbour sims.
+    """
+    n_items = sim.shape[0]
+    k = max(1, min(n_neighbors, n_items))
+    nbrs = np.argpartition(-sim, kth=k - 1, axis=1)[:, :k]
+    rows = np.repeat(np.arange(n_items), k)
+    return sparse.csr_matrix(
+        (sim[rows, nbrs.ravel()], (rows, nbrs.ravel())), shape=sim.shape, dtype=np.float32
+    )
+
+
+def top_n(scores, n_recs):
+    """Row-wise indices of the n_recs best finite scores, best first (-1 = none)."""
+    scores = np.atleast_2d(scores)
+    k = min(n_recs, scores.shape[1])
+    part = np.argpartition(-scores, kth=k - 1, axis=1)[:, :k]
+    part_scores = np.take_along_axis(scores, part, axis=1)
+    order = np.argsort(-part_scores, axis=1, kind='stable')
+    idx = np.take_along_axis(part, order, axis=1)
+    idx[~np.isfinite(np.take_along_axis(part_scores, order, axis=1))] = -1
+    return idx
+
+
+def score_collaborative(user_rows, knn):
+    """recommend_for_user scores: sum of neighbour sims over seen items."""
+    scores = _dense((user_rows > 0).astype(np.float32) @ knn)
+    return mask_seen(scores, user_rows)
+
+
+def score_hybrid(user_rows, sim):
+    """recommend_hybrid scores: watch_pct-weighted sum of item similarities."""
+    scores = _dense(user_rows @ sim)
+    return mask_seen(scores, user_rows)
+
+
+def _dense(x):
+    return np.asarray(x.toarray() if sparse.issparse(x) else x, dtype=np.float32)
+
+
+def mask_seen(scores, user_rows):
+    """Set already-seen items to -inf."""
+    seen = user_rows.nonzero() if sparse.issparse(user_rows) else np.nonzero(user_rows > 0)
+    scores[seen] = -np.inf
+    return scores
+
+
+def trending_scores(item_counts, item_lang=None, user_lang=None):
+    """
+    recommend_trending scores: recent view counts, restricted to the user's
+    language when any content in that language was viewed recently.
+    """
+    scores = item_counts.astype(np.float32)
+    if item_lang is not None and user_lang is not None:
+        in_lang = item_lang == user_lang
+        if (item_counts[in_lang] > 0).any():
+            scores = np.where(in_lang, scores, -np.inf).astype(np.float32)
+    scores[item_counts <= 0] = -np.inf
+    return scores
+
+
+def precision_recall_at_k(recs, liked, k):
+    """
+    Per-user precision@k / recall@k / hit from {user: [items]} and
+    {user: set(items)}. Users without liked items are skipped, as in
+    evaluate_all_methods.py.
+    """
+    rows = []
+    for user_id, items in liked.items():
+        if not items:
+            continue
+        rec_list = [r for r in recs.get(user_id, [])[:k] if r is not None]
+        hits = len(set(rec_list) & items)
+        rows.append({
+            'adventurer_id': user_id,
+            'precision': hits / k,
+            'recall': hits / len(items),
+            'hit': float(hits > 0),
+        })
+    return pd.DataFrame(rows, columns=['adventurer_id', 'precision', 'recall', 'hit'])
+
+
+
+def bootstrap_means(values, n_boot=10_000, seed=42, max_chunk_bytes=64 * 2**20):
+    """
+    Means of n_boot resamples of the rows of values (users x metrics).
+    All metric columns share the same (B x users) index matrix, generated in
+    chunks of at most max_chunk_bytes so memory stays bounded.
+    """
+    n_users, n_metrics = values.shape
+    rng = np.random.default_rng(seed)
+    chunk = int(max(1, min(n_boot, max_chunk_bytes // (8 * n_users * n_metrics))))
+    means = np.empty((n_boot, n_metrics))
+    for start in range(0, n_boot, chunk):
+        stop = min(n_boot, start + chunk)
+        idx = rng.integers(0, n_users, size=(stop - start, n_users))
+        means[start:stop] = values[idx].mean(axis=1)
+    return means
+
+
+def bootstrap_ci(values, n_boot=10_000, ci=0.95, seed=42):
+    """
+    Percentile bootstrap CI of the mean of per-user metrics. values is
+    (users,) or (users, metrics); returns (mean, low, high), each a float or
+    an array with one entry per metric.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    squeeze = values.ndim == 1
+    values = values.reshape(len(values), -1)
+    if len(values) == 0:
+        nan = np.full(values.shape[1], np.nan)
+        return (np.nan,) * 3 if squeeze else (nan, nan, nan)
+
+    means = bootstrap_means(values, n_boot, seed)
+    alpha = (1 - ci) / 2
+    low, high = np.quantile(means, [alpha, 1 - alpha], axis=0)
+    mean = values.mean(axis=0)
+    if squeeze:
+        return float(mean[0]), float(low[0]), float(high[0])
+    return mean, low, high
+
+
+def bootstrap_diff(a, b, n_boot=10_000, ci=0.95, seed=42):
+    """
+    Paired bootstrap of mean(a - b) over the same users. Returns
+    (diff, low, high, prob_better) where prob_better is the share of
+    resamples in which a beats b.
+    """
+    diff = np.asarray(a, dtype=np.float64) - np.asarray(b, dtype=np.float64)
+    if len(diff) == 0:
+        return (np.nan,) * 4
+    means = bootstrap_means(diff.reshape(-1, 1), n_boot, seed)[:, 0]
+    alpha = (1 - ci) / 2
+    low, high = np.quantile(means, [alpha, 1 - alpha])
+    return float(diff.mean()), float(low), float(high), float((means > 0).mean())
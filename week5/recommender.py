@@ -2,6 +2,7 @@ import numpy as np
 import pandas as pd
 from sklearn.neighbors import NearestNeighbors
 from pathlib import Path
+from latency import timed, record_candidates
 
 ROOT = Path(__file__).resolve().parent
 P = lambda name: ROOT / name
@@ -62,6 +63,7 @@ knn = NearestNeighbors(metric="cosine", algorithm="brute", n_neighbors=n_neighbo
 knn.fit(item_user.values)
 item_matrix = item_user.values
 
+@timed('recommend_for_user')
 def recommend_for_user(uid, n_recs=10):
     if uid not in user_item.index:
         return []
@@ -74,6 +76,7 @@ def recommend_for_user(uid, n_recs=10):
         sims = 1.0 - drow
         np.add.at(scores, irow, sims)
     scores[seen_idx] = -np.inf
+    record_candidates('recommend_for_user', int((scores > 0).sum()))
     top_indices = np.argsort(-scores)[:n_recs]
     return [user_item.columns[i] for i in top_indices if np.isfinite(scores[i])]
 
@@ -0,0 +1,325 @@
+"""
+Parallel hyperparameter sweep for the week 5 recommenders.
+
+Searches the values hand-fixed in the scripts: ALPHA/BETA
+(advanced_recommender_week4.py), n_neighbors (recommender.py), the
+low-engagement filter, the trending window (heuristic_recommender.py) and
+WATCH_THRESHOLD (evaluate_*.py, the definition of "liked").
+
+- Train/test is the per-user temporal 80/20 split of
+  evaluate_with_temporal_split.py.
+- User-item matrices (one per engagement-filter setting), similarity
+  matrices and the test events are built once in the parent and placed in
+  shared memory; worker processes attach to them instead of copying.
+- Successive halving: every config is scored on a small user sample, only
+  the best 1/ETA of each bracket moves on to a larger sample.
+- Results are cached in sweep_cache.json by a hash of the config, the user
+  sample fraction, the fingerprint of the data the tables were read from and
+  the source of the scorers (SOURCES), so reruns skip finished work and
+  edits to the scoring code start over.
+"""
+
+import hashlib
+import itertools
+import json
+import math
+import os
+import time
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from pathlib import Path
+from scipy import sparse
+
+import rec_pipeline as rp
+from experiment_store import hash_files
+
+ROOT = Path(__file__).resolve().parent
+P = lambda name: ROOT / name
+
+CACHE_FILE = P("sweep_cache.json")
+SOURCES = [P("sweep.py"), P("rec_pipeline.py")]
+TRAIN_FRACTION = 0.8
+N_RECS = 2
+ETA = 3
+MIN_FRACTION = 1 / 9
+SEED = 42
+
+FILTERS = list(itertools.product([0.0, 0.05, 0.1], [0, 30, 60]))  # (min_watch_pct, min_seconds)
+WATCH_THRESHOLDS = [0.3, 0.5, 0.7]
+GRID = {
+    'collaborative': {
+        'n_neighbors': [5, 10, 20, 30, 40],
+        'filter': FILTERS,
+    },
+    'hybrid': {
+        'alpha': [round(a, 1) for a in np.linspace(0, 1, 11)],
+        'filter': FILTERS,
+    },
+    'trending': {
+        'trending_window': [30, 60, 90, 120, 240],
+    },
+}
+
+# Worker-side handles on the shared arrays (filled by attach())
+SHARED = {}
+_SEGMENTS = []
+
+
+# ---------------------------------------------------------------------------
+# Shared memory
+# ---------------------------------------------------------------------------
+
+def share(arrays):
+    """Copy arrays into shared memory; returns the segments and an attach spec."""
+    segments, spec = [], {}
+    for name, arr in arrays.items():
+        arr = np.ascontiguousarray(arr)
+        shm = shared_memory.SharedMemory(create=True, size=max(arr.nbytes, 1))
+        np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf)[...] = arr
+        segments.append(shm)
+        spec[name] = (shm.name, arr.shape, arr.dtype.str)
+    return segments, spec
+
+
+def attach(spec):
+    """Process-pool initializer: map the shared arrays without copying."""
+    for name, (shm_name, shape, dtype) in spec.items():
+        shm = shared_memory.SharedMemory(name=shm_name)
+        _SEGMENTS.append(shm)
+        SHARED[name] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+
+
+def release(segments):
+    for shm in segments:
+        shm.close()
+        shm.unlink()
+
+
+# ---------------------------------------------------------------------------
+# Data preparation (parent process)
+# ---------------------------------------------------------------------------
+
+def prepare(tables):
+    """Per-user temporal split and every matrix the workers need."""
+    df_subs = tables['subs']
+    publisher_id = rp.top_publisher(df_subs)
+    events = rp.scope_to_publisher(tables['views'], df_subs, publisher_id)
+    events = rp.add_watch_pct(rp.add_ordinals(events.copy()), tables['metadata'])
+
+    users = pd.Index(events['adventurer_id'].unique())
+    items = pd.Index(events['content_id'].unique())
+    events['u'] = users.get_indexer(events['adventurer_id'])
+    events['i'] = items.get_indexer(events['content_id'])
+    events = events.sort_values(['u', 'ordinal'], kind='stable').reset_index(drop=True)
+    rank = events.groupby('u').cumcount().to_numpy()
+    size = events.groupby('u')['u'].transform('size').to_numpy()
+    is_train = rank < (size * TRAIN_FRACTION).astype(int)
+    train, test = events[is_train], events[~is_train]
+
+    n_users, n_items = len(users), len(items)
+    arrays = {}
+
+    seen, _, _ = rp.build_user_item(train, users=users, items=items)
+    arrays['seen_indptr'], arrays['seen_indices'] = seen.indptr, seen.indices
+
+    for f, (min_pct, min_secs) in enumerate(FILTERS):
+        kept = train[rp.engagement_mask(train, min_pct, min_secs)]
+        weighted, _, _ = rp.build_user_item(kept, value_col='watch_pct', users=users, items=items)
+        binary = weighted.copy()
+        binary.data[:] = 1.0
+        arrays[f'f{f}_indptr'] = weighted.indptr
+        arrays[f'f{f}_indices'] = weighted.indices
+        arrays[f'f{f}_watch'] = weighted.data
+        arrays[f'f{f}_collab_sim'] = rp.item_cosine(binary)
+
+    arrays['content_sim'] = rp.content_similarity(tables['metadata'], items)
+    arrays['test_u'] = test['u'].to_numpy(np.int64)
+    arrays['test_i'] = test['i'].to_numpy(np.int64)
+    arrays['test_watch'] = test['watch_pct'].fillna(0).to_numpy(np.float32)
+    arrays['train_i'] = train['i'].to_numpy(np.int64)
+    arrays['train_ordinal'] = train['ordinal'].to_numpy(np.int64)
+
+    langs = pd.Index(pd.concat([tables['adventurers']['primary_language'],
+                                tables['metadata']['language_code']]).dropna().unique())
+    user_lang = tables['adventurers'].set_index('adventurer_id')['primary_language'].reindex(users)
+    item_lang = tables['metadata'].drop_duplicates('content_id').set_index('content_id')['language_code'].reindex(items)
+    arrays['user_lang'] = langs.get_indexer(user_lang)
+    arrays['item_lang'] = langs.get_indexer(item_lang)
+    arrays['shape'] = np.array([n_users, n_items], dtype=np.int64)
+    return arrays
+
+
+# ---------------------------------------------------------------------------
+# Evaluation (worker process)
+# ---------------------------------------------------------------------------
+
+def expand(grid=GRID, watch_thresholds=WATCH_THRESHOLDS):
+    """All configs as flat dicts."""
+    configs = []
+    for method, params in grid.items():
+        keys = list(params)
+        for values in itertools.product(*(params[k] for k in keys), watch_thresholds):
+            config = {'method': method, 'watch_threshold': values[-1]}
+            for key, value in zip(keys, values[:-1]):
+                if key == 'filter':
+                    config['min_watch_pct'], config['min_seconds'] = value
+                else:
+                    config[key] = value
+            configs.append(config)
+    return configs
+
+
+def config_hash(config, fraction, fingerprint, code):
+    payload = json.dumps({'config': config, 'fraction': round(fraction, 6), 'data': fingerprint,
+                          'code': code}, sort_keys=True, default=float)
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+
+def _csr(prefix, values=None):
+    n_users, n_items = SHARED['shape']
+    indptr, indices = SHARED[f'{prefix}_indptr'], SHARED[f'{prefix}_indices']
+    data = np.ones(len(indices), dtype=np.float32) if values is None else values
+    return sparse.csr_matrix((data, indices, indptr), shape=(n_users, n_items))
+
+
+def eval_users(watch_threshold, fraction):
+    """Users with training history and a liked test item; nested samples across rungs."""
+    n_users, n_items = SHARED['shape']
+    seen = _csr('seen')
+    liked = SHARED['test_watch'] >= watch_threshold
+    u, i = SHARED['test_u'][liked], SHARED['test_i'][liked]
+    fresh = np.asarray(seen[u, i]).ravel() == 0
+    codes = np.unique(u[fresh] * n_items + i[fresh])
+    has_train = np.diff(SHARED['seen_indptr']) > 0
+    users = np.unique(codes // n_items)
+    users = users[has_train[users]]
+    users = np.random.default_rng(SEED).permutation(users)
+    users = np.sort(users[:max(1, math.ceil(len(users) * fraction))])
+    codes = codes[np.isin(codes // n_items, users)]
+    return users, codes
+
+
+def evaluate_config(config, fraction):
+    """Precision/recall@N_RECS of one config on a sample of eval users."""
+    start = time.perf_counter()
+    n_users, n_items = SHARED['shape']
+    users, liked_codes = eval_users(config['watch_threshold'], fraction)
+    method = config['method']
+
+    if method == 'trending':
+        train_ord = SHARED['train_ordinal']
+        recent = train_ord > train_ord.max() - config['trending_window']
+        counts = np.bincount(SHARED['train_i'][recent], minlength=n_items)
+        user_lang, item_lang = SHARED['user_lang'], SHARED['item_lang']
+        scores = np.vstack([rp.trending_scores(counts, item_lang, user_lang[u]) for u in users])
+        scores = rp.mask_seen(scores, _csr('seen')[users])
+    else:
+        f = FILTERS.index((config['min_watch_pct'], config['min_seconds']))
+        rows = _csr(f'f{f}', SHARED[f'f{f}_watch'])[users]
+        collab_sim = SHARED[f'f{f}_collab_sim']
+        if method == 'collaborative':
+            scores = rp.score_collaborative(rows, rp.knn_graph(collab_sim, config['n_neighbors']))
+        else:
+            alpha = config['alpha']
+            scores = rp.score_hybrid(rows, alpha * collab_sim + (1 - alpha) * SHARED['content_sim'])
+
+    top = rp.top_n(scores, N_RECS)
+    hits = np.isin(users[:, None] * n_items + top, liked_codes) & (top >= 0)
+    n_liked = np.bincount(np.searchsorted(users, liked_codes // n_items), minlength=len(users))
+    return {
+        f'precision@{N_RECS}': float(hits.sum(axis=1).mean() / N_RECS),
+        f'recall@{N_RECS}': float((hits.sum(axis=1) / np.maximum(n_liked, 1)).mean()),
+        'users': int(len(users)),
+        'seconds': time.perf_counter() - start,
+    }
+
+
+# ---------------------------------------------------------------------------
+# Driver
+# ---------------------------------------------------------------------------
+
+def load_cache():
+    if CACHE_FILE.exists():
+        return json.loads(CACHE_FILE.read_text())
+    return {}
+
+
+def save_cache(cache):
+    CACHE_FILE.write_text(json.dumps(cache, indent=1, sort_keys=True))
+
+
+def rung_fractions(eta=ETA, min_fraction=MIN_FRACTION):
+    n_rungs = int(round(math.log(1 / min_fraction, eta))) + 1
+    return [eta ** -(n_rungs - 1 - r) for r in range(n_rungs)]
+
+
+def run_sweep(tables, configs=None, workers=None, eta=ETA, min_fraction=MIN_FRACTION,
+              root=ROOT, fingerprint=None):
+    """
+    Successive halving over configs. Brackets are (method, watch_threshold)
+    since precision is only comparable under the same "liked" definition.
+    root is the folder tables were read from (its data fingerprint keys the
+    cache unless fingerprint is given). Returns every evaluated (config,
+    rung) with its metrics.
+    """
+    configs = expand() if configs is None else configs
+    fingerprint = fingerprint or rp.data_fingerprint(root)
+    code = hash_files(SOURCES)
+    metric = f'precision@{N_RECS}'
+    cache = load_cache()
+    segments, spec = share(prepare(tables))
+    rows = []
+    try:
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count(),
+                                 initializer=attach, initargs=(spec,)) as pool:
+            alive = configs
+            for rung, fraction in enumerate(rung_fractions(eta, min_fraction)):
+                keys = [config_hash(c, fraction, fingerprint, code) for c in alive]
+                todo = [(k, c) for k, c in zip(keys, alive) if k not in cache]
+                futures = {k: pool.submit(evaluate_config, c, fraction) for k, c in todo}
+                for k, fut in futures.items():
+                    cache[k] = fut.result()
+                save_cache(cache)
+                print(f"   rung {rung}: {len(alive)} configs on {fraction:.0%} of users "
+                      f"({len(todo)} evaluated, {len(alive) - len(todo)} cached)")
+
+                scored = pd.DataFrame([{**c, **cache[k], 'rung': rung, 'fraction': fraction}
+                                       for k, c in zip(keys, alive)])
+                rows.append(scored)
+                if fraction >= 1:
+                    break
+                scored['bracket'] = list(zip(scored['method'], scored['watch_threshold']))
+                keep = []
+                for _, group in scored.groupby('bracket', sort=False):
+                    n_keep = max(1, math.ceil(len(group) / eta))
+                    keep.extend(group.nlargest(n_keep, metric).index)
+                alive = [alive[i] for i in sorted(keep)]
+    finally:
+        release(segments)
+    return pd.concat(rows, ignore_index=True)
+
+
+if __name__ == "__main__":
+    print("HYPERPARAMETER SWEEP")
+    configs = expand()
+    print(f"Configs: {len(configs)}")
+
+    print("\n[1] Loading data")
+    tables = rp.load_tables(ROOT)
+
+    print("\n[2] Successive halving")
+    start = time.perf_counter()
+    results = run_sweep(tables, configs, root=ROOT)
+    print(f"   Total: {time.perf_counter() - start:.1f}s")
+
+    final = results[results['rung'] == results['rung'].max()]
+    metric = f'precision@{N_RECS}'
+    print("\n[3] Best config per method (watch_threshold=0.5)")
+    best = final[final['watch_threshold'] == 0.5].sort_values(metric, ascending=False)\
+        .groupby('method').head(1).dropna(axis=1, how='all')
+    print(best.round(3).to_string(index=False))
+
+    results.to_csv(P('sweep_results.csv'), index=False)
+    print("\n   ✓ Saved sweep_results.csv")
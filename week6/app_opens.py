@@ -0,0 +1,254 @@
+"""
+App-open activity: streaming ingestion, sessions and recency/frequency features.
+
+app_opens is the largest table (1.2M rows on the real data) and one row is
+just (adventurer, publisher, playlist, date). AppOpens.stream reads it
+batch by batch (at most BATCH_ROWS rows of a row group at a time):
+
+- adventurer / publisher ids are dictionary-encoded per batch and the small
+  per-batch dictionaries mapped onto running vocabularies, so no string
+  column of the full table ever exists,
+- dates become ordinals from the year / month / day_of_month columns,
+- the batch is reduced to (adventurer, publisher, day) cells with open
+  counts and merged into the cells of the earlier batches.
+
+Only the distinct cells are ever held (plus one batch), not a row per open.
+They are aggregated into two engagement.EngagementCube counters, opens per
+(adventurer, day) and per (adventurer, publisher, day). An
+adventurer's open days are grouped into sessions: consecutive open days
+separated by at most SESSION_GAP days without opens belong to one session.
+
+    opens = AppOpens.stream(root)
+    user, pair = opens.codes(adventurer_ids, publisher_ids)
+    frame = opens.features(user, pair, sub_ordinals, cutoffs)
+    profiles = opens.profiles()          # one row per adventurer (personas)
+
+Usage:
+    python app_opens.py                     # real data, summary + timings
+    python app_opens.py --root synthetic/x10
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+
+from engagement import EngagementCube
+
+ROOT = Path(__file__).resolve().parent
+P = lambda name: ROOT / name
+
+sys.path.insert(0, str(ROOT.parent / "week5"))
+import rec_pipeline as rp
+
+TABLE = "app_opens.parquet"
+COLUMNS = ['adventurer_id', 'publisher_id', 'year', 'month', 'day_of_month']
+BATCH_ROWS = 131_072
+SESSION_GAP = 1     # days without opens that still continue a session
+WINDOW = 30         # recency / frequency window of the churn features
+
+
+class Vocabulary:
+    """
+    Running id -> code mapping, extended one batch dictionary at a time
+    (a dict in insertion order: growing a pd.Index rehashes all of it).
+    """
+
+    def __init__(self, ids=None):
+        self.lookup = {str(v): i for i, v in enumerate(ids)} if ids is not None else {}
+        self.frozen = ids is not None
+
+    @property
+    def index(self):
+        return pd.Index(list(self.lookup), dtype=str)
+
+    def codes(self, column):
+        """Codes of an Arrow id column (-1 for ids outside a frozen vocabulary)."""
+        encoded = pc.dictionary_encode(column.cast('string'))
+        values = encoded.dictionary.to_pylist()
+        if self.frozen:
+            codes = [self.lookup.get(v, -1) for v in values]
+        else:
+            codes = [self.lookup.setdefault(v, len(self.lookup)) for v in values]
+        lookup = np.array(codes, dtype=np.int64)
+        indices = encoded.indices.fill_null(len(lookup)).to_numpy(zero_copy_only=False)
+        return np.r_[lookup, -1][indices].astype(np.int64)
+
+
+def reduce_cells(columns, counts):
+    """Distinct rows of integer columns (sorted, first column slowest) with their counts summed."""
+    if not len(counts):
+        return columns, counts
+    # One int64 key per row (mixed radix over the column ranges: int32 codes
+    # times a few years of days), sorted once
+    key = np.zeros(len(counts), dtype=np.int64)
+    for c in columns:
+        low, high = int(c.min()), int(c.max())
+        key = key * (high - low + 1) + (c - low)
+    order = np.argsort(key, kind='stable')
+    key = key[order]
+    columns = [c[order] for c in columns]
+    first = np.r_[True, key[1:] != key[:-1]]
+    starts = np.flatnonzero(first)
+    return [c[starts] for c in columns], np.add.reduceat(counts[order], starts)
+
+
+def merge_cells(parts):
+    """reduce_cells over the concatenation of several (columns, counts) parts."""
+    columns = [np.concatenate([p[0][i] for p in parts]) for i in range(len(parts[0][0]))]
+    return reduce_cells(columns, np.concatenate([p[1] for p in parts]))
+
+
+def batch_ordinals(batch):
+    """rec_pipeline.add_ordinals on an Arrow batch (month names via the batch dictionary)."""
+    month = pc.dictionary_encode(batch.column('month').cast('string'))
+    names = month.dictionary.to_numpy(zero_copy_only=False).astype(str)
+    month_idx = np.array([rp.MONTH_TO_INDEX.get(m, 0) for m in names], dtype=np.int64)
+    year = batch.column('year').cast('int64').to_numpy()
+    day = batch.column('day_of_month').cast('int64').to_numpy()
+    return (year * rp.DAYS_PER_YEAR + month_idx[month.indices.to_numpy(zero_copy_only=False)]
+            * rp.DAYS_PER_MONTH + day - 1)
+
+
+class AppOpens:
+    """Daily open counters per adventurer and per (adventurer, publisher), with sessions."""
+
+    def __init__(self, user, pub, ordinal, users, publishers, session_gap=SESSION_GAP, counts=None):
+        """One row per open, or per cell with counts opens."""
+        user = np.asarray(user, dtype=np.int64)
+        pub = np.asarray(pub, dtype=np.int64)
+        ordinal = np.asarray(ordinal, dtype=np.int64)
+        counts = np.ones(len(user), dtype=np.int64) if counts is None else np.asarray(counts)
+        self.users = pd.Index(users)
+        self.publishers = pd.Index(publishers)
+        self.rows = int(counts.sum())
+        no_seconds = np.zeros(len(user))
+        self.days = EngagementCube(np.where(user >= 0, user, -1), ordinal, no_seconds, counts)
+        self.pairs = EngagementCube(
+            np.where((user >= 0) & (pub >= 0), user * len(self.publishers) + pub, -1), ordinal, no_seconds,
+            counts)
+
+        # Sessions over the (adventurer, day) cells, which are sorted by adventurer then day
+        cell_user = self.days.key // self.days.span
+        gap = np.diff(self.days.day) - 1
+        starts = np.r_[True, (cell_user[1:] != cell_user[:-1]) | (gap > session_gap)]
+        self.cum_sessions = np.r_[0, np.cumsum(starts)]
+        self.session_gap = session_gap
+
+    @classmethod
+    def stream(cls, root=ROOT, users=None, publishers=None, batch_rows=BATCH_ROWS,
+               session_gap=SESSION_GAP):
+        """
+        Read root/app_opens.parquet (file or partitioned dataset) batch by
+        batch. Given users / publishers, codes follow them and other ids are
+        dropped; otherwise the vocabularies are built as ids appear.
+
+        Each batch becomes (adventurer, publisher, day) cells with counts;
+        the pending cells are merged whenever they outgrow twice the last
+        merge, so memory follows the number of distinct cells.
+        """
+        dataset = ds.dataset(Path(root) / TABLE, format='parquet', partitioning='hive')
+        user_vocab, pub_vocab = Vocabulary(users), Vocabulary(publishers)
+        parts = [([np.empty(0, np.int32)] * 3, np.empty(0, np.int64))]
+        merged = held = 0
+        for batch in dataset.to_batches(columns=COLUMNS, batch_size=batch_rows):
+            user = user_vocab.codes(batch.column('adventurer_id')).astype(np.int32)
+            pub = pub_vocab.codes(batch.column('publisher_id')).astype(np.int32)
+            ordinal = batch_ordinals(batch).astype(np.int32)
+            keep = user >= 0
+            parts.append(reduce_cells([user[keep], pub[keep], ordinal[keep]],
+                                      np.ones(int(keep.sum()), dtype=np.int64)))
+            held += len(parts[-1][1])
+            if held > 2 * merged + batch_rows:
+                parts = [merge_cells(parts)]
+                merged = held = len(parts[0][1])
+        (user, pub, ordinal), counts = merge_cells(parts)
+        return cls(user, pub, ordinal, user_vocab.index, pub_vocab.index, session_gap, counts)
+
+    def codes(self, adventurer_ids, publisher_ids=None):
+        """Adventurer (and pair) codes of ids (-1 when never seen)."""
+        user = self.users.get_indexer(pd.Index(adventurer_ids).astype(str))
+        if publisher_ids is None:
+            return user
+        pub = self.publishers.get_indexer(pd.Index(publisher_ids).astype(str))
+        return user, np.where((user >= 0) & (pub >= 0), user * len(self.publishers) + pub, -1)
+
+    def features(self, user, pair, start, cutoff, window=WINDOW):
+        """
+        Churn features at cutoff for adventurer codes user and pair codes pair
+        (see codes()); start is the subscription ordinal.
+
+            open_days_30        days with an open in the last window days
+            sessions_30         sessions starting in the last window days
+            days_since_last_open    since the last open up to cutoff
+                                    (cutoff - start when there is none)
+            pair_opens          opens of the subscription's publisher since start
+            pair_days_since_last_open   same recency, that publisher only
+        """
+        start = np.asarray(start, dtype=np.int64)
+        cutoff = np.asarray(cutoff, dtype=np.int64)
+        since = cutoff - window + 1
+        lo, hi = self.days.bounds(user, since, cutoff)
+        recent = pd.DataFrame({
+            'open_days_30': hi - lo,
+            'sessions_30': self.cum_sessions[hi] - self.cum_sessions[lo],
+        })
+        lo, hi = self.days.bounds(user, self.days.base, cutoff)
+        last = np.where(hi > lo, self.days.day[np.maximum(hi - 1, 0)] + self.days.base, -1)
+        recent['days_since_last_open'] = np.where(last >= 0, cutoff - last, cutoff - start)
+
+        pair = self.pairs.engagement(pair, start, cutoff, window)
+        recent['pair_opens'] = pair['views'].to_numpy()
+        last = pair['last_view_ordinal'].to_numpy()
+        recent['pair_days_since_last_open'] = np.where(last >= 0, cutoff - last, cutoff - start)
+        return recent
+
+    def profiles(self, until=None):
+        """Per-adventurer open totals, sessions and recency (persona profile columns)."""
+        cell_user = self.days.key // self.days.span
+        last_day = self.days.day + self.days.base
+        until = int(last_day.max()) if until is None else until
+        keep = last_day <= until
+        cell_user, last_day = cell_user[keep], last_day[keep]
+        opens = np.diff(self.days.cum_views)[keep]
+        starts = np.diff(self.cum_sessions)[keep]
+        n = len(self.users)
+        open_days = np.bincount(cell_user, minlength=n)
+        sessions = np.bincount(cell_user, weights=starts, minlength=n).astype(np.int64)
+        last = np.full(n, -1, dtype=np.int64)
+        last[cell_user] = last_day      # cells are day-sorted within each adventurer
+        return pd.DataFrame({
+            'adventurer_id': self.users.astype(str),
+            'num_opens': np.bincount(cell_user, weights=opens, minlength=n).astype(np.int64),
+            'open_days': open_days,
+            'num_sessions': sessions,
+            'avg_session_days': open_days / np.maximum(sessions, 1),
+            'days_since_last_open': np.where(last >= 0, until - last, np.nan),
+        })
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument('--root', default=str(ROOT), help="week folder or synthetic dataset")
+    parser.add_argument('--batch-rows', type=int, default=BATCH_ROWS)
+    args = parser.parse_args()
+    root = Path(args.root) if Path(args.root).is_absolute() else ROOT / args.root
+
+    print("APP OPENS")
+    print(f"Data: {root}")
+
+    print(f"\n[1] Streaming {TABLE} ({args.batch_rows:,} rows per batch)")
+    start = time.perf_counter()
+    opens = AppOpens.stream(root, batch_rows=args.batch_rows)
+    print(f"   {opens.rows:,} opens from {len(opens.users):,} adventurers, "
+          f"{len(opens.publishers)} publishers in {time.perf_counter() - start:.2f}s")
+    print(f"   Cells: {len(opens.days.key):,} (adventurer, day), {len(opens.pairs.key):,} (pair, day)")
+
+    print("\n[2] Profiles")
+    profiles = opens.profiles()
+    print(profiles.drop(columns='adventurer_id').describe().round(2).to_string())
@@ -0,0 +1,298 @@
+"""
+Rolling-origin backtest over day ordinals.
+
+For each cutoff in CUTOFFS the recommenders are trained on everything up to
+the cutoff and scored on the next HORIZON days, and the churn models are
+trained on the previous cutoff's (now matured) labels and scored on this
+cutoff's labels. State is advanced between cutoffs instead of rebuilt:
+
+- the user-item matrix and its Gram matrix (X^T X) are updated with only the
+  views that arrived since the last cutoff,
+- trending counts come from a single ordinal-sorted event array,
+- churn features come from one feature_store.ChurnFeatureStore, built for
+  every cutoff in a single sweep before the loop and cached (each cutoff's
+  features become the next cutoff's training set).
+"""
+
+import sys
+import time
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from scipy import sparse
+from sklearn.metrics import roc_auc_score, f1_score
+from sklearn.preprocessing import StandardScaler
+import warnings
+warnings.filterwarnings('ignore')
+
+ROOT = Path(__file__).resolve().parent
+P = lambda name: ROOT / name
+
+sys.path.insert(0, str(ROOT.parent / "week5"))
+import rec_pipeline as rp
+from app_opens import AppOpens
+from feature_store import ChurnFeatureStore, CHURN_FEATURES
+import churn_model
+
+DAYS_PER_MONTH = rp.DAYS_PER_MONTH
+CURRENT_ORDINAL = 10235 * rp.DAYS_PER_YEAR + rp.MONTH_TO_INDEX["Verdantia"] * DAYS_PER_MONTH
+HORIZON = DAYS_PER_MONTH
+# Monthly cutoffs ending at churn.py's train_cutoff (current - 48 days)
+CUTOFFS = list(range(CURRENT_ORDINAL - 8 * DAYS_PER_MONTH, CURRENT_ORDINAL - 2 * DAYS_PER_MONTH + 1, DAYS_PER_MONTH))
+N_RECS = 2
+
+
+# ---------------------------------------------------------------------------
+# Recommenders
+# ---------------------------------------------------------------------------
+
+class InteractionState:
+    """
+    User-item interactions up to the current cutoff, advanced window by window.
+
+    Pairs are stored as sorted codes (user * n_items + item) with the max
+    watch_pct seen so far; the Gram matrix G = C^T C of the binary matrix C is
+    updated as G += D^T C + C^T D + D^T D for the newly seen pairs D.
+    """
+
+    def __init__(self, n_users, n_items):
+        self.n_users = n_users
+        self.n_items = n_items
+        self.codes = np.zeros(0, dtype=np.int64)
+        self.watch = np.zeros(0, dtype=np.float32)
+        self.gram = np.zeros((n_items, n_items), dtype=np.float64)
+
+    def _matrix(self, codes, values=None):
+        values = np.ones(len(codes), dtype=np.float32) if values is None else values
+        return sparse.csr_matrix(
+            (values, (codes // self.n_items, codes % self.n_items)),
+            shape=(self.n_users, self.n_items), dtype=np.float32
+        )
+
+    def advance(self, codes, watch):
+        """Add a window of (code, watch_pct) interactions."""
+        if len(codes) == 0:
+            return
+        codes, watch = rp.max_per_code(codes, watch)
+        pos = np.searchsorted(self.codes, codes)
+        known = np.zeros(len(codes), dtype=bool)
+        if len(self.codes):
+            pos_clip = np.minimum(pos, len(self.codes) - 1)
+            known = self.codes[pos_clip] == codes
+            self.watch[pos[known]] = np.maximum(self.watch[pos[known]], watch[known])
+
+        new_codes = codes[~known]
+        if len(new_codes):
+            old = self._matrix(self.codes)
+            delta = self._matrix(new_codes)
+            cross = (delta.T @ old).toarray()
+            self.gram += cross + cross.T + (delta.T @ delta).toarray()
+            self.codes = np.insert(self.codes, pos[~known], new_codes)
+            self.watch = np.insert(self.watch, pos[~known], watch[~known])
+
+    def binary(self):
+        return self._matrix(self.codes)
+
+    def weighted(self):
+        return self._matrix(self.codes, self.watch)
+
+
+class RecommenderBacktest:
+    """Collaborative, hybrid and trending recommenders evaluated over cutoffs."""
+
+    def __init__(self, tables, publisher_id=None):
+        df_subs = tables['subs']
+        self.publisher_id = publisher_id or rp.top_publisher(df_subs)
+        events = rp.scope_to_publisher(tables['views'], df_subs, self.publisher_id)
+        events = rp.add_watch_pct(rp.add_ordinals(events.copy()), tables['metadata'])
+        events = events.sort_values('ordinal', kind='stable').reset_index(drop=True)
+
+        self.users = pd.Index(events['adventurer_id'].unique())
+        self.items = pd.Index(events['content_id'].unique())
+        self.ordinal = events['ordinal'].to_numpy(np.int64)
+        self.item_code = self.items.get_indexer(events['content_id'])
+        self.user_code = self.users.get_indexer(events['adventurer_id'])
+        self.watch = events['watch_pct'].fillna(0).to_numpy(np.float32)
+        self.clean = rp.engagement_mask(events).to_numpy()
+
+        lang = tables['adventurers'].set_index('adventurer_id')['primary_language']
+        self.user_lang = lang.reindex(self.users).to_numpy(object)
+        meta = tables['metadata'].drop_duplicates('content_id').set_index('content_id')
+        self.item_lang = meta['language_code'].reindex(self.items).to_numpy(object)
+        self.content_sim = rp.content_similarity(tables['metadata'], self.items)
+
+        self.state = InteractionState(len(self.users), len(self.items))
+        self.position = 0
+
+    def advance_to(self, cutoff):
+        end = np.searchsorted(self.ordinal, cutoff, side='right')
+        window = slice(self.position, end)
+        keep = self.clean[window]
+        codes = self.user_code[window][keep].astype(np.int64) * len(self.items) + self.item_code[window][keep]
+        self.state.advance(codes, self.watch[window][keep])
+        self.position = end
+
+    def trending_counts(self, cutoff):
+        """heuristic_recommender.py window: 60 days, widened to 120 if under 100 views."""
+        for window in (rp.TRENDING_WINDOW, rp.TRENDING_FALLBACK_WINDOW):
+            lo = np.searchsorted(self.ordinal, cutoff - window, side='right')
+            hi = np.searchsorted(self.ordinal, cutoff, side='right')
+            if hi - lo >= rp.TRENDING_MIN_VIEWS:
+                break
+        return np.bincount(self.item_code[lo:hi], minlength=len(self.items))
+
+    def liked_after(self, cutoff, horizon, seen):
+        """Items each user first watched >= WATCH_THRESHOLD in (cutoff, cutoff + horizon]."""
+        lo = np.searchsorted(self.ordinal, cutoff, side='right')
+        hi = np.searchsorted(self.ordinal, cutoff + horizon, side='right')
+        liked = self.watch[lo:hi] >= rp.WATCH_THRESHOLD
+        users, items = self.user_code[lo:hi][liked], self.item_code[lo:hi][liked]
+        fresh = np.asarray(seen[users, items]).ravel() == 0
+        test = pd.DataFrame({'u': users[fresh], 'i': items[fresh]}).drop_duplicates()
+        return test.groupby('u')['i'].agg(set).to_dict()
+
+    def evaluate(self, cutoff, horizon=HORIZON, n_recs=N_RECS):
+        self.advance_to(cutoff)
+        binary = self.state.binary()
+        liked = self.liked_after(cutoff, horizon, binary)
+        train_users = np.unique(self.state.codes // len(self.items))
+        eval_users = np.intersect1d(np.fromiter(liked, dtype=np.int64, count=len(liked)), train_users)
+        if len(eval_users) == 0:
+            return []
+
+        collab_sim = rp.cosine_from_gram(self.state.gram)
+        rows_bin = binary[eval_users]
+        rows_w = self.state.weighted()[eval_users]
+        hybrid_sim = rp.ALPHA * collab_sim + rp.BETA * self.content_sim
+
+        scores = {
+            'collaborative': rp.score_collaborative(rows_bin, rp.knn_graph(collab_sim, rp.N_NEIGHBORS)),
+            'hybrid': rp.score_hybrid(rows_w, hybrid_sim),
+        }
+        counts = self.trending_counts(cutoff)
+        trending = np.vstack([
+            rp.trending_scores(counts, self.item_lang, self.user_lang[u]) for u in eval_users
+        ])
+        scores['trending'] = rp.mask_seen(trending, rows_bin)
+
+        liked_eval = {u: liked[u] for u in eval_users}
+        results = []
+        for method, method_scores in scores.items():
+            top = rp.top_n(method_scores, n_recs)
+            recs = {u: [i for i in row if i >= 0] for u, row in zip(eval_users, top)}
+            per_user = rp.precision_recall_at_k(recs, liked_eval, n_recs)
+            rec_items = np.unique(top[top >= 0])
+            _, ci_low, ci_high = rp.bootstrap_ci(per_user['precision'].to_numpy())
+            results.append({
+                'cutoff': cutoff,
+                'model': method,
+                'users': len(per_user),
+                f'precision@{n_recs}': per_user['precision'].mean(),
+                'precision_ci_low': ci_low,
+                'precision_ci_high': ci_high,
+                f'recall@{n_recs}': per_user['recall'].mean(),
+                'hit_rate': per_user['hit'].mean(),
+                'coverage': len(rec_items) / len(self.items),
+            })
+        return results
+
+
+# ---------------------------------------------------------------------------
+# Churn
+# ---------------------------------------------------------------------------
+
+class ChurnBacktest:
+    """
+    churn.py's features and models at every cutoff, without leakage: only
+    subscriptions, cancellations and views on or before the cutoff are used.
+    """
+
+    def __init__(self, tables, opens):
+        self.store = ChurnFeatureStore(tables, opens, horizon=HORIZON)
+
+    def features(self, cutoff):
+        """Feature frame + churn label for subscriptions active at cutoff (cached)."""
+        return self.store.features(cutoff)
+
+    def evaluate(self, cutoff, train_cutoff):
+        train = self.features(train_cutoff)
+        test = self.features(cutoff)
+        X_tr, y_tr = train[CHURN_FEATURES].fillna(0), train['churn']
+        X_te, y_te = test[CHURN_FEATURES].fillna(0), test['churn']
+        if y_tr.nunique() < 2 or y_te.nunique() < 2:
+            return []
+
+        scaler = StandardScaler()
+        lr = churn_model.make_model('lr')
+        lr.fit(scaler.fit_transform(X_tr), y_tr)
+        rf = churn_model.make_model('rf', n_jobs=-1)
+        rf.fit(X_tr, y_tr)
+        hgb = churn_model.make_model('hgb')
+        hgb.fit(X_tr, y_tr)
+
+        results = []
+        for name, model, X in [('churn_lr', lr, scaler.transform(X_te)), ('churn_rf', rf, X_te),
+                               ('churn_hgb', hgb, X_te)]:
+            prob = model.predict_proba(X)[:, 1]
+            results.append({
+                'cutoff': cutoff,
+                'model': name,
+                'users': len(test),
+                'roc_auc': roc_auc_score(y_te, prob),
+                'f1': f1_score(y_te, (prob > 0.5).astype(int)),
+                'churn_rate': y_te.mean(),
+                'train_rows': len(train),
+            })
+        return results
+
+
+def run_backtest(tables, opens, cutoffs=CUTOFFS, horizon=HORIZON, n_recs=N_RECS):
+    """Metric trajectories for every recommender and churn model over sorted cutoffs."""
+    cutoffs = sorted(cutoffs)
+    recs = RecommenderBacktest(tables)
+    churn = ChurnBacktest(tables, opens)
+    # Train on the latest cutoff whose labels have matured by each cutoff
+    train_cutoffs = [min(prev, cutoff - horizon)
+                     for prev, cutoff in zip([cutoffs[0] - DAYS_PER_MONTH] + cutoffs[:-1], cutoffs)]
+    churn.store.build(train_cutoffs + cutoffs)
+    rows = []
+    for cutoff, train_cutoff in zip(cutoffs, train_cutoffs):
+        start = time.perf_counter()
+        step = recs.evaluate(cutoff, horizon, n_recs)
+        step += churn.evaluate(cutoff, train_cutoff)
+        elapsed = time.perf_counter() - start
+        for row in step:
+            row['seconds'] = elapsed
+        rows.extend(step)
+        print(f"   cutoff {cutoff}: {len(step)} model results ({elapsed:.2f}s)")
+    return pd.DataFrame(rows)
+
+
+def summarize(results, n_recs=N_RECS):
+    """Mean / std / min / max of each model's headline metric across cutoffs."""
+    headline = results[f'precision@{n_recs}']
+    if 'roc_auc' in results.columns:
+        headline = results['roc_auc'].fillna(headline)
+    return results.assign(metric=headline).groupby('model')['metric'].agg(['mean', 'std', 'min', 'max'])
+
+
+if __name__ == "__main__":
+    print("ROLLING-ORIGIN BACKTEST")
+    print(f"Cutoffs: {CUTOFFS}")
+    print(f"Horizon: {HORIZON} days")
+
+    print("\n[1] Loading data")
+    tables = rp.load_tables(ROOT, cache=True)
+    opens = AppOpens.stream(ROOT)
+
+    print("\n[2] Running backtest")
+    results = run_backtest(tables, opens)
+
+    print("\n[3] Metric trajectories")
+    print(results.round(3).to_string(index=False))
+
+    print("\n[4] Stability (precision for recommenders, ROC-AUC for churn)")
+    print(summarize(results).round(3))
+
+    results.to_csv(P('backtest_results.csv'), index=False)
+    print("\n   ✓ Saved backtest_results.csv")
@@ -0,0 +1,390 @@
+"""
+Benchmark suite for the recommender and churn pipelines.
+
+Times and memory-profiles every stage on the real week6 data and on the
+synthetic datasets from synthetic_data.py:
+
+    load             read the five parquet tables
+    load_cached      the same tables from the memory-mapped Arrow IPC cache
+    clean            dedupe, watch_pct, engagement filter, ordinals, publisher scope
+    matrix           binary + watch-weighted user x item matrices
+    similarity       item cosine, kNN graph, hybrid (collaborative + content) matrix
+    recommend        per-user latency (p50/p95/p99) and batch throughput for the
+                     collaborative, hybrid and trending recommenders
+    churn_features   leakage-free churn features at churn.py's training cutoff
+    clustering       personas.py user profiles + scaling + KMeans
+    evaluation       precision@k / recall@k with bootstrap CIs on the last month
+
+Each stage is timed REPEATS times (wall and CPU), then run once more under
+tracemalloc for its peak allocation (numpy buffers are traced, Arrow's
+allocator is not). rss_growth_mb is the largest change in current RSS
+(/proc/self/statm) across one timed run, i.e. what a run leaves resident.
+Results go to benchmark_results.json and are compared with
+benchmark_baseline.json: a stage that is slower (or bigger) than the baseline
+by more than TOLERANCE is flagged as a regression and the script exits 1.
+With two or more synthetic scales the log-log slope of time vs. rows is reported as
+the stage's scaling exponent.
+
+Usage:
+    python benchmark.py                      # real data + 1x + 10x synthetic
+    python benchmark.py real 10 100
+    python benchmark.py --save-baseline      # store this run as the baseline
+"""
+
+import argparse
+import json
+import platform
+import resource
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from sklearn.cluster import KMeans
+from sklearn.preprocessing import StandardScaler
+import warnings
+warnings.filterwarnings('ignore')
+
+ROOT = Path(__file__).resolve().parent
+P = lambda name: ROOT / name
+
+sys.path.insert(0, str(ROOT.parent / "week5"))
+import rec_pipeline as rp
+from arrow_cache import ArrowCache
+import synthetic_data
+from app_opens import AppOpens
+from backtest import ChurnBacktest, CURRENT_ORDINAL
+
+DATASETS = ['real', '1', '10']
+REPEATS = 3
+N_RECS = 2
+LATENCY_USERS = 500         # users timed one call at a time
+BATCH_SIZE = 1024           # users scored per call in batch mode
+N_CLUSTERS = 5
+TRAIN_CUTOFF = CURRENT_ORDINAL - 2 * rp.DAYS_PER_MONTH   # churn.py's training cutoff
+TOLERANCE = 0.20            # >20% slower / bigger than baseline = regression
+MIN_DELTA_SECONDS = 0.005   # ignore differences below timer noise
+MIN_DELTA_MB = 1.0
+
+RESULTS_FILE = P("benchmark_results.json")
+BASELINE_FILE = P("benchmark_baseline.json")
+COMPARED = ['seconds_median', 'p95_ms', 'peak_mb']
+
+
+def dataset_root(name):
+    """'real' is the week6 folder; a number is a synthetic scale (generated on demand)."""
+    if name == 'real':
+        return ROOT
+    scale = float(name)
+    root = synthetic_data.dataset_dir(scale)
+    if not (root / "content_views.parquet").exists():
+        synthetic_data.generate(scale)
+    return root
+
+
+def rss_mb():
+    """Current resident set size of this process (NaN where /proc is not available)."""
+    try:
+        pages = int(Path('/proc/self/statm').read_text().split()[1])
+    except OSError:
+        return float('nan')
+    return pages * resource.getpagesize() / 2**20
+
+
+# ---------------------------------------------------------------------------
+# Stages: each takes the shared context dict and returns (outputs, rows, extra)
+# ---------------------------------------------------------------------------
+
+def stage_load(ctx):
+    tables = rp.load_tables(ctx['root'])
+    return {'tables': tables}, sum(len(df) for df in tables.values()), {}
+
+
+def stage_load_cached(ctx):
+    """Arrow IPC cache read; the parquet tables stay the input of later stages."""
+    tables = rp.load_tables(ctx['root'], cache=True)
+    return {}, sum(len(df) for df in tables.values()), {}
+
+
+def stage_clean(ctx):
+    tables = ctx['tables']
+    views = rp.add_ordinals(rp.clean_views(tables['views'], tables['metadata']))
+    publisher_id = rp.top_publisher(tables['subs'])
+    scoped = rp.scope_to_publisher(views, tables['subs'], publisher_id)
+    return {'views': views, 'scoped': scoped}, len(tables['views']), {'scoped_views': len(scoped)}
+
+
+def stage_matrix(ctx):
+    scoped = ctx['scoped']
+    split = int(scoped['ordinal'].max()) - rp.DAYS_PER_MONTH
+    train = scoped[scoped['ordinal'] <= split]
+    items = pd.Index(scoped['content_id'].unique())
+    binary, users, items = rp.build_user_item(train, items=items)
+    weighted, _, _ = rp.build_user_item(train, value_col='watch_pct', users=users, items=items)
+    out = {'split': split, 'train': train, 'test': scoped[scoped['ordinal'] > split],
+           'binary': binary, 'weighted': weighted, 'users': users, 'items': items}
+    return out, len(train), {'users': len(users), 'items': len(items), 'nnz': int(binary.nnz)}
+
+
+def stage_similarity(ctx):
+    cos = rp.item_cosine(ctx['binary'])
+    knn = rp.knn_graph(cos)
+    sim = rp.ALPHA * cos + rp.BETA * rp.content_similarity(ctx['tables']['metadata'], ctx['items'])
+    return {'knn': knn, 'sim': sim}, len(ctx['items']), {}
+
+
+def trending_inputs(ctx):
+    """Recent per-item view counts and user/item languages for recommend_trending."""
+    train, items, users = ctx['train'], ctx['items'], ctx['users']
+    recent = train[train['ordinal'] > ctx['split'] - rp.TRENDING_WINDOW]
+    counts = np.bincount(items.get_indexer(recent['content_id']), minlength=len(items))
+    tables = ctx['tables']
+    item_lang = tables['metadata'].drop_duplicates('content_id').set_index('content_id')['language_code']
+    user_lang = tables['adventurers'].set_index('adventurer_id')['primary_language']
+    return counts, item_lang.reindex(items).to_numpy(), user_lang.reindex(users).to_numpy()
+
+
+def recommenders(ctx):
+    binary, weighted, knn, sim = ctx['binary'], ctx['weighted'], ctx['knn'], ctx['sim']
+    counts, item_lang, user_lang = trending_inputs(ctx)
+    return {
+        'collaborative': lambda rows: rp.score_collaborative(binary[rows], knn),
+        'hybrid': lambda rows: rp.score_hybrid(weighted[rows], sim),
+        'trending': lambda rows: np.stack([
+            rp.mask_seen(rp.trending_scores(counts, item_lang, user_lang[r])[None, :], binary[r])[0]
+            for r in rows]),
+    }
+
+
+def stage_recommend(ctx):
+    methods = recommenders(ctx)
+    n_users = ctx['binary'].shape[0]
+    sample = np.random.default_rng(42).choice(n_users, size=min(LATENCY_USERS, n_users), replace=False)
+    extra, recs = {}, {}
+    for name, score in methods.items():
+        latencies = np.empty(len(sample))
+        for j, row in enumerate(sample):
+            start = time.perf_counter()
+            rp.top_n(score([row]), N_RECS)
+            latencies[j] = time.perf_counter() - start
+        p50, p95, p99 = np.percentile(latencies * 1000, [50, 95, 99])
+        extra.update({f'{name}_p50_ms': p50, f'{name}_p95_ms': p95, f'{name}_p99_ms': p99})
+
+        start = time.perf_counter()
+        out = np.empty((n_users, N_RECS), dtype=np.int64)
+        for lo in range(0, n_users, BATCH_SIZE):
+            rows = np.arange(lo, min(lo + BATCH_SIZE, n_users))
+            out[rows] = rp.top_n(score(rows), N_RECS)
+        extra[f'{name}_batch_users_per_s'] = n_users / (time.perf_counter() - start)
+        recs[name] = out
+    extra['p95_ms'] = max(extra[f'{name}_p95_ms'] for name in methods)
+    return {'recs': recs}, n_users, extra
+
+
+def stage_churn_features(ctx):
+    churn = ChurnBacktest(ctx['tables'], AppOpens.stream(ctx['root']))
+    features = churn.features(TRAIN_CUTOFF)
+    return {'churn_features': features}, len(features), {'churn_rate': float(features['churn'].mean())}
+
+
+def stage_clustering(ctx):
+    """personas.py's behavioural profile and KMeans, at a single k."""
+    tables, views = ctx['tables'], ctx['views']
+    viewing = views.groupby('adventurer_id').agg(
+        total_watch_time=('seconds_viewed', 'sum'), avg_watch_time=('seconds_viewed', 'mean'),
+        num_views=('seconds_viewed', 'size'), unique_content=('content_id', 'nunique'),
+        avg_completion_rate=('watch_pct', 'mean'))
+    subs = tables['subs'].groupby('adventurer_id').agg(
+        num_subscriptions=('publisher_id', 'size'), num_publishers=('publisher_id', 'nunique'))
+    churns = tables['cancels'].groupby('adventurer_id').size().rename('num_churns')
+    enriched = views[['adventurer_id', 'content_id']].merge(
+        tables['metadata'][['content_id', 'genre_id', 'language_code']], on='content_id', how='left')
+    diversity = enriched.groupby('adventurer_id').agg(
+        genre_diversity=('genre_id', 'nunique'), lang_diversity=('language_code', 'nunique'))
+    profiles = tables['adventurers'][['adventurer_id']].set_index('adventurer_id')
+    profiles = profiles.join([viewing, subs, churns, diversity]).fillna(0)
+    X = StandardScaler().fit_transform(profiles.to_numpy(np.float64))
+    labels = KMeans(n_clusters=N_CLUSTERS, random_state=42, n_init=3).fit_predict(X)
+    return {'clusters': labels}, len(profiles), {}
+
+
+def stage_evaluation(ctx):
+    test, users, items = ctx['test'], ctx['users'], ctx['items']
+    liked_rows = test[test['watch_pct'] >= rp.WATCH_THRESHOLD]
+    liked_rows = liked_rows[liked_rows['adventurer_id'].isin(users)]
+    liked = liked_rows.groupby('adventurer_id')['content_id'].agg(set).to_dict()
+    extra = {'eval_users': len(liked)}
+    for name, out in ctx['recs'].items():
+        rows = users.get_indexer(list(liked))
+        recs = {u: [items[i] for i in out[r] if i >= 0] for u, r in zip(liked, rows)}
+        per_user = rp.precision_recall_at_k(recs, liked, N_RECS)
+        mean, low, high = rp.bootstrap_ci(per_user['precision'].to_numpy()) if len(per_user) else (np.nan,) * 3
+        extra.update({f'{name}_precision': mean, f'{name}_precision_ci': [low, high]})
+    return {}, len(liked_rows), extra
+
+
+STAGES = [
+    ('load', stage_load),
+    ('load_cached', stage_load_cached),
+    ('clean', stage_clean),
+    ('matrix', stage_matrix),
+    ('similarity', stage_similarity),
+    ('recommend', stage_recommend),
+    ('churn_features', stage_churn_features),
+    ('clustering', stage_clustering),
+    ('evaluation', stage_evaluation),
+]
+
+
+# ---------------------------------------------------------------------------
+# Runner
+# ---------------------------------------------------------------------------
+
+def measure(stage, ctx, repeats=REPEATS):
+    """Wall/CPU time and RSS growth over `repeats` runs, then one tracemalloc run for peak memory."""
+    walls, cpus, rss_growth = [], [], []
+    for _ in range(repeats):
+        rss_before = rss_mb()
+        wall, cpu = time.perf_counter(), time.process_time()
+        outputs, rows, extra = stage(ctx)
+        walls.append(time.perf_counter() - wall)
+        cpus.append(time.process_time() - cpu)
+        rss_growth.append(rss_mb() - rss_before)
+
+    tracemalloc.start()
+    stage(ctx)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    result = {
+        'rows': int(rows),
+        'seconds_min': min(walls),
+        'seconds_median': float(np.median(walls)),
+        'cpu_seconds': float(np.median(cpus)),
+        'peak_mb': peak / 2**20,
+        'rss_growth_mb': max(rss_growth),
+        **extra,
+    }
+    return outputs, result
+
+
+def run_dataset(name, repeats=REPEATS):
+    root = dataset_root(name)
+    ArrowCache(root).ensure()   # build outside the timed runs
+    ctx = {'root': root}
+    rows = []
+    for stage_name, stage in STAGES:
+        outputs, result = measure(stage, ctx, repeats)
+        ctx.update(outputs)
+        rows.append({'dataset': name, 'stage': stage_name, **result})
+        print(f"   {stage_name:<16} {result['seconds_median']:>9.3f}s  "
+              f"cpu {result['cpu_seconds']:>8.3f}s  peak {result['peak_mb']:>9.1f} MB  "
+              f"rows {result['rows']:>12,}")
+    return rows
+
+
+def scaling_exponents(results):
+    """Log-log slope of median time vs. rows per stage, across synthetic scales."""
+    out = {}
+    for stage, group in results[results['dataset'] != 'real'].groupby('stage', sort=False):
+        group = group[(group['rows'] > 0) & (group['seconds_median'] > 0)]
+        if group['rows'].nunique() >= 2:
+            slope = np.polyfit(np.log(group['rows']), np.log(group['seconds_median']), 1)[0]
+            out[stage] = float(slope)
+    return out
+
+
+def compare(results, baseline, tolerance=TOLERANCE):
+    """Rows of (dataset, stage, metric, baseline, current, ratio) that regressed."""
+    base = {(r['dataset'], r['stage']): r for r in baseline['results']}
+    regressions = []
+    for r in results:
+        old = base.get((r['dataset'], r['stage']))
+        if old is None:
+            continue
+        for metric in COMPARED:
+            if metric not in r or metric not in old or not old[metric]:
+                continue
+            delta = r[metric] - old[metric]
+            floor = MIN_DELTA_MB if metric == 'peak_mb' else MIN_DELTA_SECONDS * (1000 if metric.endswith('_ms') else 1)
+            if delta > floor and r[metric] > old[metric] * (1 + tolerance):
+                regressions.append({'dataset': r['dataset'], 'stage': r['stage'], 'metric': metric,
+                                    'baseline': old[metric], 'current': r[metric],
+                                    'ratio': r[metric] / old[metric]})
+    return regressions
+
+
+def plot_scaling(results, path):
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    fig, ax = plt.subplots(figsize=(9, 6))
+    for stage, group in results.groupby('stage', sort=False):
+        group = group.sort_values('rows')
+        ax.loglog(group['rows'], group['seconds_median'], 'o-', label=stage)
+    ax.set_xlabel('Rows processed', fontsize=12, fontweight='bold')
+    ax.set_ylabel('Median wall time (s)', fontsize=12, fontweight='bold')
+    ax.set_title('Pipeline stage scaling', fontsize=14, fontweight='bold')
+    ax.grid(True, which='both', alpha=0.3)
+    ax.legend()
+    plt.tight_layout()
+    plt.savefig(path, dpi=150, bbox_inches='tight')
+    plt.close(fig)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument('datasets', nargs='*', default=DATASETS,
+                        help="'real' and/or synthetic scales (default: real 1 10)")
+    parser.add_argument('--repeats', type=int, default=REPEATS)
+    parser.add_argument('--save-baseline', action='store_true',
+                        help="store this run as the new baseline")
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE)
+    args = parser.parse_args()
+
+    print("PIPELINE BENCHMARK")
+    print(f"Datasets: {args.datasets}  (repeats={args.repeats})")
+
+    rows = []
+    for i, name in enumerate(args.datasets, 1):
+        print(f"\n[{i}] Dataset {name}")
+        rows.extend(run_dataset(name, args.repeats))
+
+    results = pd.DataFrame(rows)
+    exponents = scaling_exponents(results)
+    if exponents:
+        print("\n[Scaling] time ~ rows^k")
+        for stage, k in exponents.items():
+            print(f"   {stage:<16} k = {k:.2f}")
+
+    report = {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'machine': {'python': platform.python_version(), 'platform': platform.platform(),
+                    'numpy': np.__version__, 'pandas': pd.__version__},
+        'repeats': args.repeats,
+        'results': json.loads(results.to_json(orient='records')),
+        'scaling_exponents': exponents,
+    }
+    RESULTS_FILE.write_text(json.dumps(report, indent=2))
+    print(f"\n   ✓ Saved {RESULTS_FILE.name}")
+    if exponents:
+        plot_scaling(results[results['dataset'] != 'real'], P('benchmark_scaling.png'))
+        print("   ✓ Saved benchmark_scaling.png")
+
+    if args.save_baseline:
+        BASELINE_FILE.write_text(json.dumps(report, indent=2))
+        print(f"   ✓ Saved {BASELINE_FILE.name}")
+    elif BASELINE_FILE.exists():
+        baseline = json.loads(BASELINE_FILE.read_text())
+        regressions = compare(report['results'], baseline, args.tolerance)
+        print(f"\n[Baseline] {BASELINE_FILE.name} from {baseline['created']}")
+        if regressions:
+            for r in regressions:
+                print(f"   ✗ REGRESSION {r['dataset']}/{r['stage']} {r['metric']}: "
+                      f"{r['baseline']:.4g} -> {r['current']:.4g} ({r['ratio']:.2f}x)")
+            sys.exit(1)
+        print(f"   ✓ No regressions beyond {args.tolerance:.0%}")
@@ -1,21 +1,33 @@
+import sys
 import numpy as np
 import pandas as pd
 from pathlib import Path
 from sklearn.model_selection import train_test_split
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.linear_model import LogisticRegression
 from sklearn.metrics import roc_auc_score, f1_score
 from sklearn.preprocessing import StandardScaler
+from stage_profiler import StageProfiler
+from app_opens import AppOpens
+from feature_store import ChurnFeatureStore, CHURN_FEATURES
+import subscription_episodes
+import subscriber_series
+import churn_model
 import warnings
 warnings.filterwarnings('ignore')
 
 ROOT = Path(__file__).resolve().parent
 P = lambda name: ROOT / name
 
+sys.path.insert(0, str(ROOT.parent / "week5"))
+import rec_pipeline as rp
+
+prof = StageProfiler("churn", report_dir=P("profiles"))
+
 MONTH_ORDER = ["Frostmere", "Emberfall", "Lunaris", "Verdantia", "Solstice",
                "Duskveil", "Starshade", "Aurorath", "Mysthaven", "Eclipsion"]
 MONTH_TO_INDEX = {m: i for i, m in enumerate(MONTH_ORDER)}
 DAYS_PER_MONTH = 24
+# Model used for the final predictions: 'lr', 'rf' or 'hgb' (all three are trained)
+SCORING_MODEL = 'rf'
 
 CURRENT_YEAR = 10235  
 CURRENT_MONTH = "Verdantia" 
@@ -35,11 +47,12 @@ def date_to_ordinal(year, month, day):
 
 
 print("\n[1] Loading data")
-df_subs = pd.read_parquet(P("subscriptions.parquet"))
-df_cancels = pd.read_parquet(P("cancellations.parquet"))
-df_views = pd.read_parquet(P("content_views.parquet"))
-df_metadata = pd.read_parquet(P("content_metadata.parquet"))
-df_adventurers = pd.read_parquet(P("adventurer_metadata.parquet"))
+prof.step("load")
+# Memory-mapped Arrow cache (arrow_cache.py): compact dtypes, ordinals and
+# categorical IDs without decoding parquet on every start
+tables = rp.load_tables(ROOT, cache=True)
+df_subs, df_cancels, df_views = tables['subs'], tables['cancels'], tables['views']
+df_metadata, df_adventurers = tables['metadata'], tables['adventurers']
 
 print(f"   Subscriptions: {len(df_subs):,}")
 print(f"   Cancellations: {len(df_cancels):,}")
@@ -48,22 +61,18 @@ print(f"   Adventurers: {len(df_adventurers):,}")
 
 
 print("\n[2] Preprocessing data")
-
-df_subs['sub_ordinal'] = df_subs.apply(
-    lambda x: date_to_ordinal(x['year'], x['month'], x['day_of_month']), axis=1
-)
-df_cancels['cancel_ordinal'] = df_cancels.apply(
-    lambda x: date_to_ordinal(x['year'], x['month'], x['day_of_month']), axis=1
-)
-df_views['view_ordinal'] = df_views.apply(
-    lambda x: date_to_ordinal(x['year'], x['month'], x['day_of_month']), axis=1
-)
-
-df_subs = df_subs.merge(
-    df_cancels[['adventurer_id', 'publisher_id', 'cancel_ordinal']],
-    on=['adventurer_id', 'publisher_id'],
-    how='left'
-)
+prof.step("preprocess")
+
+# Subscription episodes (subscriptions paired with their cancellations) and the
+# daily subscriber series (publisher features) read from the saved tables and
+# brought up to date; subscription, cancellation, view and app-open streams
+# sorted once so any cutoff is a batch of range queries
+episodes, action = subscription_episodes.materialize(tables, ROOT)
+print(f"   Subscription episodes: {len(episodes.table):,} ({action})")
+series, action = subscriber_series.materialize(tables, ROOT, episodes=episodes)
+print(f"   Subscriber series: {len(series.table):,} rows ({action})")
+store = ChurnFeatureStore(tables, AppOpens.stream(ROOT), horizon=DAYS_PER_MONTH,
+                          episodes=episodes, series=series)
 
 current_ordinal = date_to_ordinal(CURRENT_YEAR, CURRENT_MONTH, CURRENT_DAY)
 
@@ -73,116 +82,29 @@ print(f"   Current ordinal: {current_ordinal}")
 print(f"   Training cutoff: {train_cutoff} (2 months back)")
 
 
+print("\n[3] Engineering features (point-in-time, both cutoffs in one sweep)")
+prof.step("features")
+
+# Only events on or before each cutoff are used, so the training features
+# look exactly like the ones available when scoring
+store.build([train_cutoff, current_ordinal])
+train_features = store.features(train_cutoff)
+feature_cols = CHURN_FEATURES
+
+print(f"   Features: {', '.join(feature_cols)}")
+print(f"   Feature matrix: {train_features[feature_cols].shape}")
 
-print("\n[3] Creating labels")
-
-active_at_train = df_subs[
-    (df_subs['sub_ordinal'] <= train_cutoff) &
-    ((df_subs['cancel_ordinal'].isna()) | (df_subs['cancel_ordinal'] > train_cutoff))
-].copy()
-
-active_at_train['churn'] = (
-    (active_at_train['cancel_ordinal'].notna()) &
-    (active_at_train['cancel_ordinal'] > train_cutoff) &
-    (active_at_train['cancel_ordinal'] <= train_cutoff + DAYS_PER_MONTH)
-).astype(int)
-
-print(f"   Active before dedup: {len(active_at_train):,}")
-active_at_train = active_at_train.sort_values('sub_ordinal').groupby(
-    ['adventurer_id', 'publisher_id'], as_index=False
-).last()
-
-print(f"   Active at training cutoff: {len(active_at_train):,}")
-print(f"   Churn rate: {active_at_train['churn'].mean():.2%}")
-
-
-print("\n[4] Engineering features (vectorized approach)")
-
-def engineer_features_fast(df_active, cutoff_ordinal):
-    """
-    Fast vectorized feature engineering using pandas groupby
-    """
-    features = df_active[['adventurer_id', 'publisher_id', 'sub_ordinal']].copy()
-    
-    print("   [4.1] Subscription features")
-    features['days_subbed'] = cutoff_ordinal - features['sub_ordinal']
-    
-    sub_counts = df_subs[df_subs['sub_ordinal'] <= cutoff_ordinal].groupby(
-        ['adventurer_id', 'publisher_id']
-    ).size().reset_index(name='num_subscriptions')
-    features = features.merge(sub_counts, on=['adventurer_id', 'publisher_id'], how='left')
-    features['num_subscriptions'] = features['num_subscriptions'].fillna(1)
-    
-    user_subs = df_subs[
-        (df_subs['sub_ordinal'] <= cutoff_ordinal) &
-        (df_subs['cancel_ordinal'].notna())
-    ].copy()
-    user_subs['sub_length'] = user_subs['cancel_ordinal'] - user_subs['sub_ordinal']
-    avg_sub_length = user_subs.groupby('adventurer_id')['sub_length'].mean().reset_index()
-    avg_sub_length.columns = ['adventurer_id', 'avg_sub_length_user']
-    features = features.merge(avg_sub_length, on='adventurer_id', how='left')
-    features['avg_sub_length_user'] = features['avg_sub_length_user'].fillna(0)
-    
-    print("   [4.2] Engagement features")
-
-    view_features = []
-    for idx, row in features.iterrows():
-        user_views = df_views[
-            (df_views['adventurer_id'] == row['adventurer_id']) &
-            (df_views['view_ordinal'] >= row['sub_ordinal']) &
-            (df_views['view_ordinal'] <= cutoff_ordinal)
-        ]
-        
-        view_features.append({
-            'adventurer_id': row['adventurer_id'],
-            'publisher_id': row['publisher_id'],
-            'num_content_viewed': len(user_views),
-            'total_seconds_viewed': user_views['seconds_viewed'].sum() if len(user_views) > 0 else 0,
-            'median_seconds_viewed': user_views['seconds_viewed'].median() if len(user_views) > 0 else 0,
-            'days_since_last_view': cutoff_ordinal - user_views['view_ordinal'].max() if len(user_views) > 0 else row['days_subbed']
-        })
-        
-        if idx % 5000 == 0:
-            print(f"      Progress: {idx:,}/{len(features):,}")
-    
-    view_df = pd.DataFrame(view_features)
-    features = features.merge(view_df, on=['adventurer_id', 'publisher_id'], how='left')
-    print("   [4.3] User demographics")
-    features = features.merge(
-        df_adventurers[['adventurer_id', 'age']],
-        on='adventurer_id',
-        how='left'
-    )
-    features['age'] = features['age'].fillna(25)
-    
-    print("   [4.4] Publisher features")
-    pub_stats = df_subs[df_subs['sub_ordinal'] <= cutoff_ordinal].groupby('publisher_id').agg({
-        'cancel_ordinal': lambda x: x.notna().mean()
-    }).reset_index()
-    pub_stats.columns = ['publisher_id', 'pub_churn_rate']
-    features = features.merge(pub_stats, on='publisher_id', how='left')
-    features['pub_churn_rate'] = features['pub_churn_rate'].fillna(0.5)
-
-    pub_cancelled = df_subs[
-        (df_subs['sub_ordinal'] <= cutoff_ordinal) &
-        (df_subs['cancel_ordinal'].notna())
-    ].copy()
-    pub_cancelled['sub_length'] = pub_cancelled['cancel_ordinal'] - pub_cancelled['sub_ordinal']
-    pub_avg = pub_cancelled.groupby('publisher_id')['sub_length'].mean().reset_index()
-    pub_avg.columns = ['publisher_id', 'pub_avg_sub_length']
-    features = features.merge(pub_avg, on='publisher_id', how='left')
-    features['pub_avg_sub_length'] = features['pub_avg_sub_length'].fillna(30)
-    
-    return features
-
-train_features = engineer_features_fast(active_at_train, train_cutoff)
-train_features['churn'] = active_at_train['churn'].values
-
-print(f"   Feature matrix: {train_features.shape}")
-print(f"   Labels match: {len(train_features) == len(active_at_train)}")
+
+print("\n[4] Creating labels")
+prof.step("labels")
+
+# churn = cancelled within DAYS_PER_MONTH days after the cutoff
+print(f"   Active at training cutoff: {len(train_features):,}")
+print(f"   Churn rate: {train_features['churn'].mean():.2%}")
 
 
 print("\n[5] Baseline model")
+prof.step("baseline")
 
 y_train = train_features['churn']
 baseline_pred = np.ones(len(y_train))
@@ -192,9 +114,8 @@ print(f"   F1 Score: {f1_score(y_train, baseline_pred):.3f}")
 
 
 print("\n[6] Training models")
+prof.step("train")
 
-feature_cols = [c for c in train_features.columns 
-                if c not in ['adventurer_id', 'publisher_id', 'churn', 'sub_ordinal']]
 X_train = train_features[feature_cols].fillna(0)
 y_train = train_features['churn']
 
@@ -207,7 +128,7 @@ X_tr_scaled = scaler.fit_transform(X_tr)
 X_val_scaled = scaler.transform(X_val)
 
 print("\n   [Model 1] Logistic Regression")
-lr_model = LogisticRegression(max_iter=1000, random_state=42, class_weight='balanced')
+lr_model = churn_model.make_model('lr')
 lr_model.fit(X_tr_scaled, y_tr)
 lr_pred = lr_model.predict(X_val_scaled)
 lr_prob = lr_model.predict_proba(X_val_scaled)[:, 1]
@@ -216,12 +137,7 @@ print(f"     F1 Score: {f1_score(y_val, lr_pred):.3f}")
 print(f"     ROC-AUC: {roc_auc_score(y_val, lr_prob):.3f}")
 
 print("\n   [Model 2] Random Forest")
-rf_model = RandomForestClassifier(
-    n_estimators=100, 
-    max_depth=10, 
-    random_state=42,
-    class_weight='balanced'
-)
+rf_model = churn_model.make_model('rf')
 rf_model.fit(X_tr, y_tr)
 rf_pred = rf_model.predict(X_val)
 rf_prob = rf_model.predict_proba(X_val)[:, 1]
@@ -229,6 +145,16 @@ print(f"     Accuracy: {(rf_pred == y_val).mean():.3f}")
 print(f"     F1 Score: {f1_score(y_val, rf_pred):.3f}")
 print(f"     ROC-AUC: {roc_auc_score(y_val, rf_prob):.3f}")
 
+print("\n   [Model 3] Histogram Gradient Boosting")
+hgb_model = churn_model.make_model('hgb')
+hgb_model.fit(X_tr, y_tr)
+hgb_pred = hgb_model.predict(X_val)
+hgb_prob = hgb_model.predict_proba(X_val)[:, 1]
+print(f"     Accuracy: {(hgb_pred == y_val).mean():.3f}")
+print(f"     F1 Score: {f1_score(y_val, hgb_pred):.3f}")
+print(f"     ROC-AUC: {roc_auc_score(y_val, hgb_prob):.3f}")
+print(f"     Boosting rounds: {hgb_model.n_iter_} (early stopping)")
+
 print("\n   Top 5 Features:")
 importances = pd.DataFrame({
     'feature': feature_cols,
@@ -236,25 +162,32 @@ importances = pd.DataFrame({
 }).sort_values('importance', ascending=False)
 print(importances.head(5).to_string(index=False))
 
+models = {'lr': lr_model, 'rf': rf_model, 'hgb': hgb_model}
+
+# Versioned artifact for score_churn.py (daily scoring without retraining)
+artifact = churn_model.save(
+    scaler, models, train_features, feature_cols,
+    default_model=SCORING_MODEL, train_cutoff=train_cutoff, horizon=DAYS_PER_MONTH,
+    train_rows=len(X_tr), churn_rate=float(y_train.mean()),
+    val_roc_auc={'lr': roc_auc_score(y_val, lr_prob), 'rf': roc_auc_score(y_val, rf_prob),
+                 'hgb': roc_auc_score(y_val, hgb_prob)},
+)
+print(f"\n   ✓ Saved model artifact {artifact.relative_to(ROOT)}")
 
-print("\n[7] Making final predictions")
 
-active_now = df_subs[
-    (df_subs['sub_ordinal'] <= current_ordinal) &
-    ((df_subs['cancel_ordinal'].isna()) | (df_subs['cancel_ordinal'] > current_ordinal))
-].copy()
+print("\n[7] Making final predictions")
+prof.step("predict")
 
-print(f"   Active before dedup: {len(active_now):,}")
-active_now = active_now.sort_values('sub_ordinal').groupby(
-    ['adventurer_id', 'publisher_id'], as_index=False
-).last()
+current_features = store.features(current_ordinal).copy()
 
-print(f"   Currently active: {len(active_now):,}")
+print(f"   Currently active: {len(current_features):,}")
 
-current_features = engineer_features_fast(active_now, current_ordinal)
 X_current = current_features[feature_cols].fillna(0)
 
-final_predictions = rf_model.predict_proba(X_current)[:, 1]
+final_model = models[SCORING_MODEL]
+if SCORING_MODEL in churn_model.SCALED_MODELS:
+    X_current = scaler.transform(X_current)
+final_predictions = final_model.predict_proba(X_current)[:, 1]
 current_features['churn_probability'] = final_predictions
 current_features['predicted_churn'] = (final_predictions > 0.5).astype(int)
 
@@ -264,6 +197,7 @@ print(f"   Predicted churners: {len(predicted_churners):,}")
 print(f"   Predicted churn rate: {len(predicted_churners) / len(current_features):.2%}")
 
 print("\n[8] Saving predictions")
+prof.step("save")
 
 output = predicted_churners[['adventurer_id', 'publisher_id']].copy()
 output.to_csv(P('churn_pred.csv'), index=False)
@@ -271,3 +205,5 @@ print(f"   ✓ Saved {len(output):,} predictions to churn_pred.csv")
 
 detailed = current_features[['adventurer_id', 'publisher_id', 'churn_probability', 'predicted_churn']].copy()
 detailed.to_csv(P('churn_predictions_detailed.csv'), index=False)
+
+prof.finish()
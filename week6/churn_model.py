@@ -0,0 +1,156 @@
+"""
+Versioned churn model artifacts.
+
+churn.py saves what it trained (scaler, LogisticRegression, RandomForest,
+HistGradientBoosting)
+together with the feature schema, so scoring can run without retraining:
+
+    models/churn/
+        LATEST                          name of the newest version
+        20261019_130501_3f9c2a1b/
+            model.joblib                {'scaler': ..., 'models': {'lr': ..., 'rf': ..., 'hgb': ...}}
+            meta.json                   features (name, dtype, fill), train cutoff,
+                                        horizon, rows, metrics, library versions
+
+The version is the save time plus a hash of the model file, so two runs
+never overwrite each other and LATEST can be moved back by hand.
+
+    artifact = load()                         # LATEST
+    prob = artifact.predict_proba(frame)      # churn.py's SCORING_MODEL, chunked
+"""
+
+import hashlib
+import json
+import platform
+from datetime import datetime
+from pathlib import Path
+
+import joblib
+import numpy as np
+import sklearn
+from sklearn.ensemble import HistGradientBoostingClassifier, RandomForestClassifier
+from sklearn.linear_model import LogisticRegression, SGDClassifier
+
+ROOT = Path(__file__).resolve().parent
+P = lambda name: ROOT / name
+
+MODEL_DIR = P("models") / "churn"
+FORMAT_VERSION = 1
+CHUNK_ROWS = 50_000
+DEFAULT_MODEL = 'rf'
+
+# churn.py's models. hgb bins every feature into <= 255 buckets once, grows
+# trees on the histograms with all cores, and stops when the loss on a 10%
+# hold-out has not improved for n_iter_no_change rounds, so training time
+# grows roughly linearly in rows instead of n log n per tree node.
+MODEL_PARAMS = {
+    'lr': dict(max_iter=1000, random_state=42, class_weight='balanced'),
+    'rf': dict(n_estimators=100, max_depth=10, random_state=42, class_weight='balanced'),
+    'hgb': dict(max_iter=500, learning_rate=0.1, max_leaf_nodes=31, early_stopping=True,
+                validation_fraction=0.1, n_iter_no_change=20, class_weight='balanced', random_state=42),
+    # online_churn.py: logistic loss updated with partial_fit on standardized inputs
+    'sgd': dict(loss='log_loss', alpha=1e-4, learning_rate='adaptive', eta0=0.01, random_state=42),
+}
+MODEL_CLASSES = {'lr': LogisticRegression, 'rf': RandomForestClassifier,
+                 'hgb': HistGradientBoostingClassifier, 'sgd': SGDClassifier}
+SCALED_MODELS = ('lr', 'sgd')
+
+
+def make_model(name, **overrides):
+    """Unfitted churn model ('lr', 'rf', 'hgb', 'sgd') with the pipeline's parameters."""
+    return MODEL_CLASSES[name](**dict(MODEL_PARAMS[name], **overrides))
+
+
+def feature_schema(frame, feature_cols, fill=0):
+    """Name, dtype and missing-value fill of every model input, in order."""
+    return [{'name': col, 'dtype': str(frame[col].dtype), 'fill': fill} for col in feature_cols]
+
+
+class ChurnModel:
+    """A loaded artifact: scaler + models + the feature schema they were fit on."""
+
+    def __init__(self, scaler, models, meta, path=None):
+        self.scaler = scaler
+        self.models = models
+        self.meta = meta
+        self.path = path
+        self.features = [f['name'] for f in meta['features']]
+        self.fill = {f['name']: f['fill'] for f in meta['features']}
+
+    @property
+    def version(self):
+        return self.meta['version']
+
+    @property
+    def default_model(self):
+        return self.meta.get('default_model', DEFAULT_MODEL)
+
+    def matrix(self, frame):
+        """Model inputs from a feature frame, in training order."""
+        missing = [col for col in self.features if col not in frame.columns]
+        if missing:
+            raise KeyError(f"feature frame is missing model inputs: {missing}")
+        return frame[self.features].fillna(self.fill).astype(np.float64)
+
+    def inputs(self, frame, model=None):
+        """Estimator inputs of a feature frame (scaled if the model was fit on scaled inputs)."""
+        X = self.matrix(frame)
+        return self.scaler.transform(X) if (model or self.default_model) in self.meta['scaled'] else X
+
+    def predict_proba(self, frame, model=None, chunk_rows=CHUNK_ROWS, n_jobs=-1):
+        """Churn probability per row, scored chunk_rows at a time (default: the artifact's model)."""
+        model = model or self.default_model
+        estimator = self.models[model]
+        if 'n_jobs' in estimator.get_params():
+            # Forests evaluate their trees in parallel inside each chunk
+            estimator.set_params(n_jobs=n_jobs)
+        out = np.empty(len(frame), dtype=np.float64)
+        for start in range(0, len(frame), chunk_rows):
+            X = self.inputs(frame.iloc[start:start + chunk_rows], model)
+            out[start:start + len(X)] = estimator.predict_proba(X)[:, 1]
+        return out
+
+
+def save(scaler, models, frame, feature_cols, scaled=SCALED_MODELS, model_dir=MODEL_DIR, **meta):
+    """
+    Write a new artifact version, point LATEST at it and return its path.
+    Models named in scaled were fit on scaler-transformed inputs.
+    """
+    model_dir = Path(model_dir)
+    model_dir.mkdir(parents=True, exist_ok=True)
+    tmp = model_dir / ".model.joblib.tmp"
+    joblib.dump({'scaler': scaler, 'models': models}, tmp)
+    digest = hashlib.sha1(tmp.read_bytes()).hexdigest()[:8]
+    version = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{digest}"
+    path = model_dir / version
+    path.mkdir()
+    tmp.replace(path / "model.joblib")
+    (path / "meta.json").write_text(json.dumps(dict(
+        meta,
+        version=version,
+        format=FORMAT_VERSION,
+        created=datetime.now().isoformat(timespec='seconds'),
+        models=sorted(models),
+        scaled=[name for name in scaled if name in models],
+        features=feature_schema(frame, feature_cols),
+        sklearn=sklearn.__version__,
+        python=platform.python_version(),
+    ), indent=2, default=str))
+    (model_dir / "LATEST").write_text(version + "\n")
+    return path
+
+
+def load(version=None, model_dir=MODEL_DIR):
+    """Load an artifact version (LATEST by default)."""
+    model_dir = Path(model_dir)
+    if version is None:
+        latest = model_dir / "LATEST"
+        if not latest.exists():
+            raise FileNotFoundError(f"no churn model saved under {model_dir}; run churn.py first")
+        version = latest.read_text().strip()
+    path = model_dir / version
+    meta = json.loads((path / "meta.json").read_text())
+    if meta['format'] != FORMAT_VERSION:
+        raise ValueError(f"churn model {version} has format {meta['format']}, expected {FORMAT_VERSION}")
+    blob = joblib.load(path / "model.joblib")
+    return ChurnModel(blob['scaler'], blob['models'], meta, path)
@@ -0,0 +1,387 @@
+"""
+Churn scoring service: warm model and features, micro-batched predict_proba.
+
+Loads a churn_model artifact and the point-in-time feature rows of every
+pair active at the scoring cutoff once (feature_store.ChurnFeatureStore),
+then answers over HTTP on a TCP port or a Unix socket:
+
+    POST /score     {"adventurer_id": "aw3w", "publisher_id": "22ke"}
+                    or {"pairs": [["aw3w", "22ke"], ...]}
+    GET  /metrics   latency histograms (request, queue wait, predict) and batch sizes
+    GET  /health    model version, cutoff, active pairs
+
+Request threads only look up feature rows. One scorer thread drains the
+request queue: after the first request it waits at most MAX_WAIT_MS for
+more, up to MAX_BATCH rows, and scores them with one predict_proba call.
+A forest's per-call overhead (walking 100 trees) is most of the cost of a
+small call, so concurrent clients share one call instead of queueing for
+one each. Pairs without an active subscription at the cutoff come back
+with "active": false and no probability.
+
+Usage:
+    python churn_service.py                             # http://127.0.0.1:8765
+    python churn_service.py --socket /tmp/churn.sock
+    python churn_service.py --selftest 2000 --clients 16   # local load test, then exit
+    python churn_service.py --selftest 2000 --max-batch 1  # same, without batching
+"""
+
+import argparse
+import http.client
+import json
+import os
+import queue
+import socket
+import socketserver
+import sys
+import threading
+import time
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import churn_model
+from app_opens import AppOpens
+from feature_store import ChurnFeatureStore
+import subscription_episodes
+
+ROOT = Path(__file__).resolve().parent
+P = lambda name: ROOT / name
+
+sys.path.insert(0, str(ROOT.parent / "week5"))
+import rec_pipeline as rp
+from latency import LatencyRecorder
+
+CURRENT_ORDINAL = 10235 * rp.DAYS_PER_YEAR + rp.MONTH_TO_INDEX["Verdantia"] * rp.DAYS_PER_MONTH
+THRESHOLD = 0.5
+HOST = '127.0.0.1'
+PORT = 8765
+MAX_BATCH = 256
+MAX_WAIT_MS = 2.0
+TIMEOUT_S = 30
+
+
+class MicroBatcher:
+    """Coalesces concurrent submit() calls into one predict(rows) per batch."""
+
+    def __init__(self, predict, max_batch=MAX_BATCH, max_wait_ms=MAX_WAIT_MS, recorder=None):
+        self.predict = predict
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.recorder = recorder or LatencyRecorder()
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self._run, name="churn-scorer", daemon=True)
+        self.thread.start()
+
+    def submit(self, rows):
+        """Future of the probabilities of feature rows `rows`."""
+        future = Future()
+        self.queue.put((np.asarray(rows, dtype=np.int64), future, time.perf_counter_ns()))
+        return future
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            batch, n = [item], len(item[0])
+            deadline = time.perf_counter() + self.max_wait
+            while n < self.max_batch:
+                try:
+                    item = self.queue.get(timeout=max(deadline - time.perf_counter(), 0))
+                except queue.Empty:
+                    break
+                if item is None:
+                    self.queue.put(None)   # finish this batch, then stop
+                    break
+                batch.append(item)
+                n += len(item[0])
+            self._score(batch)
+
+    def _score(self, batch):
+        start = time.perf_counter_ns()
+        for _, _, queued in batch:
+            self.recorder.record('queue_wait', start - queued)
+        rows = np.concatenate([b[0] for b in batch])
+        try:
+            prob = self.predict(rows)
+        except Exception as exc:
+            for _, future, _ in batch:
+                future.set_exception(exc)
+            return
+        self.recorder.record('predict', time.perf_counter_ns() - start)
+        self.recorder.record_candidates('predict', len(rows))
+        offset = 0
+        for part, future, _ in batch:
+            future.set_result(prob[offset:offset + len(part)])
+            offset += len(part)
+
+
+class ChurnService:
+    """Scores (adventurer, publisher) pairs against one cutoff's feature rows."""
+
+    def __init__(self, artifact, features, model=None, threshold=THRESHOLD,
+                 max_batch=MAX_BATCH, max_wait_ms=MAX_WAIT_MS):
+        self.artifact = artifact
+        self.model = model or artifact.default_model
+        self.threshold = threshold
+        self.cutoff = int(features['cutoff'].iloc[0]) if len(features) else None
+        self.features = features.reset_index(drop=True)
+        self.rows = {pair: i for i, pair in enumerate(zip(self.features['adventurer_id'].astype(str),
+                                                          self.features['publisher_id'].astype(str)))}
+        # Model inputs prepared once; a batch is a row take
+        self.X = artifact.inputs(self.features, self.model)
+        self.estimator = artifact.models[self.model]
+        if 'n_jobs' in self.estimator.get_params():
+            # Micro-batches are small: thread fan-out costs more than it saves
+            self.estimator.set_params(n_jobs=1)
+        self.recorder = LatencyRecorder()
+        self.batcher = MicroBatcher(self._predict, max_batch, max_wait_ms, self.recorder)
+
+    def _predict(self, rows):
+        X = self.X.iloc[rows] if isinstance(self.X, pd.DataFrame) else self.X[rows]
+        return self.estimator.predict_proba(X)[:, 1]
+
+    def score(self, pairs):
+        """One result dict per (adventurer_id, publisher_id), in order."""
+        start = time.perf_counter_ns()
+        rows = np.array([self.rows.get((str(a), str(p)), -1) for a, p in pairs], dtype=np.int64)
+        active = rows >= 0
+        prob = self.batcher.submit(rows[active]).result(timeout=TIMEOUT_S) if active.any() else []
+        results, it = [], iter(prob)
+        for (adventurer, publisher), is_active in zip(pairs, active):
+            result = {'adventurer_id': str(adventurer), 'publisher_id': str(publisher), 'active': bool(is_active)}
+            if is_active:
+                p = float(next(it))
+                result.update(churn_probability=p, predicted_churn=int(p > self.threshold))
+            results.append(result)
+        self.recorder.record('request', time.perf_counter_ns() - start)
+        self.recorder.record_candidates('request', len(pairs))
+        return results
+
+    def health(self):
+        return {'status': 'ok', 'model_version': self.artifact.version, 'model': self.model,
+                'cutoff': self.cutoff, 'active_pairs': len(self.rows)}
+
+    def metrics(self):
+        """Latency (ms) and rows per request / predict call, without the raw buckets."""
+        out = {}
+        for name, stats in self.recorder.to_dict().items():
+            out[name] = {kind: {k: v for k, v in hist.items() if k != 'buckets'}
+                         for kind, hist in stats.items() if hist['count']}
+        return out
+
+    def close(self):
+        self.batcher.close()
+
+
+class ChurnHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'   # keep-alive, so clients reuse one connection
+    service = None
+
+    def _send(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == '/health':
+            self._send(200, self.service.health())
+        elif self.path == '/metrics':
+            self._send(200, self.service.metrics())
+        else:
+            self._send(404, {'error': f"unknown path {self.path}"})
+
+    def do_POST(self):
+        if self.path != '/score':
+            self._send(404, {'error': f"unknown path {self.path}"})
+            return
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+            pairs = request['pairs'] if 'pairs' in request else [(request['adventurer_id'], request['publisher_id'])]
+            pairs = [(adventurer, publisher) for adventurer, publisher in pairs]
+        except (ValueError, KeyError, TypeError) as exc:
+            self._send(400, {'error': f"expected adventurer_id/publisher_id or pairs: {exc}"})
+            return
+        results = self.service.score(pairs)
+        self._send(200, {'model_version': self.service.artifact.version, 'cutoff': self.service.cutoff,
+                         'results': results})
+
+    def log_message(self, format, *args):
+        pass
+
+
+class UnixHTTPServer(ThreadingHTTPServer):
+    """ThreadingHTTPServer on a Unix domain socket."""
+    address_family = socket.AF_UNIX
+
+    def server_bind(self):
+        if os.path.exists(self.server_address):
+            os.unlink(self.server_address)
+        socketserver.TCPServer.server_bind(self)
+        self.server_name, self.server_port = 'localhost', 0
+
+    def get_request(self):
+        request, _ = self.socket.accept()
+        return request, ('unix', 0)
+
+
+def make_server(service, host=HOST, port=PORT, socket_path=None):
+    handler = type('Handler', (ChurnHandler,), {'service': service})
+    if socket_path:
+        return UnixHTTPServer(str(socket_path), handler)
+    return ThreadingHTTPServer((host, port), handler)
+
+
+class _UnixConnection(http.client.HTTPConnection):
+    def __init__(self, path, timeout=TIMEOUT_S):
+        super().__init__('localhost', timeout=timeout)
+        self.socket_path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+
+class ChurnClient:
+    """Keep-alive client for the service (one per thread)."""
+
+    def __init__(self, host=HOST, port=PORT, socket_path=None):
+        self.conn = _UnixConnection(str(socket_path)) if socket_path \
+            else http.client.HTTPConnection(host, port, timeout=TIMEOUT_S)
+
+    def _request(self, method, path, payload=None):
+        body = json.dumps(payload).encode() if payload is not None else None
+        headers = {'Content-Type': 'application/json'} if body else {}
+        self.conn.request(method, path, body=body, headers=headers)
+        response = self.conn.getresponse()
+        data = json.loads(response.read())
+        if response.status != 200:
+            raise RuntimeError(f"{method} {path}: {response.status} {data}")
+        return data
+
+    def score(self, pairs):
+        return self._request('POST', '/score', {'pairs': [list(p) for p in pairs]})['results']
+
+    def score_one(self, adventurer_id, publisher_id):
+        return self._request('POST', '/score', {'adventurer_id': adventurer_id,
+                                                'publisher_id': publisher_id})['results'][0]
+
+    def health(self):
+        return self._request('GET', '/health')
+
+    def metrics(self):
+        return self._request('GET', '/metrics')
+
+    def close(self):
+        self.conn.close()
+
+
+def selftest(service, server, n_requests, clients, batch_share=0.1, seed=42):
+    """
+    Fire n_requests from `clients` threads (single pairs, plus batch_share of
+    10-pair batches) at a running server; returns (client latencies, scores).
+    """
+    pairs = list(service.rows)
+    rng = np.random.default_rng(seed)
+    sizes = np.where(rng.random(n_requests) < batch_share, 10, 1)
+    picks = np.split(rng.integers(len(pairs), size=int(sizes.sum())), np.cumsum(sizes)[:-1])
+    work = queue.Queue()
+    for pick in picks:
+        work.put([pairs[i] for i in pick])
+    recorder, scores, lock = LatencyRecorder(), {}, threading.Lock()
+    address = server.server_address
+
+    def run():
+        client = ChurnClient(socket_path=address) if isinstance(address, str) else ChurnClient(*address[:2])
+        while True:
+            try:
+                batch = work.get_nowait()
+            except queue.Empty:
+                break
+            start = time.perf_counter_ns()
+            results = client.score(batch)
+            recorder.record('client', time.perf_counter_ns() - start)
+            with lock:
+                scores.update({(r['adventurer_id'], r['publisher_id']): r['churn_probability'] for r in results})
+        client.close()
+
+    threads = [threading.Thread(target=run) for _ in range(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return recorder, scores
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument('--cutoff', type=int, default=CURRENT_ORDINAL, help="scoring date ordinal")
+    parser.add_argument('--version', default=None, help="model version (default: LATEST)")
+    parser.add_argument('--model', default=None, choices=sorted(churn_model.MODEL_PARAMS))
+    parser.add_argument('--host', default=HOST)
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--socket', default=None, help="serve on this Unix socket instead of TCP")
+    parser.add_argument('--max-batch', type=int, default=MAX_BATCH)
+    parser.add_argument('--max-wait-ms', type=float, default=MAX_WAIT_MS)
+    parser.add_argument('--selftest', type=int, default=0, metavar='N',
+                        help="serve on a free port, send N requests from --clients threads, report and exit")
+    parser.add_argument('--clients', type=int, default=16)
+    args = parser.parse_args()
+
+    print("CHURN SCORING SERVICE")
+
+    print("\n[1] Loading model and features")
+    t0 = time.perf_counter()
+    artifact = churn_model.load(args.version)
+    tables = rp.load_tables(ROOT, cache=True)
+    store = ChurnFeatureStore(tables, AppOpens.stream(ROOT), horizon=artifact.meta['horizon'],
+                              episodes=subscription_episodes.materialize(tables, ROOT)[0])
+    service = ChurnService(artifact, store.features(args.cutoff), args.model,
+                           max_batch=args.max_batch, max_wait_ms=args.max_wait_ms)
+    print(f"   Version: {artifact.version} ({service.model})")
+    print(f"   Cutoff {args.cutoff}: {len(service.rows):,} active pairs, warm in {time.perf_counter() - t0:.2f}s")
+    print(f"   Micro-batches: up to {args.max_batch} rows, {args.max_wait_ms:g} ms wait")
+
+    if args.selftest:
+        server = make_server(service, args.host, 0, args.socket)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        print(f"\n[2] Self-test: {args.selftest:,} requests from {args.clients} clients")
+        start = time.perf_counter()
+        client_latency, scores = selftest(service, server, args.selftest, args.clients)
+        elapsed = time.perf_counter() - start
+        server.shutdown()
+        service.close()
+        print(f"   {args.selftest / elapsed:,.0f} requests/s")
+        print("\n[3] Latency (ms) / rows per call")
+        service.recorder.latency.update(client_latency.latency)
+        print(service.recorder.summary())
+
+        keys = list(scores)
+        rows = [service.rows[k] for k in keys]
+        reference = artifact.predict_proba(service.features.iloc[rows], service.model)
+        diff = np.abs(np.array([scores[k] for k in keys]) - reference).max() if keys else 0.0
+        print(f"\n   Max |service - batch scoring| over {len(keys):,} pairs: {diff:.2e}")
+    else:
+        server = make_server(service, args.host, args.port, args.socket)
+        where = args.socket or f"http://{args.host}:{args.port}"
+        print(f"\n[2] Serving on {where} (Ctrl-C to stop)")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            service.close()
+            if args.socket and os.path.exists(args.socket):
+                os.unlink(args.socket)
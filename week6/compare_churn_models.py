@@ -0,0 +1,119 @@
+"""
+Training time vs. ROC-AUC of the churn models on growing training sets.
+
+Stacks the multi-cutoff training set (training_set.py) for the months before
+TEST_CUTOFF, then fits lr, rf and hgb (churn_model.MODEL_PARAMS) on random
+samples of 1/16, 1/4 and all of it and scores the pairs active at
+TEST_CUTOFF. Per model and size it reports fit and predict wall time,
+ROC-AUC, boosting rounds (hgb early stopping) and the pickled model size.
+
+rf runs with n_jobs=-1 here so both tree models use every core.
+
+Usage:
+    python compare_churn_models.py                         # real data
+    python compare_churn_models.py --root synthetic/x10    # 10x synthetic
+"""
+
+import argparse
+import pickle
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from sklearn.metrics import roc_auc_score
+from sklearn.preprocessing import StandardScaler
+import warnings
+warnings.filterwarnings('ignore')
+
+import churn_model
+import training_set
+from app_opens import AppOpens
+from feature_store import ChurnFeatureStore, CHURN_FEATURES, HORIZON
+
+ROOT = Path(__file__).resolve().parent
+P = lambda name: ROOT / name
+
+sys.path.insert(0, str(ROOT.parent / "week5"))
+import rec_pipeline as rp
+
+TEST_CUTOFF = training_set.LAST_CUTOFF
+N_MONTHS = 10
+FRACTIONS = [1 / 16, 1 / 4, 1]
+MODELS = ['lr', 'rf', 'hgb']
+SEED = 42
+
+
+def fit_and_score(name, X_tr, y_tr, X_te, y_te):
+    """One model: fit / predict timings, ROC-AUC and size."""
+    model = churn_model.make_model(name, **({'n_jobs': -1} if name == 'rf' else {}))
+    scaler = None
+    if name in churn_model.SCALED_MODELS:
+        scaler = StandardScaler().fit(X_tr)
+        X_tr, X_te = scaler.transform(X_tr), scaler.transform(X_te)
+    start = time.perf_counter()
+    model.fit(X_tr, y_tr)
+    fit_s = time.perf_counter() - start
+    start = time.perf_counter()
+    prob = model.predict_proba(X_te)[:, 1]
+    predict_s = time.perf_counter() - start
+    return {
+        'model': name,
+        'train_rows': len(X_tr),
+        'fit_s': fit_s,
+        'predict_s': predict_s,
+        'roc_auc': roc_auc_score(y_te, prob),
+        'rounds': getattr(model, 'n_iter_', np.nan) if name == 'hgb' else np.nan,
+        'model_kb': len(pickle.dumps(model)) / 1024,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument('--root', default=str(ROOT), help="week folder or synthetic dataset")
+    parser.add_argument('--months', type=int, default=N_MONTHS)
+    parser.add_argument('--models', nargs='*', default=MODELS)
+    args = parser.parse_args()
+    root = Path(args.root) if Path(args.root).is_absolute() else ROOT / args.root
+
+    print("CHURN MODEL COMPARISON")
+    print(f"Data: {root}")
+    print(f"Test cutoff: {TEST_CUTOFF}")
+
+    print("\n[1] Building training and test sets")
+    tables = rp.load_tables(root, cache=True)
+    train_cutoffs = training_set.monthly_cutoffs(TEST_CUTOFF - HORIZON, args.months)
+    out_dir = root / training_set.OUT_DIR.name
+    opens = AppOpens.stream(root)
+    training_set.generate(train_cutoffs, root=root, out_dir=out_dir, tables=tables, opens=opens)
+    train = training_set.load(out_dir, columns=CHURN_FEATURES + ['churn'])
+    test = ChurnFeatureStore(tables, opens).features(TEST_CUTOFF)
+    X_all, y_all = train[CHURN_FEATURES].fillna(0), train['churn'].to_numpy()
+    X_te, y_te = test[CHURN_FEATURES].fillna(0), test['churn'].to_numpy()
+    print(f"   Train: {len(train):,} examples from {len(train_cutoffs)} cutoffs")
+    print(f"   Test: {len(test):,} active pairs (churn rate {y_te.mean():.2%})")
+
+    print("\n[2] Training")
+    rng = np.random.default_rng(SEED)
+    order = rng.permutation(len(train))
+    rows = []
+    for frac in FRACTIONS:
+        take = order[:max(int(len(train) * frac), 1)]
+        for name in args.models:
+            row = fit_and_score(name, X_all.iloc[take], y_all[take], X_te, y_te)
+            rows.append(row)
+            print(f"   {name:>3} on {row['train_rows']:>9,} rows: fit {row['fit_s']:7.2f}s  "
+                  f"AUC {row['roc_auc']:.3f}")
+
+    print("\n[3] Report")
+    report = pd.DataFrame(rows)
+    print(report.round(3).to_string(index=False))
+    # Rows each model handles within rf's fit time on the full set
+    full = report[report['train_rows'] == report['train_rows'].max()].set_index('model')
+    if {'rf', 'hgb'} <= set(full.index):
+        speedup = full.loc['rf', 'fit_s'] / full.loc['hgb', 'fit_s']
+        print(f"\n   hgb fits {speedup:.1f}x faster than rf on {int(full.loc['rf', 'train_rows']):,} rows "
+              f"(AUC {full.loc['hgb', 'roc_auc']:.3f} vs {full.loc['rf', 'roc_auc']:.3f})")
+    report.to_csv(P('churn_model_comparison.csv'), index=False)
+    print("\n   ✓ Saved churn_model_comparison.csv")
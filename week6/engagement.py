@@ -0,0 +1,186 @@
+"""
+Range queries over the views of each adventurer.
+
+churn.py's engagement features ask, for every active subscription, about
+the adventurer's views between the subscription date and the cutoff. Instead
+of filtering df_views once per subscription, ViewIndex sorts the views once
+by (adventurer, ordinal) and answers all the ranges together:
+
+- searchsorted on the combined (adventurer, ordinal) key gives the [lo, hi)
+  slice of each range,
+- prefix sums give counts and totals in O(1) per range,
+- the medians sort the gathered slices once (segment id, value).
+
+Cost is O(V log V) to build and O(S log V + sum of slice lengths) per query,
+where V = views and S = subscriptions.
+
+Those ranges cover all of an adventurer's views, whatever the publisher.
+EngagementCube aggregates views by (adventurer, publisher, day) once, so the
+same questions can be asked about one subscription's own publisher.
+"""
+
+import numpy as np
+import pandas as pd
+
+
+def range_indices(lo, hi):
+    """Concatenate arange(lo[i], hi[i]) for all i; also return the segment id of each index."""
+    lengths = hi - lo
+    total = int(lengths.sum())
+    seg = np.repeat(np.arange(len(lo)), lengths)
+    starts = np.repeat(lo - np.r_[0, np.cumsum(lengths)[:-1]], lengths)
+    return starts + np.arange(total), seg
+
+
+def segment_median(values, lo, hi, n_valid=None):
+    """
+    Median of values[lo[i]:hi[i]] for every i, skipping NaN like pandas
+    (0 for empty slices, NaN when a slice holds only NaN).
+    """
+    flat, seg = range_indices(lo, hi)
+    vals = values[flat]
+    order = np.lexsort((vals, seg))   # NaN sorts last inside each segment
+    vals = vals[order]
+    count = hi - lo
+    if n_valid is None:
+        valid = ~np.isnan(vals)
+        n_valid = np.bincount(seg, weights=valid, minlength=len(lo)).astype(np.int64)
+    start = np.r_[0, np.cumsum(count)[:-1]].astype(np.int64)
+    has = n_valid > 0
+    mid_lo = start + np.maximum(n_valid - 1, 0) // 2
+    mid_hi = start + n_valid // 2
+    med = np.where(count > 0, np.nan, 0.0)
+    med[has] = (vals[mid_lo[has]] + vals[mid_hi[has]]) / 2
+    return med
+
+
+class ViewIndex:
+    """Views sorted by (adventurer, ordinal) with prefix sums for range queries."""
+
+    def __init__(self, user_ids, ordinals, seconds):
+        self.users = pd.Index(pd.unique(np.asarray(user_ids)))
+        codes = self.users.get_indexer(user_ids).astype(np.int64)
+        ordinals = np.asarray(ordinals, dtype=np.int64)
+        self.base = int(ordinals.min()) if len(ordinals) else 0
+        self.span = int(ordinals.max()) - self.base + 1 if len(ordinals) else 1
+        order = np.lexsort((ordinals, codes))
+        self.key = codes[order] * self.span + (ordinals[order] - self.base)
+        self.ordinal = ordinals[order]
+        self.seconds = np.asarray(seconds, dtype=np.float64)[order]
+        valid = ~np.isnan(self.seconds)
+        self.cum_seconds = np.r_[0.0, np.cumsum(np.where(valid, self.seconds, 0.0))]
+        self.cum_valid = np.r_[0, np.cumsum(valid)]
+
+    @classmethod
+    def from_frame(cls, df_views, ordinal_col='ordinal'):
+        return cls(df_views['adventurer_id'].to_numpy(), df_views[ordinal_col].to_numpy(),
+                   df_views['seconds_viewed'].to_numpy(np.float64))
+
+    def codes(self, user_ids):
+        """Row codes of adventurer ids (-1 for adventurers without views)."""
+        return self.users.get_indexer(np.asarray(user_ids))
+
+    def bounds(self, codes, start, end):
+        """[lo, hi) slices holding each code's views with start <= ordinal <= end."""
+        codes = np.asarray(codes, dtype=np.int64)
+        n = len(codes)
+        start = np.broadcast_to(np.asarray(start, dtype=np.int64), n)
+        end = np.broadcast_to(np.asarray(end, dtype=np.int64), n)
+        known = (codes >= 0) & (end >= start)
+        first = np.clip(start - self.base, 0, self.span)
+        last = np.clip(end - self.base, -1, self.span - 1)
+        lo = np.searchsorted(self.key, codes * self.span + first, side='left')
+        hi = np.searchsorted(self.key, codes * self.span + last, side='right')
+        hi = np.where(known & (last >= 0), np.maximum(hi, lo), lo)
+        return lo, hi
+
+    def engagement(self, user_ids, start, end):
+        """
+        churn.py's engagement features for views of each adventurer with
+        start <= ordinal <= end (NaN seconds are skipped, as in pandas).
+        """
+        lo, hi = self.bounds(self.codes(user_ids), start, end)
+        count = hi - lo
+        n_valid = self.cum_valid[hi] - self.cum_valid[lo]
+        return pd.DataFrame({
+            'num_content_viewed': count,
+            'total_seconds_viewed': self.cum_seconds[hi] - self.cum_seconds[lo],
+            'median_seconds_viewed': segment_median(self.seconds, lo, hi, n_valid),
+            'last_view_ordinal': np.where(count > 0, self.ordinal[np.maximum(hi - 1, 0)], -1),
+        })
+
+
+class EngagementCube:
+    """
+    Views aggregated once into (pair, day) cells -- pair being any integer
+    code such as adventurer * n_publishers + publisher -- with prefix sums
+    over the cells, so the views of one adventurer with one publisher in a
+    day range are O(log cells) to slice:
+
+    - views, seconds and active days are prefix-sum differences,
+    - the last view is the last cell of the slice,
+    - the least-squares slope of daily views over a window comes from the
+      prefix sums of views and of day * views.
+
+    Only days with views get a cell, so the cube is at most as long as the
+    view table (usually much shorter) whatever the date range. Rows may be
+    pre-aggregated: counts is the number of views each row stands for.
+    """
+
+    def __init__(self, pairs, ordinals, seconds, counts=None):
+        pairs = np.asarray(pairs, dtype=np.int64)
+        ordinals = np.asarray(ordinals, dtype=np.int64)
+        seconds = np.asarray(seconds, dtype=np.float64)
+        counts = np.ones(len(pairs)) if counts is None else np.asarray(counts, dtype=np.float64)
+        keep = pairs >= 0
+        pairs, ordinals, seconds, counts = pairs[keep], ordinals[keep], seconds[keep], counts[keep]
+        self.base = int(ordinals.min()) if len(ordinals) else 0
+        self.span = int(ordinals.max()) - self.base + 1 if len(ordinals) else 1
+
+        key = pairs * self.span + (ordinals - self.base)
+        self.key, cell = np.unique(key, return_inverse=True)
+        self.day = self.key % self.span
+        views = np.bincount(cell, weights=counts, minlength=len(self.key))
+        secs = np.bincount(cell, weights=np.nan_to_num(seconds), minlength=len(self.key))
+        self.cum_views = np.r_[0.0, np.cumsum(views)]
+        self.cum_seconds = np.r_[0.0, np.cumsum(secs)]
+        self.cum_day_views = np.r_[0.0, np.cumsum(self.day * views)]
+
+    def bounds(self, pairs, start, end):
+        """[lo, hi) cells of each pair with start <= ordinal <= end."""
+        pairs = np.asarray(pairs, dtype=np.int64)
+        first = np.clip(np.asarray(start, dtype=np.int64) - self.base, 0, self.span)
+        last = np.clip(np.asarray(end, dtype=np.int64) - self.base, -1, self.span - 1)
+        lo = np.searchsorted(self.key, pairs * self.span + first, side='left')
+        hi = np.searchsorted(self.key, pairs * self.span + last, side='right')
+        return lo, np.maximum(hi, lo)
+
+    def engagement(self, pairs, start, end, trend_window):
+        """
+        Views, seconds, active days, last view ordinal (-1 if none) of each
+        pair in [start, end], and the slope of its daily views (per day) over
+        the last trend_window days of the range.
+        """
+        start = np.asarray(start, dtype=np.int64)
+        end = np.asarray(end, dtype=np.int64)
+        lo, hi = self.bounds(pairs, start, end)
+        count = self.cum_views[hi] - self.cum_views[lo]
+
+        # Least squares of y over days t = 0..n-1 of the trailing window
+        w_start = np.maximum(start, end - trend_window + 1)
+        w_lo, w_hi = self.bounds(pairs, w_start, end)
+        n = (end - w_start + 1).astype(np.float64)
+        sum_y = self.cum_views[w_hi] - self.cum_views[w_lo]
+        sum_ty = (self.cum_day_views[w_hi] - self.cum_day_views[w_lo]) - (w_start - self.base) * sum_y
+        sum_t = n * (n - 1) / 2
+        sum_tt = (n - 1) * n * (2 * n - 1) / 6
+        denom = n * sum_tt - sum_t ** 2
+        slope = np.where(denom > 0, (n * sum_ty - sum_t * sum_y) / np.where(denom > 0, denom, 1), 0.0)
+
+        return pd.DataFrame({
+            'views': count,
+            'seconds_viewed': self.cum_seconds[hi] - self.cum_seconds[lo],
+            'active_days': hi - lo,
+            'last_view_ordinal': np.where(hi > lo, self.day[np.maximum(hi - 1, 0)] + self.base, -1),
+            'view_trend': slope,
+        })
@@ -0,0 +1,335 @@
+"""
+Point-in-time churn features for any list of cutoff ordinals.
+
+churn.py's features for every (adventurer, publisher) pair with an active
+subscription at a cutoff, using only subscriptions, cancellations and views
+on or before that cutoff (no leakage), plus the churn label (cancellation in
+the following HORIZON days).
+
+The event streams are sorted once when the store is built:
+
+- subscription episodes (start, first cancellation on or after it, see
+  subscription_episodes.py) in a spans.SpanIndex, which yields the active
+  subscriptions of every cutoff at once,
+- subscriptions by (pair, ordinal),
+- cancellations by (adventurer, ordinal) with prefix sums of subscription
+  lengths,
+- the daily per-publisher subscriber series (subscriber_series.py, built
+  from the episodes or passed in as the saved table), whose running totals
+  are publisher_stats.PublisherStats counters, so the publisher features are
+  a row lookup per cutoff,
+- views by (adventurer, ordinal) (engagement.ViewIndex), and by
+  (adventurer, publisher, day) (engagement.EngagementCube) for the pair_*
+  features: the subscription's own publisher's views, seconds, active days,
+  recency and the slope of its daily views over the last TREND_WINDOW days,
+- app opens per (adventurer, day) and (adventurer, publisher, day)
+  (app_opens.AppOpens, streamed from app_opens.parquet) for the open / session
+  recency and frequency features.
+
+build(cutoffs) collects the active pairs of every cutoff and answers all
+their "count / sum up to the cutoff" questions with one batch of
+searchsorted calls, so a 12-cutoff training set costs about as much as one
+cutoff done the old way.
+
+    store = ChurnFeatureStore(tables, AppOpens.stream(root))
+    episodes = subscription_episodes.materialize(tables, root)[0]
+    store = ChurnFeatureStore(tables, opens, episodes=episodes,
+                              series=subscriber_series.materialize(tables, root, episodes=episodes)[0])
+    frame = store.build([train_cutoff, current_ordinal])   # one row per (cutoff, pair)
+    train = store.features(train_cutoff)                   # cached per cutoff
+"""
+
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from app_opens import AppOpens
+from engagement import EngagementCube, ViewIndex
+from spans import SpanIndex, OPEN
+from subscriber_series import SpanEvents, SubscriberSeries
+from subscription_episodes import SubscriptionEpisodes
+
+ROOT = Path(__file__).resolve().parent
+P = lambda name: ROOT / name
+
+sys.path.insert(0, str(ROOT.parent / "week5"))
+import rec_pipeline as rp
+
+HORIZON = rp.DAYS_PER_MONTH
+CHURN_FEATURES = ['days_subbed', 'num_subscriptions', 'avg_sub_length_user',
+                  'num_content_viewed', 'total_seconds_viewed', 'median_seconds_viewed',
+                  'days_since_last_view', 'age', 'pub_churn_rate', 'pub_avg_sub_length',
+                  'pair_views', 'pair_seconds_viewed', 'pair_active_days', 'pair_days_since_last_view',
+                  'pair_view_trend', 'open_days_30', 'sessions_30', 'days_since_last_open',
+                  'pair_opens', 'pair_days_since_last_open']
+# Move with the calendar: days since the subscription / last view / last open
+RECENCY_FEATURES = ['days_subbed', 'days_since_last_view', 'pair_days_since_last_view',
+                    'days_since_last_open', 'pair_days_since_last_open']
+TREND_WINDOW = 28
+KEY_BITS = 21   # ordinals are stored relative to the first event; 2**21 days of range
+
+
+def _key(group, ordinal):
+    return (np.asarray(group, dtype=np.int64) << KEY_BITS) + ordinal
+
+
+def _count_upto(keys, group, ordinal):
+    """[lo, hi) slice of the sorted (group, ordinal) keys with ordinal <= the given one."""
+    hi = np.searchsorted(keys, _key(group, ordinal), side='right')
+    lo = np.searchsorted(keys, _key(group, 0), side='left')
+    return lo, hi
+
+
+class ChurnFeatureStore:
+    """Leakage-free churn features and labels at arbitrary cutoffs."""
+
+    def __init__(self, tables, opens, horizon=HORIZON, episodes=None, series=None):
+        """
+        opens: app_opens.AppOpens of the same data (AppOpens.stream(root));
+        episodes: its subscription_episodes.SubscriptionEpisodes and series:
+        its subscriber_series.SubscriberSeries (built from tables when not
+        given).
+        """
+        self.horizon = horizon
+        if episodes is None:
+            episodes = SubscriptionEpisodes.from_tables(tables)
+        subs = episodes.spans()
+        cancels = tables['cancels']
+        first_cancel = cancels['ordinal'].min() if 'ordinal' in cancels.columns \
+            else rp.add_ordinals(cancels[['month', 'year', 'day_of_month']].copy())['ordinal'].min()
+        self.base = int(min(subs['sub_ordinal'].min(), first_cancel))
+        self.users = pd.Index(pd.concat([subs['adventurer_id'], tables['views']['adventurer_id']]).unique())
+        self.sub_user = self.users.get_indexer(subs['adventurer_id']).astype(np.int64)
+        sub_pub, self.publishers = pd.factorize(subs['publisher_id'])
+        self.sub_pub = sub_pub.astype(np.int64)
+        self.sub_ord = subs['sub_ordinal'].to_numpy(np.int64) - self.base
+        cancel_ord = subs['cancel_ordinal'].fillna(-1).to_numpy(np.int64)
+        self.cancel_ord = np.where(cancel_ord >= 0, cancel_ord - self.base, -1)
+
+        views = tables['views']
+        if 'ordinal' not in views.columns:
+            views = rp.add_ordinals(views[['adventurer_id', 'publisher_id', 'seconds_viewed',
+                                           'month', 'year', 'day_of_month']].copy())
+        view_user = self.users.get_indexer(views['adventurer_id']).astype(np.int64)
+        view_ord = views['ordinal'].to_numpy(np.int64) - self.base
+        view_seconds = views['seconds_viewed'].to_numpy(np.float64)
+        self.views = ViewIndex(view_user, view_ord, view_seconds)
+        # Views of publishers nobody subscribed to cannot match a subscription
+        view_pub = self.publishers.get_indexer(views['publisher_id'].astype(str))
+        view_pair = np.where((view_pub >= 0) & (view_user >= 0),
+                             view_user * len(self.publishers) + view_pub, -1)
+        self.cube = EngagementCube(view_pair, view_ord, view_seconds)
+
+        # (sorted days, order, adventurer) per event stream, for active_users()
+        self.activity = []
+        for days, users in [(view_ord, view_user), (self.sub_ord, self.sub_user),
+                            (self.cancel_ord[self.cancel_ord >= 0], self.sub_user[self.cancel_ord >= 0])]:
+            order = np.argsort(days, kind='stable')
+            self.activity.append((days[order], order, users))
+
+        # Active subscriptions at any cutoff come from the span index
+        self.spans = SpanIndex(self.sub_ord, np.where(self.cancel_ord >= 0, self.cancel_ord, OPEN))
+        self.sub_pair = self.sub_user * len(self.publishers) + self.sub_pub
+        order = np.lexsort((self.sub_ord, self.sub_pair))
+        self.pair_sub_key = _key(self.sub_pair[order], self.sub_ord[order])
+
+        cancelled = self.cancel_ord >= 0
+        c_user = self.sub_user[cancelled]
+        c_ord = self.cancel_ord[cancelled]
+        c_len = (self.cancel_ord - self.sub_ord)[cancelled].astype(np.float64)
+        order = np.lexsort((c_ord, c_user))
+        self.user_cancel_key = _key(c_user[order], c_ord[order])
+        self.user_cum_len = np.r_[0.0, np.cumsum(c_len[order])]
+        if series is None:
+            events = SpanEvents(subs)
+            series = SubscriberSeries.build(events, events.first, events.last)
+        self.series = series
+        self.series_pub = pd.Index(series.state['publishers']).get_indexer(self.publishers.astype(str))
+
+        self.opens = opens
+        self.open_user = opens.codes(self.users)
+        self.open_pub = opens.publishers.get_indexer(self.publishers.astype(str))
+        # Opens move the open features too, so they count as activity for active_users()
+        cells = opens.days
+        open_days = cells.day + cells.base - self.base
+        open_users = self.users.astype(str).get_indexer(opens.users.astype(str))[cells.key // cells.span]
+        order = np.argsort(open_days, kind='stable')
+        self.activity.append((open_days[order], order, open_users))
+
+        ages = tables['adventurers'].set_index('adventurer_id')['age']
+        self.user_age = ages.reindex(self.users).fillna(25).to_numpy(np.float64)
+        self.cache = {}
+
+    def active(self, cutoffs):
+        """
+        (subscription index, position in cutoffs) of the latest active
+        subscription of every pair at each cutoff, by cutoff then pair.
+        """
+        idx, pos = self.spans.active_at_many(np.asarray(cutoffs, dtype=np.int64) - self.base)
+        pair = self.sub_pair[idx]
+        order = np.lexsort((self.sub_ord[idx], pair, pos))
+        idx, pos, pair = idx[order], pos[order], pair[order]
+        # As churn.py's sort_values('sub_ordinal').groupby(pair).last()
+        last = np.r_[(pair[1:] != pair[:-1]) | (pos[1:] != pos[:-1]), True]
+        return idx[last], pos[last]
+
+    def _compute(self, cutoffs):
+        """Features for several cutoffs with one batch of range queries."""
+        idx, pos = self.active(cutoffs)
+        return self._rows(idx, np.asarray(cutoffs, dtype=np.int64)[pos] - self.base)
+
+    def _rows(self, idx, c):
+        """Feature rows of subscriptions idx at (base-relative) cutoffs c."""
+        user, pub, sub_ord = self.sub_user[idx], self.sub_pub[idx], self.sub_ord[idx]
+        out = pd.DataFrame({
+            'cutoff': c + self.base,
+            'adventurer_id': self.users[user],
+            'publisher_id': self.publishers[pub],
+            'sub_ordinal': sub_ord + self.base,
+            'days_subbed': c - sub_ord,
+        })
+
+        lo, hi = _count_upto(self.pair_sub_key, self.sub_pair[idx], c)
+        out['num_subscriptions'] = hi - lo
+
+        lo, hi = _count_upto(self.user_cancel_key, user, c)
+        out['avg_sub_length_user'] = np.where(
+            hi > lo, (self.user_cum_len[hi] - self.user_cum_len[lo]) / np.maximum(hi - lo, 1), 0.0)
+
+        engagement = self.views.engagement(user, sub_ord, c)
+        count = engagement['num_content_viewed'].to_numpy()
+        out['num_content_viewed'] = count
+        out['total_seconds_viewed'] = engagement['total_seconds_viewed'].to_numpy()
+        out['median_seconds_viewed'] = engagement['median_seconds_viewed'].to_numpy()
+        out['days_since_last_view'] = np.where(count > 0, c - engagement['last_view_ordinal'].to_numpy(), c - sub_ord)
+        out['age'] = self.user_age[user]
+
+        pair = self.cube.engagement(self.sub_pair[idx], sub_ord, c, TREND_WINDOW)
+        out['pair_views'] = pair['views'].to_numpy()
+        out['pair_seconds_viewed'] = pair['seconds_viewed'].to_numpy()
+        out['pair_active_days'] = pair['active_days'].to_numpy()
+        last = pair['last_view_ordinal'].to_numpy()
+        out['pair_days_since_last_view'] = np.where(last >= 0, c - last, c - sub_ord)
+        out['pair_view_trend'] = pair['view_trend'].to_numpy()
+
+        opened = self.opens.features(*self._open_codes(user, pub), sub_ord + self.base, c + self.base)
+        for col in opened.columns:
+            out[col] = opened[col].to_numpy()
+
+        out['pub_churn_rate'], out['pub_avg_sub_length'] = self._publisher_features(pub, c)
+
+        cancel = self.cancel_ord[idx]
+        out['churn'] = ((cancel > c) & (cancel <= c + self.horizon)).astype(int)
+        return out
+
+    def _open_codes(self, user, pub):
+        """AppOpens adventurer and pair codes of store adventurer / publisher codes."""
+        o_user, o_pub = self.open_user[user], self.open_pub[pub]
+        return o_user, np.where((o_user >= 0) & (o_pub >= 0), o_user * len(self.opens.publishers) + o_pub, -1)
+
+    def _publisher_features(self, pub, c):
+        """Subscriber series lookups, one row per publisher for each cutoff."""
+        churn_rate = np.empty(len(pub), dtype=np.float64)
+        avg_length = np.empty(len(pub), dtype=np.float64)
+        order = np.argsort(c, kind='stable')
+        cutoffs, starts = np.unique(c[order], return_index=True)
+        for cutoff, lo, hi in zip(cutoffs, starts, np.r_[starts[1:], len(order)]):
+            rows = order[lo:hi]
+            stats = self.series.publisher_stats(int(cutoff) + self.base)
+            codes = self.series_pub[pub[rows]]
+            churn_rate[rows] = stats['pub_churn_rate'].to_numpy()[codes]
+            avg_length[rows] = stats['pub_avg_sub_length'].to_numpy()[codes]
+        return churn_rate, avg_length
+
+    def publisher_stats(self, cutoff):
+        """Counters, pub_churn_rate and pub_avg_sub_length of every publisher at cutoff."""
+        return self.series.publisher_stats(int(cutoff))
+
+    def _active_codes(self, since, until):
+        lo, hi = since - self.base, until - self.base
+        found = []
+        for days, order, users in self.activity:
+            a, b = np.searchsorted(days, [lo, hi], side='right')
+            found.append(users[order[a:b]])
+        found = np.unique(np.concatenate(found))
+        return found[found >= 0]
+
+    def active_users(self, since, until):
+        """Adventurers with a view, subscription, cancellation or app open in (since, until]."""
+        return pd.Index(self.users[self._active_codes(since, until)])
+
+    def changed(self, since, until):
+        """
+        Mask over active_pairs(until): pairs whose adventurer had a view,
+        subscription, cancellation or app open in (since, until]
+        (active_users), the features carry() cannot move forward. Pairs whose
+        subscription changed are not covered.
+        """
+        idx, _ = self.active([until])
+        return np.isin(self.sub_user[idx], self._active_codes(since, until))
+
+    def carry(self, frame, cutoff):
+        """
+        Feature rows of earlier cutoffs moved to cutoff, exact for pairs that
+        changed() leaves out: RECENCY_FEATURES grow by the days elapsed; the
+        windowed features (open_days_30, sessions_30, pair_view_trend) and
+        the publisher features are looked up again at cutoff.
+        """
+        out = frame.copy()
+        cutoff = int(cutoff)
+        for col in out.columns.intersection(RECENCY_FEATURES):
+            out[col] = out[col].to_numpy() + (cutoff - out['cutoff'].to_numpy(np.int64))
+        user = self.users.get_indexer(out['adventurer_id'].astype(str))
+        pub = self.publishers.get_indexer(out['publisher_id'].astype(str))
+        start = out['sub_ordinal'].to_numpy(np.int64) - self.base
+        c = np.full(len(out), cutoff - self.base, dtype=np.int64)
+        opened = self.opens.features(*self._open_codes(user, pub), start + self.base, c + self.base)
+        for col in out.columns.intersection(['open_days_30', 'sessions_30']):
+            out[col] = opened[col].to_numpy()
+        if 'pair_view_trend' in out.columns:
+            out['pair_view_trend'] = self.cube.engagement(
+                user * len(self.publishers) + pub, start, c, TREND_WINDOW)['view_trend'].to_numpy()
+        churn_rate, avg_length = self._publisher_features(pub, c)
+        for col, values in [('pub_churn_rate', churn_rate), ('pub_avg_sub_length', avg_length)]:
+            if col in out.columns:
+                out[col] = values
+        out['cutoff'] = cutoff
+        return out
+
+    def active_pairs(self, cutoff):
+        """(adventurer, publisher, sub_ordinal) of the pairs active at cutoff, in features() order."""
+        idx, _ = self.active([cutoff])
+        return pd.DataFrame({
+            'adventurer_id': self.users[self.sub_user[idx]],
+            'publisher_id': self.publishers[self.sub_pub[idx]],
+            'sub_ordinal': self.sub_ord[idx] + self.base,
+        })
+
+    def features_for(self, cutoff, keep):
+        """
+        Features at cutoff for the rows of active_pairs(cutoff) where keep is
+        True (not cached); the cost grows with the rows kept.
+        """
+        idx, _ = self.active([cutoff])
+        idx = idx[np.asarray(keep, dtype=bool)]
+        return self._rows(idx, np.full(len(idx), int(cutoff) - self.base, dtype=np.int64))
+
+    def build(self, cutoffs):
+        """Feature rows for every cutoff (computing the uncached ones in one sweep)."""
+        cutoffs = [int(c) for c in cutoffs]
+        missing = sorted(set(cutoffs) - set(self.cache))
+        if missing:
+            frame = self._compute(missing)
+            bounds = np.searchsorted(frame['cutoff'].to_numpy(), missing + [missing[-1] + 1])
+            for cutoff, lo, hi in zip(missing, bounds[:-1], bounds[1:]):
+                self.cache[cutoff] = frame.iloc[lo:hi].reset_index(drop=True)
+        return pd.concat([self.cache[c] for c in cutoffs], ignore_index=True)
+
+    def features(self, cutoff):
+        """Feature frame + churn label for the pairs active at one cutoff (cached)."""
+        cutoff = int(cutoff)
+        if cutoff not in self.cache:
+            self.build([cutoff])
+        return self.cache[cutoff]
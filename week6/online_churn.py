@@ -0,0 +1,188 @@
+"""
+Online churn model: daily partial_fit on newly matured labels.
+
+A subscription's churn label at cutoff c is known once its window
+(c, c + HORIZON] has passed. On day d the examples of cutoff d - HORIZON
+therefore mature, and this consumes them as that day's mini-batches:
+
+- StandardScaler.partial_fit keeps running means / variances of the
+  features (Chan et al. pooled updates), so inputs are standardized with
+  everything seen so far, never refit from scratch,
+- SGDClassifier (logistic loss, churn_model.MODEL_PARAMS['sgd']) takes
+  BATCH_ROWS-row partial_fit steps; class weights come from the running
+  class counts ('balanced' over the whole stream, which partial_fit does
+  not do by itself),
+- each day's batch is scored before it is learned from (prequential
+  evaluation), so the reported AUC is always out of sample.
+
+Per-day cost is one point-in-time feature cutoff plus one pass of SGD over
+the pairs active that day, whatever the length of the history. State lives
+in models/churn_online/state.joblib (a plain dict, like churn_model's
+artifacts, so it loads from any module) and the next run resumes from the
+last consumed day.
+
+Usage:
+    python online_churn.py                      # catch up to the current date
+    python online_churn.py --until 2456460      # ... or to a given day
+    python online_churn.py --reset              # start over from START_DAY
+    python online_churn.py --export             # also save a score_churn.py artifact
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.metrics import roc_auc_score
+from sklearn.preprocessing import StandardScaler
+
+import churn_model
+import training_set
+from app_opens import AppOpens
+from feature_store import ChurnFeatureStore, CHURN_FEATURES, HORIZON
+import subscription_episodes
+
+ROOT = Path(__file__).resolve().parent
+P = lambda name: ROOT / name
+
+sys.path.insert(0, str(ROOT.parent / "week5"))
+import rec_pipeline as rp
+
+STATE_DIR = P("models") / "churn_online"
+CURRENT_ORDINAL = training_set.CURRENT_ORDINAL
+# First day consumed: labels of the earliest training_set cutoff mature here
+START_DAY = training_set.monthly_cutoffs()[0] + HORIZON
+BATCH_ROWS = 2_000
+SEED = 42
+
+
+class OnlineChurnModel:
+    """Running scaler + SGD logistic model + class counts, updated day by day."""
+
+    def __init__(self, start_day=START_DAY):
+        self.scaler = StandardScaler()
+        self.model = churn_model.make_model('sgd')
+        self.class_counts = np.zeros(2, dtype=np.int64)
+        self.last_day = start_day - 1
+        self.history = []
+        self.rng = np.random.default_rng(SEED)
+
+    @property
+    def fitted(self):
+        return self.class_counts.sum() > 0
+
+    def predict_proba(self, X):
+        return self.model.predict_proba(self.scaler.transform(X))[:, 1]
+
+    def update(self, frame, day):
+        """Score, then learn from, one day's matured examples."""
+        X = frame[CHURN_FEATURES].fillna(0).astype(np.float64)
+        y = frame['churn'].to_numpy()
+        auc = np.nan
+        if self.fitted and len(np.unique(y)) == 2:
+            auc = roc_auc_score(y, self.predict_proba(X))
+
+        self.class_counts += np.bincount(y, minlength=2)
+        # 'balanced' weights from the whole stream so far
+        weights = self.class_counts.sum() / (2 * np.maximum(self.class_counts, 1))
+        self.scaler.partial_fit(X)
+        Xs = self.scaler.transform(X)
+        order = self.rng.permutation(len(y))
+        for start in range(0, len(order), BATCH_ROWS):
+            take = order[start:start + BATCH_ROWS]
+            self.model.partial_fit(Xs[take], y[take], classes=[0, 1], sample_weight=weights[y[take]])
+
+        self.last_day = day
+        record = {'day': day, 'cutoff': day - HORIZON, 'rows': len(y),
+                  'churn_rate': float(y.mean()) if len(y) else np.nan, 'prequential_auc': auc}
+        self.history.append(record)
+        return record
+
+    def save(self, state_dir=STATE_DIR):
+        state_dir = Path(state_dir)
+        state_dir.mkdir(parents=True, exist_ok=True)
+        tmp = state_dir / "state.joblib.tmp"
+        joblib.dump({'scaler': self.scaler, 'model': self.model, 'class_counts': self.class_counts,
+                     'last_day': self.last_day, 'history': self.history,
+                     'rng': self.rng.bit_generator.state}, tmp)
+        tmp.replace(state_dir / "state.joblib")
+
+    @classmethod
+    def load(cls, state_dir=STATE_DIR, start_day=START_DAY):
+        path = Path(state_dir) / "state.joblib"
+        online = cls(start_day)
+        if path.exists():
+            state = joblib.load(path)
+            online.scaler, online.model = state['scaler'], state['model']
+            online.class_counts = state['class_counts']
+            online.last_day = state['last_day']
+            online.history = state['history']
+            online.rng.bit_generator.state = state['rng']
+        return online
+
+
+def catch_up(online, store, until, horizon=HORIZON):
+    """Consume every day after online.last_day up to until; returns the new records."""
+    records = []
+    for day in range(online.last_day + 1, until + 1):
+        cutoff = day - horizon
+        frame = store.features(cutoff)
+        store.cache.pop(cutoff, None)
+        records.append(online.update(frame, day))
+    return records
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument('--until', type=int, default=CURRENT_ORDINAL, help="last day to consume")
+    parser.add_argument('--reset', action='store_true', help="discard the saved state")
+    parser.add_argument('--start', type=int, default=START_DAY, help="first day after --reset")
+    parser.add_argument('--export', action='store_true',
+                        help="save the model as the LATEST churn_model artifact for score_churn.py")
+    args = parser.parse_args()
+
+    print("ONLINE CHURN MODEL")
+
+    print("\n[1] Loading state")
+    online = OnlineChurnModel(args.start) if args.reset else OnlineChurnModel.load(start_day=args.start)
+    print(f"   Last consumed day: {online.last_day} ({len(online.history)} days so far)")
+    if online.last_day >= args.until:
+        print(f"   Already up to date with day {args.until}")
+
+    print("\n[2] Loading data")
+    tables = rp.load_tables(ROOT, cache=True)
+    store = ChurnFeatureStore(tables, AppOpens.stream(ROOT),
+                              episodes=subscription_episodes.materialize(tables, ROOT)[0])
+
+    print(f"\n[3] Consuming matured labels up to day {args.until}")
+    t0 = time.perf_counter()
+    records = catch_up(online, store, args.until)
+    elapsed = time.perf_counter() - t0
+    if records:
+        print(f"   {len(records)} days, {sum(r['rows'] for r in records):,} examples "
+              f"({elapsed / len(records) * 1000:.0f} ms per day)")
+    online.save()
+    print(f"   ✓ Saved {STATE_DIR.relative_to(ROOT) / 'state.joblib'}")
+
+    print("\n[4] Prequential ROC-AUC (scored before each day's update), by month")
+    history = pd.DataFrame(online.history)
+    if len(history):
+        history['month'] = (history['day'] - history['day'].min()) // rp.DAYS_PER_MONTH
+        monthly = history.groupby('month').agg(first_day=('day', 'min'), days=('day', 'size'),
+                                               examples=('rows', 'sum'), auc=('prequential_auc', 'mean'))
+        print(monthly.round(3).to_string())
+
+    if args.export:
+        print("\n[5] Exporting artifact")
+        last = store.features(online.last_day - HORIZON)
+        path = churn_model.save(
+            online.scaler, {'sgd': online.model}, last, CHURN_FEATURES,
+            default_model='sgd', train_cutoff=online.last_day - HORIZON, horizon=HORIZON,
+            train_rows=int(online.class_counts.sum()),
+            churn_rate=float(online.class_counts[1] / max(online.class_counts.sum(), 1)),
+            online_last_day=online.last_day,
+        )
+        print(f"   ✓ Saved model artifact {path.relative_to(ROOT)}")
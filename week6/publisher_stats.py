@@ -0,0 +1,116 @@
+"""
+Per-publisher subscription statistics, maintained as events arrive.
+
+churn.py's publisher features were rebuilt per call from filtered copies of
+df_subs (a groupby with a Python lambda for the churn rate). PublisherStats
+keeps four counters per integer publisher code instead:
+
+    subscriptions      subscriptions started on or before the current day
+    cancellations      of those, cancelled on or before the current day
+    cancelled_days     total length of the cancelled ones
+    active             subscriptions - cancellations
+
+and advances them with np.bincount over the events of the days it moves
+past (day-sorted event arrays, searchsorted for the window), so a daily
+update costs O(new events + publishers). The features are then a lookup:
+
+    pub_churn_rate      = cancellations / subscriptions     (0.5 if none)
+    pub_avg_sub_length  = cancelled_days / cancellations    (30 if none)
+
+    stats = PublisherStats(sub_pub, sub_ord, cancel_ord, n_publishers)
+    stats.advance(day)
+    churn_rate, avg_length = stats.lookup(pub_codes)
+
+The counters can also come from running totals kept elsewhere
+(from_totals; subscriber_series.py stores them for every day).
+"""
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_CHURN_RATE = 0.5
+DEFAULT_SUB_LENGTH = 30.0
+
+
+class PublisherStats:
+    """Counters per publisher code, advanced day by day through sorted events."""
+
+    def __init__(self, sub_pub, sub_ord, cancel_ord, n_publishers, publishers=None):
+        """cancel_ord < 0 marks subscriptions that were never cancelled."""
+        sub_pub = np.asarray(sub_pub, dtype=np.int64)
+        sub_ord = np.asarray(sub_ord, dtype=np.int64)
+        cancel_ord = np.asarray(cancel_ord, dtype=np.int64)
+        self.n_publishers = n_publishers
+        self.publishers = publishers
+
+        order = np.argsort(sub_ord, kind='stable')
+        self.sub_days, self.sub_events = sub_ord[order], sub_pub[order]
+        cancelled = cancel_ord >= 0
+        order = np.argsort(cancel_ord[cancelled], kind='stable')
+        self.cancel_days = cancel_ord[cancelled][order]
+        self.cancel_events = sub_pub[cancelled][order]
+        self.cancel_lengths = (cancel_ord - sub_ord)[cancelled][order].astype(np.float64)
+        self.reset()
+
+    @classmethod
+    def from_totals(cls, subscriptions, cancellations, cancelled_days, publishers=None):
+        """Counters set from running totals instead of events (advance() leaves them as they are)."""
+        empty = np.empty(0, dtype=np.int64)
+        stats = cls(empty, empty, empty, len(subscriptions), publishers)
+        stats.subscriptions = np.asarray(subscriptions, dtype=np.int64)
+        stats.cancellations = np.asarray(cancellations, dtype=np.int64)
+        stats.cancelled_days = np.asarray(cancelled_days, dtype=np.float64)
+        return stats
+
+    def reset(self):
+        self.day = None
+        self.subscriptions = np.zeros(self.n_publishers, dtype=np.int64)
+        self.cancellations = np.zeros(self.n_publishers, dtype=np.int64)
+        self.cancelled_days = np.zeros(self.n_publishers, dtype=np.float64)
+        self._sub_pos = 0
+        self._cancel_pos = 0
+
+    def advance(self, day):
+        """Apply every event up to and including day (rewinds if day is earlier)."""
+        if self.day is not None and day < self.day:
+            self.reset()
+        n = self.n_publishers
+        hi = np.searchsorted(self.sub_days, day, side='right')
+        self.subscriptions += np.bincount(self.sub_events[self._sub_pos:hi], minlength=n)
+        self._sub_pos = hi
+        hi = np.searchsorted(self.cancel_days, day, side='right')
+        window = slice(self._cancel_pos, hi)
+        self.cancellations += np.bincount(self.cancel_events[window], minlength=n)
+        self.cancelled_days += np.bincount(self.cancel_events[window], weights=self.cancel_lengths[window],
+                                           minlength=n)
+        self._cancel_pos = hi
+        self.day = day
+        return self
+
+    @property
+    def active(self):
+        return self.subscriptions - self.cancellations
+
+    def churn_rate(self):
+        return np.where(self.subscriptions > 0,
+                        self.cancellations / np.maximum(self.subscriptions, 1), DEFAULT_CHURN_RATE)
+
+    def avg_sub_length(self):
+        return np.where(self.cancellations > 0,
+                        self.cancelled_days / np.maximum(self.cancellations, 1), DEFAULT_SUB_LENGTH)
+
+    def lookup(self, pub_codes):
+        """(pub_churn_rate, pub_avg_sub_length) for each publisher code."""
+        pub_codes = np.asarray(pub_codes, dtype=np.int64)
+        return self.churn_rate()[pub_codes], self.avg_sub_length()[pub_codes]
+
+    def table(self):
+        """One row per publisher with the counters and derived features."""
+        index = pd.Index(self.publishers, name='publisher_id') if self.publishers is not None else None
+        return pd.DataFrame({
+            'subscriptions': self.subscriptions,
+            'cancellations': self.cancellations,
+            'active': self.active,
+            'pub_churn_rate': self.churn_rate(),
+            'pub_avg_sub_length': self.avg_sub_length(),
+        }, index=index)
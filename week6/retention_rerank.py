@@ -0,0 +1,151 @@
+"""
+Retention-aware reranking: recommendations for every at-risk subscription.
+
+Joins the latest churn predictions (score_churn.py's parquet table, or
+churn.py's churn_predictions_detailed.csv, whichever is newer) with the
+hybrid recommender's scores and reranks each at-risk (adventurer,
+publisher) pair's list toward that publisher's most engaging content:
+
+    score = hybrid / max(hybrid)  +  RETENTION_WEIGHT * churn_probability * affinity[publisher]
+
+- hybrid is rec_pipeline.score_hybrid (watch_pct-weighted item
+  similarities) over all clean views, seen items masked,
+- affinity[publisher, item] is the watch_pct summed over the engaged views
+  of the item through that publisher, divided by the publisher's maximum,
+  so every publisher's best content scores 1.
+
+The riskier the subscription, the further its publisher's content moves up.
+Adventurers without views get the publisher's content by affinity alone.
+Everything is one matrix product and one top_n per chunk of CHUNK_PAIRS
+pairs, so the whole at-risk set is a single job.
+
+Writes retention_recs.csv (adventurer_id, publisher_id, churn_probability,
+rec1..recN) and prints how much of each list comes from the at-risk
+publisher before and after reranking.
+
+Usage:
+    python retention_rerank.py
+    python retention_rerank.py --threshold 0.7 --weight 2 --n-recs 5
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+import score_churn
+
+ROOT = Path(__file__).resolve().parent
+P = lambda name: ROOT / name
+
+sys.path.insert(0, str(ROOT.parent / "week5"))
+import rec_pipeline as rp
+
+AT_RISK = score_churn.THRESHOLD
+RETENTION_WEIGHT = 1.0
+N_RECS = 10
+CHUNK_PAIRS = 4096
+PREDICTION_FILES = [score_churn.TABLE_FILE, P('churn_predictions_detailed.csv')]
+
+
+def load_predictions(path=None):
+    """The newest churn prediction table (adventurer_id, publisher_id, churn_probability, ...)."""
+    candidates = [Path(path)] if path else [p for p in PREDICTION_FILES if p.exists()]
+    if not candidates:
+        raise FileNotFoundError("no churn predictions found; run churn.py or score_churn.py first")
+    path = max(candidates, key=lambda p: p.stat().st_mtime)
+    frame = pd.read_parquet(path) if path.suffix == '.parquet' else pd.read_csv(path)
+    return frame.astype({'adventurer_id': str, 'publisher_id': str}), path
+
+
+def publisher_affinity(views, publishers, items):
+    """Sparse publisher x item engagement (watch_pct sum), each row scaled to max 1."""
+    pub = publishers.get_indexer(views['publisher_id'].astype(str))
+    item = items.get_indexer(views['content_id'])
+    keep = (pub >= 0) & (item >= 0)
+    affinity = sparse.csr_matrix(
+        (views['watch_pct'].fillna(0).to_numpy(np.float32)[keep], (pub[keep], item[keep])),
+        shape=(len(publishers), len(items)), dtype=np.float32)
+    top = affinity.max(axis=1).toarray().ravel()
+    top[top == 0] = 1.0
+    return sparse.diags(1 / top) @ affinity
+
+
+def rerank(user_rows, sim, affinity_rows, risk, n_recs, weight=RETENTION_WEIGHT):
+    """(baseline, reranked) top-n item indices for a chunk of pairs."""
+    hybrid = rp.score_hybrid(user_rows, sim)
+    top = np.max(np.where(np.isfinite(hybrid), hybrid, 0), axis=1, keepdims=True)
+    base = hybrid / np.where(top > 0, top, 1)
+    boosted = base + weight * risk[:, None].astype(np.float32) * affinity_rows.toarray()
+    return rp.top_n(hybrid, n_recs), rp.top_n(boosted, n_recs)
+
+
+def retention_campaigns(predictions, tables, threshold=AT_RISK, weight=RETENTION_WEIGHT,
+                        n_recs=N_RECS, chunk_pairs=CHUNK_PAIRS):
+    """Reranked lists for every pair with churn_probability > threshold, plus per-pair stats."""
+    views = rp.clean_views(tables['views'], tables['metadata'])
+    weighted, users, items = rp.build_user_item(views.astype({'adventurer_id': str}), value_col='watch_pct')
+    sim = rp.ALPHA * rp.item_cosine((weighted > 0).astype(np.float32)) \
+        + rp.BETA * rp.content_similarity(tables['metadata'], items)
+    publishers = pd.Index(predictions['publisher_id'].unique())
+    affinity = publisher_affinity(views, publishers, items)
+    # Items each publisher has content for, to measure the share of its content in a list
+    carries = affinity > 0
+
+    at_risk = predictions[predictions['churn_probability'] > threshold].reset_index(drop=True)
+    user = users.get_indexer(at_risk['adventurer_id'])
+    pub = publishers.get_indexer(at_risk['publisher_id'])
+    risk = at_risk['churn_probability'].to_numpy(np.float32)
+    # Adventurers without clean views get an empty history row
+    padded = sparse.vstack([weighted, sparse.csr_matrix((1, len(items)), dtype=np.float32)]).tocsr()
+    user = np.where(user >= 0, user, len(users))
+
+    recs = np.empty((len(at_risk), n_recs), dtype=np.int64)
+    share = np.zeros((len(at_risk), 2))
+    for lo in range(0, len(at_risk), chunk_pairs):
+        rows = slice(lo, lo + chunk_pairs)
+        base, boosted = rerank(padded[user[rows]], sim, affinity[pub[rows]], risk[rows], n_recs, weight)
+        recs[rows] = boosted
+        carried = carries[pub[rows]].toarray()
+        for j, idx in enumerate([base, boosted]):
+            hit = np.take_along_axis(carried, np.maximum(idx, 0), axis=1) & (idx >= 0)
+            share[rows, j] = hit.mean(axis=1)
+
+    out = at_risk[['adventurer_id', 'publisher_id', 'churn_probability']].copy()
+    labels = np.r_[items.to_numpy(dtype=object), [None]]
+    for k in range(n_recs):
+        out[f'rec{k + 1}'] = labels[recs[:, k]]
+    stats = pd.DataFrame({'publisher_share_before': share[:, 0], 'publisher_share_after': share[:, 1]})
+    return out, stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument('--predictions', default=None, help="churn prediction table (default: newest)")
+    parser.add_argument('--threshold', type=float, default=AT_RISK, help="at-risk churn probability")
+    parser.add_argument('--weight', type=float, default=RETENTION_WEIGHT)
+    parser.add_argument('--n-recs', type=int, default=N_RECS)
+    args = parser.parse_args()
+
+    print("RETENTION RERANKING")
+
+    print("\n[1] Loading data")
+    t0 = time.perf_counter()
+    predictions, source = load_predictions(args.predictions)
+    tables = rp.load_tables(ROOT, cache=True)
+    print(f"   Churn predictions: {len(predictions):,} pairs from {source.name}")
+
+    print(f"\n[2] Reranking pairs with churn probability > {args.threshold:g}")
+    campaigns, stats = retention_campaigns(predictions, tables, args.threshold, args.weight, args.n_recs)
+    print(f"   At-risk pairs: {len(campaigns):,} ({campaigns['adventurer_id'].nunique():,} adventurers)")
+    print(f"   Share of list from the at-risk publisher: "
+          f"{stats['publisher_share_before'].mean():.1%} -> {stats['publisher_share_after'].mean():.1%}")
+
+    print("\n[3] Saving campaigns")
+    campaigns.to_csv(P('retention_recs.csv'), index=False)
+    print(f"   ✓ Saved {len(campaigns):,} lists to retention_recs.csv")
+    print(f"\n   Done in {time.perf_counter() - t0:.2f}s")
@@ -0,0 +1,189 @@
+"""
+Batch churn scoring from a saved model artifact.
+
+churn.py trains and saves the model (churn_model.save); this loads the
+artifact, builds the point-in-time features of the subscriptions active at
+the scoring cutoff and scores them chunk by chunk, with the forest's trees
+evaluated in parallel. No training happens here, so daily scoring costs the
+feature sweep plus predict_proba.
+
+Writes churn_pred.csv (predicted churners, same format as churn.py) and
+churn_predictions_detailed.parquet (every active pair with its probability,
+the cutoff, the model version and the model's input features).
+
+--incremental rebuilds only the feature rows that changed since the last run
+(recorded in churn_scoring_state.json). Every other row is the stored one
+moved forward (ChurnFeatureStore.carry): days_subbed and the days since the
+last view / open grow by the days elapsed, and the windowed features (opens
+and sessions in the last 30 days, view trend) and publisher features are
+prefix-sum lookups at the new cutoff. A pair's row is rebuilt when
+
+- its adventurer had a view, subscription, cancellation or app open since
+  the last run (engagement and user features are per adventurer),
+- it is newly active, or its latest subscription changed.
+
+All rows are then scored again (predict_proba is cheap next to the
+features), so the table equals a full rescore. Pairs that are no longer
+active are dropped. A new model version, an earlier cutoff or a missing
+state file falls back to a full run.
+
+Usage:
+    python score_churn.py                       # LATEST model, current date
+    python score_churn.py --cutoff 2456448 --version 20261019_130501_3f9c2a1b
+    python score_churn.py --cutoff 2456473 --incremental
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import churn_model
+from app_opens import AppOpens
+from feature_store import ChurnFeatureStore
+import subscription_episodes
+
+ROOT = Path(__file__).resolve().parent
+P = lambda name: ROOT / name
+
+sys.path.insert(0, str(ROOT.parent / "week5"))
+import rec_pipeline as rp
+
+CURRENT_ORDINAL = 10235 * rp.DAYS_PER_YEAR + rp.MONTH_TO_INDEX["Verdantia"] * rp.DAYS_PER_MONTH
+THRESHOLD = 0.5
+TABLE_FILE = P('churn_predictions_detailed.parquet')
+STATE_FILE = P('churn_scoring_state.json')
+
+
+def score(artifact, features, model=None, chunk_rows=churn_model.CHUNK_ROWS,
+          threshold=THRESHOLD):
+    """Scored copy of a feature frame (one row per active pair, with its model inputs)."""
+    prob = artifact.predict_proba(features, model=model, chunk_rows=chunk_rows)
+    scored = pd.DataFrame({
+        'adventurer_id': features['adventurer_id'].to_numpy(),
+        'publisher_id': features['publisher_id'].to_numpy(),
+        'churn_probability': prob,
+        'predicted_churn': (prob > threshold).astype(int),
+        'sub_ordinal': features['sub_ordinal'].to_numpy(),
+        'cutoff': features['cutoff'].to_numpy(),
+        'model_version': artifact.version,
+    })
+    return pd.concat([scored, features[artifact.features].reset_index(drop=True)], axis=1)
+
+
+def pair_keys(frame):
+    return pd.MultiIndex.from_arrays([frame['adventurer_id'].astype(str), frame['publisher_id'].astype(str)])
+
+
+def load_state(path=STATE_FILE, table_path=TABLE_FILE):
+    if not (Path(path).exists() and Path(table_path).exists()):
+        return None, None
+    return json.loads(Path(path).read_text()), pd.read_parquet(table_path)
+
+
+def save_state(cutoff, artifact, model, path=STATE_FILE):
+    Path(path).write_text(json.dumps({
+        'cutoff': int(cutoff),
+        'model_version': artifact.version,
+        'model': model,
+    }, indent=2))
+
+
+def rescore_changed(artifact, store, cutoff, previous, state, model=None,
+                    chunk_rows=churn_model.CHUNK_ROWS):
+    """
+    Merge a previous prediction table forward to cutoff, rebuilding only the
+    feature rows of changed pairs and scoring every row. Returns (table, counts).
+    """
+    pairs = store.active_pairs(cutoff)
+    keys = pair_keys(pairs)
+
+    prev = previous.set_index(pair_keys(previous))
+    prev = prev[~prev.index.duplicated(keep='last')]
+    pos = prev.index.get_indexer(keys)
+    found = pos >= 0
+    prev_sub = np.where(found, prev['sub_ordinal'].to_numpy()[np.maximum(pos, 0)], -1)
+    dirty = (~found
+             | (prev_sub != pairs['sub_ordinal'].to_numpy())
+             | store.changed(state['cutoff'], cutoff))
+
+    columns = ['adventurer_id', 'publisher_id', 'sub_ordinal', 'cutoff'] + artifact.features
+    carried = store.carry(prev.iloc[pos[~dirty]].reset_index(drop=True)[columns], cutoff)
+    fresh = store.features_for(cutoff, dirty)[columns]
+    # Back in active_pairs order, as a full run scores them
+    rows = pd.concat([carried.astype({'adventurer_id': str, 'publisher_id': str}),
+                      fresh.astype({'adventurer_id': str, 'publisher_id': str})], ignore_index=True)
+    rows = rows.iloc[np.argsort(np.r_[np.flatnonzero(~dirty), np.flatnonzero(dirty)])]
+    table = score(artifact, rows.reset_index(drop=True), model, chunk_rows)
+
+    counts = {'active': len(pairs), 'rebuilt': int(dirty.sum()), 'carried': int((~dirty).sum()),
+              'dropped': int(len(prev) - found.sum())}
+    return table, counts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument('--cutoff', type=int, default=CURRENT_ORDINAL, help="scoring date ordinal")
+    parser.add_argument('--version', default=None, help="model version (default: LATEST)")
+    parser.add_argument('--model', default=None, choices=sorted(churn_model.MODEL_PARAMS),
+                        help="model in the artifact (default: the one churn.py scored with)")
+    parser.add_argument('--chunk-rows', type=int, default=churn_model.CHUNK_ROWS)
+    parser.add_argument('--incremental', action='store_true',
+                        help="rebuild features only for pairs that changed since the last run")
+    args = parser.parse_args()
+
+    print("CHURN SCORING")
+    print(f"Cutoff: {args.cutoff}")
+
+    print("\n[1] Loading model")
+    t0 = time.perf_counter()
+    artifact = churn_model.load(args.version)
+    print(f"   Version: {artifact.version}")
+    print(f"   Trained at cutoff {artifact.meta['train_cutoff']} on {artifact.meta['train_rows']:,} rows")
+    print(f"   Features: {len(artifact.features)}")
+
+    print("\n[2] Loading data")
+    tables = rp.load_tables(ROOT, cache=True)
+    store = ChurnFeatureStore(tables, AppOpens.stream(ROOT), horizon=artifact.meta['horizon'],
+                              episodes=subscription_episodes.materialize(tables, ROOT)[0])
+
+    state, previous = load_state() if args.incremental else (None, None)
+    model = args.model or artifact.default_model
+    if args.incremental and (state is None or state['model_version'] != artifact.version
+                             or state.get('model') != model
+                             or state['cutoff'] > args.cutoff
+                             or not set(artifact.features) <= set(previous.columns)):
+        print("   No usable previous run for this model; scoring everything")
+        state = None
+
+    if state is None:
+        print("\n[3] Building features")
+        features = store.features(args.cutoff)
+        print(f"   Currently active: {len(features):,}")
+
+        print(f"\n[4] Scoring ({model}, {args.chunk_rows:,} rows per chunk)")
+        scored = score(artifact, features, model, args.chunk_rows)
+    else:
+        print(f"\n[3] Updating features changed since cutoff {state['cutoff']}")
+        print(f"\n[4] Scoring ({model}, {args.chunk_rows:,} rows per chunk)")
+        scored, counts = rescore_changed(artifact, store, args.cutoff, previous, state, model, args.chunk_rows)
+        print(f"   Active: {counts['active']:,}  rebuilt: {counts['rebuilt']:,} "
+              f"({counts['rebuilt'] / max(counts['active'], 1):.1%})  carried: {counts['carried']:,}  "
+              f"dropped: {counts['dropped']:,}")
+
+    churners = scored[scored['predicted_churn'] == 1]
+    print(f"   Predicted churners: {len(churners):,}")
+    print(f"   Predicted churn rate: {len(churners) / max(len(scored), 1):.2%}")
+
+    print("\n[5] Saving predictions")
+    churners[['adventurer_id', 'publisher_id']].to_csv(P('churn_pred.csv'), index=False)
+    print(f"   ✓ Saved {len(churners):,} predictions to churn_pred.csv")
+    scored.to_parquet(TABLE_FILE, index=False)
+    print(f"   ✓ Saved {TABLE_FILE.name}")
+    save_state(args.cutoff, artifact, model)
+    print(f"   ✓ Saved {STATE_FILE.name}")
+    print(f"\n   Done in {time.perf_counter() - t0:.2f}s")
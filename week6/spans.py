@@ -0,0 +1,104 @@
+"""
+Interval index over subscription spans.
+
+A subscription is active on days start <= t < end, where end is the day of
+its cancellation (OPEN for subscriptions that were never cancelled). churn.py
+used to answer "who is active at t" with a boolean mask over every
+subscription per cutoff; SpanIndex sorts the start and end points once and
+answers
+
+- count_at(ts)          how many spans are active at each t (two searchsorted),
+- active_at(t)          which spans are active at t,
+- active_at_many(ts)    (span, t) pairs for a whole list of cutoffs: each span
+                        is active for the contiguous run of sorted cutoffs in
+                        [start, end), so its run comes from two searchsorted
+                        calls and the output is O(n log m + active pairs),
+- active_during(a, b)   spans overlapping the days [a, b],
+- daily_counts(a, b)    active-per-day series, optionally per group, by a
+                        sweep over +1 / -1 endpoint events (O(n + days)).
+"""
+
+import numpy as np
+
+from engagement import range_indices
+
+OPEN = np.iinfo(np.int64).max
+
+
+class SpanIndex:
+    """Sorted start/end points of [start, end) day spans."""
+
+    def __init__(self, starts, ends):
+        self.starts = np.asarray(starts, dtype=np.int64)
+        ends = np.asarray(ends)
+        if ends.dtype.kind == 'f':
+            # NaN = never cancelled
+            ends = np.where(np.isnan(ends), OPEN, np.nan_to_num(ends).astype(np.int64))
+        self.ends = ends.astype(np.int64)
+        self.start_order = np.argsort(self.starts, kind='stable')
+        self.sorted_starts = self.starts[self.start_order]
+        self.sorted_ends = np.sort(self.ends)
+
+    def __len__(self):
+        return len(self.starts)
+
+    def count_at(self, ts):
+        """Number of spans with start <= t < end, for each t."""
+        ts = np.asarray(ts, dtype=np.int64)
+        started = np.searchsorted(self.sorted_starts, ts, side='right')
+        ended = np.searchsorted(self.sorted_ends, ts, side='right')
+        return started - ended
+
+    def active_at(self, t):
+        """Indices of the spans active at t, in start order."""
+        idx, _ = self.active_at_many([t])
+        return idx
+
+    def active_at_many(self, ts):
+        """
+        (span index, position in ts) of every span active at every t, grouped
+        by t in the order given and in start order inside each group.
+        """
+        ts = np.asarray(ts, dtype=np.int64)
+        order = np.argsort(ts, kind='stable')
+        sorted_ts = ts[order]
+        # Sorted cutoffs with start <= t < end form one contiguous run per span
+        lo = np.searchsorted(sorted_ts, self.sorted_starts, side='left')
+        hi = np.searchsorted(sorted_ts, self.ends[self.start_order], side='left')
+        flat, seg = range_indices(lo, np.maximum(hi, lo))
+        # Regroup by the caller's cutoff order (stable keeps start order)
+        t_pos = order[flat]
+        # Small keys take numpy's radix sort
+        group = np.argsort(t_pos.astype(np.uint16) if len(ts) <= 2**16 else t_pos, kind='stable')
+        return self.start_order[seg[group]], t_pos[group]
+
+    def active_during(self, a, b):
+        """Indices of the spans active on at least one day of [a, b]."""
+        prefix = np.searchsorted(self.sorted_starts, b, side='right')
+        candidates = self.start_order[:prefix]
+        return candidates[self.ends[candidates] > a]
+
+    def count_during(self, a, b):
+        """Number of spans active on at least one day of [a, b] (a, b may be arrays)."""
+        started = np.searchsorted(self.sorted_starts, np.asarray(b, dtype=np.int64), side='right')
+        ended = np.searchsorted(self.sorted_ends, np.asarray(a, dtype=np.int64), side='right')
+        return started - ended
+
+    def daily_counts(self, first, last, groups=None, n_groups=None):
+        """
+        Active spans on each day first..last: shape (days,), or (n_groups, days)
+        when every span has a group code.
+        """
+        days = last - first + 1
+        start = np.clip(self.starts - first, 0, days)
+        end = np.clip(np.minimum(self.ends, last + 1) - first, 0, days)
+        keep = end > start
+        if groups is None:
+            delta = np.bincount(start[keep], minlength=days + 1) - np.bincount(end[keep], minlength=days + 1)
+            return np.cumsum(delta)[:days]
+        groups = np.asarray(groups, dtype=np.int64)[keep]
+        n_groups = int(groups.max()) + 1 if n_groups is None and len(groups) else (n_groups or 0)
+        width = days + 1
+        delta = (np.bincount(groups * width + start[keep], minlength=n_groups * width)
+                 - np.bincount(groups * width + end[keep], minlength=n_groups * width))
+        return np.cumsum(delta.reshape(n_groups, width), axis=1)[:, :days]
@@ -0,0 +1,232 @@
+"""
+Stage-level timing and memory profiling for the pipeline scripts.
+
+    prof = StageProfiler("churn")
+
+    prof.step("load")                 # ends the previous step, starts this one
+    ...
+    with prof.stage("features"):      # or as a context manager
+        ...
+
+    @prof.profiled("train")           # or as a decorator
+    def train(): ...
+
+    prof.finish()                     # prints the table, writes the report
+
+Per stage: wall time, CPU time, RSS at the end of the stage and the process
+peak RSS so far. With STAGE_PROFILE=memory also tracemalloc's net
+allocation and peak inside the stage (numpy buffers are traced, Arrow's
+allocator is not); tracing every allocation makes allocation-heavy stages
+several times slower, so it is off by default.
+
+STAGE_PROFILE controls it from the environment:
+    unset / 1     wall time, CPU time and RSS (default)
+    memory        also tracemalloc per stage
+    cprofile      also run cProfile per stage and write <stage>.prof plus
+                  collapsed stacks (<stage>.folded) for flamegraph.pl /
+                  speedscope
+    0             off; steps only cost a function call
+
+Reports go to <report_dir>/<name>_<timestamp>.json (the scripts pass the
+profiles/ folder next to themselves).
+"""
+
+import contextlib
+import cProfile
+import functools
+import json
+import os
+import pstats
+import resource
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+PROFILE_ENV = "STAGE_PROFILE"
+PAGE_MB = os.sysconf('SC_PAGE_SIZE') / 2**20 if hasattr(os, 'sysconf') else None
+MAX_STACK_DEPTH = 64
+MIN_STACK_FRACTION = 1e-4   # drop call paths under 0.01% of the stage's time
+
+
+def current_rss_mb():
+    """Resident set size right now (Linux /proc; None elsewhere)."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * PAGE_MB
+    except (OSError, TypeError, ValueError):
+        return None
+
+
+def peak_rss_mb():
+    """Process peak RSS so far (ru_maxrss is KB on Linux)."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _label(func):
+    filename, line, name = func
+    return f"{name} ({Path(filename).name}:{line})" if line else name
+
+
+def collapsed_stacks(stats):
+    """
+    Flamegraph 'a;b;c <microseconds>' lines from a cProfile call graph.
+    cProfile keeps caller -> callee edges, not full stacks, so each function's
+    time is split across its callees in proportion to the edge's cumulative
+    time (the same approximation flameprof / gprof2dot use). Paths below
+    MIN_STACK_FRACTION of the total are pruned, which also bounds the walk
+    on dense call graphs (pandas internals).
+    """
+    callees = {}
+    for func, (_, _, _, _, callers) in stats.stats.items():
+        for caller, edge in callers.items():
+            callees.setdefault(caller, []).append((func, edge[3]))
+    roots = [f for f, (_, _, _, _, callers) in stats.stats.items() if not callers]
+    min_budget = sum(stats.stats[r][3] for r in roots) * MIN_STACK_FRACTION
+
+    lines = {}
+
+    def walk(func, budget, path):
+        cc, nc, tt, ct, _ = stats.stats[func]
+        if ct <= 0 or budget <= min_budget:
+            return
+        path = path + [_label(func)]
+        share = budget / ct
+        self_time = tt * share
+        if self_time > 0:
+            key = ";".join(path)
+            lines[key] = lines.get(key, 0) + self_time
+        if len(path) >= MAX_STACK_DEPTH:
+            return
+        for callee, edge_ct in callees.get(func, []):
+            if _label(callee) not in path:
+                walk(callee, edge_ct * share, path)
+
+    for root in roots:
+        walk(root, stats.stats[root][3], [])
+    return [f"{stack} {int(round(t * 1e6))}" for stack, t in lines.items() if t * 1e6 >= 1]
+
+
+class StageProfiler:
+    """Named stages with time, CPU and memory; one JSON report per run."""
+
+    def __init__(self, name, report_dir=None, mode=None):
+        self.name = name
+        self.mode = (os.environ.get(PROFILE_ENV, '1') if mode is None else mode).lower()
+        self.enabled = self.mode not in ('0', 'off', 'false', 'no')
+        self.use_cprofile = self.mode == 'cprofile'
+        self.use_tracemalloc = self.mode == 'memory'
+        self.report_dir = Path(report_dir) if report_dir else Path.cwd() / "profiles"
+        self.run_id = f"{name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        self.stages = []
+        self._open = None
+        self._started = time.perf_counter()
+        if self.use_tracemalloc and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @contextlib.contextmanager
+    def stage(self, label):
+        if not self.enabled:
+            yield
+            return
+        record = self._begin(label)
+        try:
+            yield
+        finally:
+            if self._open is record:
+                self._end()
+
+    def profiled(self, label=None):
+        """Decorator form of stage()."""
+        def decorate(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.stage(label or func.__name__):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    def step(self, label):
+        """Close the running step (if any) and open the next one."""
+        if not self.enabled:
+            return
+        self._begin(label)
+
+    def _begin(self, label):
+        if self._open is not None:
+            # Stages do not nest: a stage() inside a step() closes the step
+            self._end()
+        traced = None
+        if self.use_tracemalloc:
+            tracemalloc.reset_peak()
+            traced, _ = tracemalloc.get_traced_memory()
+        profiler = None
+        if self.use_cprofile:
+            profiler = cProfile.Profile()
+            profiler.enable()
+        self._open = {'label': label, 'wall': time.perf_counter(), 'cpu': time.process_time(),
+                      'traced': traced, 'rss': current_rss_mb(), 'profiler': profiler}
+        return self._open
+
+    def _end(self):
+        open_ = self._open
+        self._open = None
+        if open_['profiler'] is not None:
+            open_['profiler'].disable()
+        traced, peak = tracemalloc.get_traced_memory() if self.use_tracemalloc else (None, None)
+        rss = current_rss_mb()
+        record = {
+            'stage': open_['label'],
+            'wall_s': time.perf_counter() - open_['wall'],
+            'cpu_s': time.process_time() - open_['cpu'],
+            'rss_mb': rss,
+            'rss_delta_mb': rss - open_['rss'] if rss is not None and open_['rss'] is not None else None,
+            'peak_rss_mb': peak_rss_mb(),
+            'traced_delta_mb': (traced - open_['traced']) / 2**20 if traced is not None else None,
+            'traced_peak_mb': (peak - open_['traced']) / 2**20 if traced is not None else None,
+        }
+        if open_['profiler'] is not None:
+            record.update(self._dump_profile(open_['label'], open_['profiler']))
+        self.stages.append(record)
+
+    def _dump_profile(self, label, profiler):
+        out_dir = self.report_dir / self.run_id
+        out_dir.mkdir(parents=True, exist_ok=True)
+        slug = "".join(c if c.isalnum() else "_" for c in label).strip("_").lower() or "stage"
+        slug = f"{len(self.stages) + 1:02d}_{slug}"
+        prof_path = out_dir / f"{slug}.prof"
+        profiler.dump_stats(prof_path)
+        folded_path = out_dir / f"{slug}.folded"
+        folded_path.write_text("\n".join(collapsed_stacks(pstats.Stats(profiler))) + "\n")
+        return {'cprofile': str(prof_path), 'collapsed_stacks': str(folded_path)}
+
+    def summary(self):
+        lines = [f"{'stage':<32} {'wall s':>9} {'cpu s':>9} {'rss MB':>9} {'Δrss MB':>9} "
+                 f"{'traced Δ':>9} {'traced pk':>9}"]
+        fmt = lambda v, spec: format(v, spec) if v is not None else f"{'-':>9}"
+        for s in self.stages:
+            lines.append(f"{s['stage'][:32]:<32} {s['wall_s']:>9.3f} {s['cpu_s']:>9.3f} "
+                         f"{fmt(s['rss_mb'], '>9.1f')} {fmt(s['rss_delta_mb'], '>9.1f')} "
+                         f"{fmt(s['traced_delta_mb'], '>9.1f')} {fmt(s['traced_peak_mb'], '>9.1f')}")
+        return "\n".join(lines)
+
+    def finish(self):
+        """Close the last step, print the stage table and write the JSON report."""
+        if not self.enabled:
+            return None
+        if self._open is not None:
+            self._end()
+        self.report_dir.mkdir(parents=True, exist_ok=True)
+        path = self.report_dir / f"{self.run_id}.json"
+        path.write_text(json.dumps({
+            'name': self.name,
+            'run_id': self.run_id,
+            'mode': self.mode,
+            'total_wall_s': time.perf_counter() - self._started,
+            'peak_rss_mb': peak_rss_mb(),
+            'stages': self.stages,
+        }, indent=2))
+        print(f"\nSTAGE PROFILE ({self.name})")
+        print(self.summary())
+        print(f"   ✓ Saved {path}")
+        return path
@@ -0,0 +1,258 @@
+"""
+Daily subscriber time series per publisher, materialized and extended daily.
+
+"Who was subscribed on day t" keeps being recomputed from the raw
+subscription and cancellation events. This materializes it once as a small
+table with one row per (day, publisher):
+
+    active          subscriptions with sub_ordinal <= day < cancel_ordinal
+    new_subs        subscriptions starting that day
+    cancellations   subscriptions ending that day
+    churn_rate      cancellations / active on the previous day (0 if none)
+    subscriptions_to_date, cancellations_to_date, cancelled_days_to_date
+                    running totals of new_subs, cancellations and the
+                    length of the cancelled subscriptions
+
+so active[d] = active[d - 1] + new_subs[d] - cancellations[d]. The running
+totals are publisher_stats.PublisherStats counters for every day, so the
+churn pipeline's publisher features are a row lookup (publisher_stats(day);
+ChurnFeatureStore reads them from here). Subscriptions
+are the saved subscription episodes (subscription_episodes.py: each paired
+with the first cancellation on or after it, the churn pipeline's definition).
+
+The build is one sweep: bincount of span starts and ends by (publisher,
+day) and a cumulative sum along the days. Extending the table to a later
+day only sweeps the events of the new days (searchsorted on the sorted
+start and end ordinals), carrying each publisher's last active count. The
+state file records how many starts / ends fell on or before the last
+materialized day; if late events change that, the table is rebuilt.
+
+    series = SubscriberSeries.load(root)          # root/subscriber_series.parquet
+    series.at(day)                                # one row per publisher
+    series.window(first, last, 'n4b4')            # one publisher's days
+    series.publisher_stats(day)                   # pub_churn_rate, pub_avg_sub_length
+
+Usage:
+    python subscriber_series.py                   # build or extend to the last event day
+    python subscriber_series.py --until 2456472
+    python subscriber_series.py --rebuild
+    python subscriber_series.py --root synthetic/x10
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from publisher_stats import PublisherStats
+from spans import OPEN
+import subscription_episodes
+
+ROOT = Path(__file__).resolve().parent
+P = lambda name: ROOT / name
+
+sys.path.insert(0, str(ROOT.parent / "week5"))
+import rec_pipeline as rp
+
+TABLE_NAME = 'subscriber_series.parquet'
+STATE_NAME = 'subscriber_series.json'
+TOTALS = ['subscriptions_to_date', 'cancellations_to_date', 'cancelled_days_to_date']
+
+
+class SpanEvents:
+    """Span starts and ends per publisher code, each sorted by day."""
+
+    def __init__(self, spans):
+        pub, self.publishers = pd.factorize(spans['publisher_id'].astype(str), sort=True)
+        starts = spans['sub_ordinal'].to_numpy(np.int64)
+        ends = spans['cancel_ordinal'].to_numpy(np.float64)
+        ends = np.where(np.isnan(ends), OPEN, np.nan_to_num(ends).astype(np.int64))
+        order = np.argsort(starts, kind='stable')
+        self.start_days, self.start_pub = starts[order], pub[order]
+        ended = ends != OPEN
+        order = np.argsort(ends[ended], kind='stable')
+        self.end_days, self.end_pub = ends[ended][order], pub[ended][order]
+        self.end_lengths = (ends - starts)[ended][order].astype(np.float64)
+        self.first = int(starts.min())
+        self.last = int(max(starts.max(), self.end_days.max() if len(self.end_days) else 0))
+
+    def upto(self, day):
+        """(starts, ends) on or before day."""
+        return (int(np.searchsorted(self.start_days, day, side='right')),
+                int(np.searchsorted(self.end_days, day, side='right')))
+
+    def daily(self, first, last):
+        """
+        (new_subs, cancellations, cancelled_days), shape (publishers, days),
+        for days first..last.
+        """
+        n_pub, days = len(self.publishers), last - first + 1
+        counts = []
+        for event_days, event_pub, weights in [(self.start_days, self.start_pub, None),
+                                               (self.end_days, self.end_pub, None),
+                                               (self.end_days, self.end_pub, self.end_lengths)]:
+            lo = np.searchsorted(event_days, first, side='left')
+            hi = np.searchsorted(event_days, last, side='right')
+            key = event_pub[lo:hi] * days + (event_days[lo:hi] - first)
+            w = weights[lo:hi] if weights is not None else None
+            counts.append(np.bincount(key, weights=w, minlength=n_pub * days).reshape(n_pub, days))
+        return counts
+
+
+class SubscriberSeries:
+    """The materialized (day, publisher) table plus what it was built from."""
+
+    def __init__(self, table, state):
+        self.table = table
+        self.state = state
+
+    @property
+    def last(self):
+        return self.state['last']
+
+    @classmethod
+    def build(cls, events, first, last):
+        """Every day first..last in one sweep."""
+        new, cancelled, cancelled_days = events.daily(first, last)
+        table = cls._frame(events.publishers, first, new, cancelled, cancelled_days,
+                           np.zeros((len(events.publishers), len(TOTALS))))
+        return cls(table, cls._state(events, first, last))
+
+    def extend(self, events, until):
+        """Append the days after self.last up to until (no-op if already there)."""
+        if until <= self.last:
+            return self
+        new, cancelled, cancelled_days = events.daily(self.last + 1, until)
+        carry = self.at(self.last).set_index('publisher_id')[TOTALS] \
+            .reindex(events.publishers, fill_value=0).to_numpy()
+        added = self._frame(events.publishers, self.last + 1, new, cancelled, cancelled_days, carry)
+        self.table = pd.concat([self.table, added], ignore_index=True)
+        self.state = self._state(events, self.state['first'], until)
+        return self
+
+    def matches(self, events):
+        """True when the events on or before self.last are the ones it was built from."""
+        return (list(events.publishers) == self.state['publishers']
+                and list(events.upto(self.last)) == self.state['events_upto_last'])
+
+    @staticmethod
+    def _state(events, first, last):
+        return {'first': int(first), 'last': int(last), 'publishers': list(events.publishers),
+                'events_upto_last': list(events.upto(last))}
+
+    @staticmethod
+    def _frame(publishers, first, new, cancelled, cancelled_days, carry):
+        """
+        Long table from (publishers, days) counts; carry = the TOTALS columns
+        of the day before first, shape (publishers, 3).
+        """
+        subs = carry[:, [0]] + np.cumsum(new, axis=1)
+        cancels = carry[:, [1]] + np.cumsum(cancelled, axis=1)
+        active = subs - cancels
+        previous = np.concatenate([carry[:, [0]] - carry[:, [1]], active[:, :-1]], axis=1)
+        n_pub, days = new.shape
+        return pd.DataFrame({
+            'day': np.tile(np.arange(first, first + days, dtype=np.int64), n_pub),
+            'publisher_id': np.repeat(np.asarray(publishers, dtype=object), days),
+            'active': active.ravel().astype(np.int64),
+            'new_subs': new.ravel().astype(np.int64),
+            'cancellations': cancelled.ravel().astype(np.int64),
+            'churn_rate': (cancelled / np.maximum(previous, 1)).ravel(),
+            'subscriptions_to_date': subs.ravel().astype(np.int64),
+            'cancellations_to_date': cancels.ravel().astype(np.int64),
+            'cancelled_days_to_date': (carry[:, [2]] + np.cumsum(cancelled_days, axis=1)).ravel(),
+        }).sort_values(['day', 'publisher_id'], kind='stable').reset_index(drop=True)
+
+    # -- persistence and queries -------------------------------------------
+
+    def save(self, root):
+        root = Path(root)
+        self.table.to_parquet(root / TABLE_NAME, index=False)
+        (root / STATE_NAME).write_text(json.dumps(self.state, indent=2))
+
+    @classmethod
+    def load(cls, root):
+        root = Path(root)
+        if not ((root / TABLE_NAME).exists() and (root / STATE_NAME).exists()):
+            return None
+        return cls(pd.read_parquet(root / TABLE_NAME), json.loads((root / STATE_NAME).read_text()))
+
+    def at(self, day):
+        """One row per publisher for day."""
+        days = self.table['day'].to_numpy()
+        lo, hi = np.searchsorted(days, [day, day + 1])
+        return self.table.iloc[lo:hi].reset_index(drop=True)
+
+    def window(self, first, last, publisher_id=None):
+        """Rows for days first..last (one publisher's, if given)."""
+        days = self.table['day'].to_numpy()
+        lo, hi = np.searchsorted(days, [first, last + 1])
+        rows = self.table.iloc[lo:hi]
+        if publisher_id is not None:
+            rows = rows[rows['publisher_id'] == publisher_id]
+        return rows.reset_index(drop=True)
+
+    def publisher_stats(self, day):
+        """
+        PublisherStats.table() of every publisher at the end of day (days
+        past the last materialized one see its totals).
+        """
+        publishers = self.state['publishers']
+        totals = self.at(min(day, self.last)).set_index('publisher_id')[TOTALS] \
+            .reindex(publishers, fill_value=0)
+        return PublisherStats.from_totals(*(totals[c].to_numpy() for c in TOTALS), publishers).table()
+
+
+def materialize(tables, root, until=None, rebuild=False, episodes=None):
+    """
+    Load, extend or rebuild the series saved under root (the folder tables
+    were read from) up to until (default: last event day). episodes: the
+    already materialized subscription episodes of tables, if at hand.
+    """
+    if episodes is None:
+        episodes = subscription_episodes.materialize(tables, root)[0]
+    events = SpanEvents(episodes.spans())
+    until = events.last if until is None else until
+    series = None if rebuild else SubscriberSeries.load(root)
+    if series is not None and series.matches(events) and series.last <= until:
+        action = 'extended' if until > series.last else 'up to date'
+        series.extend(events, until)
+    else:
+        action = 'built'
+        series = SubscriberSeries.build(events, events.first, until)
+    series.save(root)
+    return series, action
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument('--until', type=int, default=None, help="last day (default: last event day)")
+    parser.add_argument('--rebuild', action='store_true', help="ignore the saved table")
+    parser.add_argument('--root', default=str(ROOT), help="week folder or synthetic dataset")
+    args = parser.parse_args()
+    root = Path(args.root) if Path(args.root).is_absolute() else ROOT / args.root
+
+    print("SUBSCRIBER TIME SERIES")
+    print(f"Data: {root}")
+
+    print("\n[1] Loading data")
+    tables = rp.load_tables(root, cache=True)
+
+    print("\n[2] Materializing")
+    start = time.perf_counter()
+    series, action = materialize(tables, root, args.until, args.rebuild)
+    print(f"   {action}: days {series.state['first']}..{series.last}, "
+          f"{len(series.state['publishers'])} publishers, {len(series.table):,} rows "
+          f"in {time.perf_counter() - start:.2f}s")
+    print(f"   ✓ Saved {TABLE_NAME}")
+
+    print(f"\n[3] Last {rp.DAYS_PER_MONTH} days by publisher")
+    recent = series.window(series.last - rp.DAYS_PER_MONTH + 1, series.last)
+    summary = recent.groupby('publisher_id').agg(
+        active=('active', 'last'), new_subs=('new_subs', 'sum'),
+        cancellations=('cancellations', 'sum'), mean_daily_churn=('churn_rate', 'mean'))
+    print(summary.sort_values('active', ascending=False).round(4).to_string())
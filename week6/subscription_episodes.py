@@ -0,0 +1,287 @@
+"""
+Subscription episodes: the deduplicated subscription state, persisted.
+
+Every consumer used to rebuild "who is subscribed to what" from the raw
+subscription and cancellation events: churn.py by pairing them, knn.py with
+an outer merge on (adventurer, publisher) that fans out whenever someone
+resubscribes. This keeps the result as one compact table, one row per
+subscribe -> cancel episode:
+
+    adventurer_code, publisher_code     int32 codes into the saved vocabularies
+    sub_ordinal                         day the episode started
+    cancel_ordinal                      day the cancellation ending it came
+                                        (-1 while still active)
+
+Each pair's events are replayed in order (see pair_episodes): a
+subscription while an episode is running is a repeat and dropped, so
+resubscribing after a cancellation -- even on the same day -- starts a new
+episode, and every cancellation ends at most one.
+
+The table and its state file live next to the data they come from
+(root/subscription_episodes.parquet). Updates are incremental: the state
+file records the last materialized day and how many subscriptions /
+cancellations fell on or before it. Events
+after that day are paired against the still-open episodes only; closed
+episodes are never touched again. If the events up to that day changed
+(late data), the table is rebuilt.
+
+    episodes, action = materialize(tables, root)  # root/subscription_episodes.parquet
+    episodes.spans()                              # decoded, sorted by sub_ordinal
+    episodes.active(day)                          # episodes running on day
+
+Usage:
+    python subscription_episodes.py               # build or update
+    python subscription_episodes.py --rebuild
+    python subscription_episodes.py --root ../week2
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parent
+P = lambda name: ROOT / name
+
+sys.path.insert(0, str(ROOT.parent / "week5"))
+import rec_pipeline as rp
+
+TABLE_NAME = 'subscription_episodes.parquet'
+STATE_NAME = 'subscription_episodes.json'
+PAIR = ['adventurer_code', 'publisher_code']
+
+
+def events(tables):
+    """(subscriptions, cancellations) as (adventurer_id, publisher_id, ordinal) frames."""
+    frames = []
+    for name in ['subs', 'cancels']:
+        df = tables[name]
+        if 'ordinal' not in df.columns:
+            df = rp.add_ordinals(df[['adventurer_id', 'publisher_id', 'month', 'year', 'day_of_month']].copy())
+        frames.append(pd.DataFrame({'adventurer_id': df['adventurer_id'].astype(str),
+                                    'publisher_id': df['publisher_id'].astype(str),
+                                    'ordinal': df['ordinal'].to_numpy(np.int64)}))
+    return frames
+
+
+def pair_episodes(subs, cancels):
+    """
+    Episodes of coded subscriptions (PAIR + sub_ordinal) and cancellations
+    (PAIR + cancel_ordinal), sorted by sub_ordinal.
+
+    Events of a pair are replayed in order: a subscription opens an episode
+    unless one is running (then it is a repeat and dropped), a cancellation
+    closes the running episode (and is ignored when none is). Events of one
+    day are ordered by the state the pair starts the day in: if an episode
+    is running, the cancellation comes first (it ends that episode and a
+    same-day subscription starts the next); otherwise the subscription comes
+    first (a same-day subscribe and cancel is a one-day episode).
+    """
+    n_pub = int(np.r_[subs['publisher_code'].to_numpy(), cancels['publisher_code'].to_numpy(), 0].max()) + 1
+    key = np.r_[subs['adventurer_code'].to_numpy(np.int64) * n_pub + subs['publisher_code'].to_numpy(np.int64),
+                cancels['adventurer_code'].to_numpy(np.int64) * n_pub + cancels['publisher_code'].to_numpy(np.int64)]
+    day = np.r_[subs['sub_ordinal'].to_numpy(np.int64), cancels['cancel_ordinal'].to_numpy(np.int64)]
+    is_sub = np.r_[np.ones(len(subs), bool), np.zeros(len(cancels), bool)]
+    if len(key) == 0:
+        return pd.DataFrame({c: np.empty(0, np.int32) for c in PAIR + ['sub_ordinal', 'cancel_ordinal']})
+
+    # State at the start of each (pair, day): a day with only subscriptions
+    # leaves the pair subscribed, one with only cancellations leaves it
+    # cancelled, and a day with both ends in the state it started in
+    order = np.lexsort((day, key))
+    key, day, is_sub = key[order], day[order], is_sub[order]
+    first = np.r_[True, (key[1:] != key[:-1]) | (day[1:] != day[:-1])]
+    starts = np.flatnonzero(first)
+    n_subs = np.add.reduceat(is_sub.astype(np.int64), starts)
+    n_events = np.diff(np.r_[starts, len(key)])
+    end_state = pd.Series(np.where(n_subs == n_events, 1.0, np.where(n_subs == 0, 0.0, np.nan)))
+    group_pair = pd.Series(key[starts])
+    end_state = end_state.groupby(group_pair).ffill()
+    open_at_start = end_state.groupby(group_pair).shift(1).fillna(0).to_numpy() > 0
+
+    # Replay: the event type that changes the starting state goes first
+    rank = is_sub == open_at_start[np.cumsum(first) - 1]
+    order = np.lexsort((rank, day, key))
+    key, day, is_sub = key[order], day[order], is_sub[order]
+    prev_sub = np.r_[False, is_sub[:-1] & (key[1:] == key[:-1])]
+    opens = np.flatnonzero(is_sub & ~prev_sub)
+    closes = np.flatnonzero(~is_sub & prev_sub)
+    # Openings and closings alternate within a pair, each closing right after its opening
+    cancel = np.full(len(opens), -1, dtype=np.int64)
+    if len(closes):
+        closing = closes[np.minimum(np.searchsorted(closes, opens), len(closes) - 1)]
+        closed = (closing > opens) & (key[closing] == key[opens])
+        cancel[closed] = day[closing[closed]]
+
+    episodes = pd.DataFrame({
+        'adventurer_code': key[opens] // n_pub,
+        'publisher_code': key[opens] % n_pub,
+        'sub_ordinal': day[opens],
+        'cancel_ordinal': cancel,
+    }).astype(np.int32)
+    return episodes.sort_values('sub_ordinal', kind='stable').reset_index(drop=True)
+
+
+class SubscriptionEpisodes:
+    """The episode table plus the vocabularies and event counts it was built from."""
+
+    def __init__(self, table, state):
+        self.table = table
+        self.state = state
+        self.adventurers = pd.Index(state['adventurers'], dtype=str)
+        self.publishers = pd.Index(state['publishers'], dtype=str)
+
+    @property
+    def last(self):
+        return self.state['last']
+
+    @classmethod
+    def build(cls, subs, cancels):
+        """Episodes of all events (frames from events())."""
+        adventurers = pd.Index(np.unique(np.r_[subs['adventurer_id'], cancels['adventurer_id']]), dtype=str)
+        publishers = pd.Index(np.unique(np.r_[subs['publisher_id'], cancels['publisher_id']]), dtype=str)
+        episodes = cls(None, {'adventurers': list(adventurers), 'publishers': list(publishers)})
+        episodes.table = pair_episodes(episodes._codes(subs, 'sub_ordinal'),
+                                       episodes._codes(cancels, 'cancel_ordinal'))
+        episodes.state.update(cls._counts(subs, cancels, episodes._last(subs, cancels)))
+        return episodes
+
+    @classmethod
+    def from_tables(cls, tables):
+        """Episodes of a load_tables() dict, built in memory."""
+        return cls.build(*events(tables))
+
+    def update(self, subs, cancels):
+        """Add the events after self.last; returns the number of new events."""
+        new_subs = subs[subs['ordinal'] > self.last]
+        new_cancels = cancels[cancels['ordinal'] > self.last]
+        if len(new_subs) == 0 and len(new_cancels) == 0:
+            return 0
+        for column, vocab in [('adventurer_id', 'adventurers'), ('publisher_id', 'publishers')]:
+            index = getattr(self, vocab)
+            ids = pd.Index(np.r_[new_subs[column], new_cancels[column]], dtype=str).unique()
+            unseen = ids[index.get_indexer(ids) < 0]
+            if len(unseen):
+                setattr(self, vocab, index.append(pd.Index(np.sort(unseen.to_numpy()), dtype=str)))
+                self.state[vocab] = list(getattr(self, vocab))
+
+        # New cancellations can only end episodes that are still open
+        running = self.table['cancel_ordinal'] < 0
+        candidates = pd.concat([self.table.loc[running, PAIR + ['sub_ordinal']],
+                                self._codes(new_subs, 'sub_ordinal')], ignore_index=True)
+        paired = pair_episodes(candidates, self._codes(new_cancels, 'cancel_ordinal'))
+        self.table = pd.concat([self.table[~running], paired], ignore_index=True) \
+            .sort_values('sub_ordinal', kind='stable').reset_index(drop=True)
+        self.state.update(self._counts(subs, cancels, max(self.last, self._last(subs, cancels))))
+        return len(new_subs) + len(new_cancels)
+
+    def matches(self, subs, cancels):
+        """True when the events on or before self.last are the ones it was built from."""
+        return self._counts(subs, cancels, self.last)['events_upto_last'] == self.state['events_upto_last']
+
+    def _codes(self, frame, column):
+        return pd.DataFrame({
+            'adventurer_code': self.adventurers.get_indexer(frame['adventurer_id']).astype(np.int32),
+            'publisher_code': self.publishers.get_indexer(frame['publisher_id']).astype(np.int32),
+            column: frame['ordinal'].to_numpy(np.int32),
+        })
+
+    @staticmethod
+    def _last(subs, cancels):
+        return int(max(subs['ordinal'].max(), cancels['ordinal'].max() if len(cancels) else 0))
+
+    @staticmethod
+    def _counts(subs, cancels, last):
+        return {'last': int(last),
+                'events_upto_last': [int((subs['ordinal'] <= last).sum()),
+                                     int((cancels['ordinal'] <= last).sum())]}
+
+    # -- persistence and queries -------------------------------------------
+
+    def save(self, root):
+        root = Path(root)
+        self.table.to_parquet(root / TABLE_NAME, index=False)
+        (root / STATE_NAME).write_text(json.dumps(self.state))
+
+    @classmethod
+    def load(cls, root):
+        root = Path(root)
+        if not ((root / TABLE_NAME).exists() and (root / STATE_NAME).exists()):
+            return None
+        return cls(pd.read_parquet(root / TABLE_NAME), json.loads((root / STATE_NAME).read_text()))
+
+    def spans(self):
+        """
+        Decoded episodes (adventurer_id, publisher_id, sub_ordinal,
+        cancel_ordinal NaN while active), sorted by sub_ordinal.
+        """
+        cancel = self.table['cancel_ordinal'].to_numpy(np.float64)
+        return pd.DataFrame({
+            'adventurer_id': self.adventurers[self.table['adventurer_code']],
+            'publisher_id': self.publishers[self.table['publisher_code']],
+            'sub_ordinal': self.table['sub_ordinal'].to_numpy(np.int64),
+            'cancel_ordinal': np.where(cancel >= 0, cancel, np.nan),
+        })
+
+    def active(self, day=None):
+        """
+        Episodes running on day (sub_ordinal <= day < cancel_ordinal), decoded;
+        by default the ones still running after the last event.
+        """
+        cancel = self.table['cancel_ordinal']
+        running = cancel < 0
+        if day is not None:
+            running = (self.table['sub_ordinal'] <= day) & (running | (cancel > day))
+        return self.spans()[running.to_numpy()].reset_index(drop=True)
+
+
+def materialize(tables, root, rebuild=False):
+    """
+    Load the episodes saved under root (the folder tables were read from)
+    and bring them up to date with tables, or rebuild them.
+    """
+    subs, cancels = events(tables)
+    episodes = None if rebuild else SubscriptionEpisodes.load(root)
+    if episodes is not None and episodes.matches(subs, cancels):
+        added = episodes.update(subs, cancels)
+        action = f'updated with {added:,} events' if added else 'up to date'
+    else:
+        episodes = SubscriptionEpisodes.build(subs, cancels)
+        action = 'built'
+    episodes.save(root)
+    return episodes, action
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument('--root', default=str(ROOT), help="week folder with the parquet tables")
+    parser.add_argument('--rebuild', action='store_true', help="ignore the saved table")
+    args = parser.parse_args()
+    root = Path(args.root) if Path(args.root).is_absolute() else ROOT / args.root
+
+    print("SUBSCRIPTION EPISODES")
+    print(f"Data: {root}")
+
+    print("\n[1] Loading data")
+    tables = rp.load_tables(root, cache=True)
+    print(f"   Subscriptions: {len(tables['subs']):,}, cancellations: {len(tables['cancels']):,}")
+
+    print("\n[2] Materializing")
+    start = time.perf_counter()
+    episodes, action = materialize(tables, root, args.rebuild)
+    print(f"   {action}: {len(episodes.table):,} episodes up to day {episodes.last} "
+          f"in {time.perf_counter() - start:.2f}s")
+    print(f"   ✓ Saved {TABLE_NAME} ({(root / TABLE_NAME).stat().st_size / 1024:.0f} KB)")
+
+    print("\n[3] Summary")
+    table = episodes.table
+    running = table['cancel_ordinal'] < 0
+    per_pair = table.groupby(PAIR).size()
+    print(f"   Active episodes: {running.sum():,}")
+    print(f"   Pairs: {len(per_pair):,} ({(per_pair > 1).sum():,} resubscribed)")
+    lengths = (table['cancel_ordinal'] - table['sub_ordinal'])[~running]
+    print(f"   Ended episode length: mean {lengths.mean():.1f} days, median {lengths.median():.0f}")
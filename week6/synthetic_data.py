@@ -0,0 +1,336 @@
+"""
+Synthetic potions dataset at configurable scale.
+
+Reproduces the six tables (content_metadata, adventurer_metadata,
+subscriptions, cancellations, content_views, app_opens) with the shapes
+measured on the real week folders:
+
+- power-law content popularity within each publisher's catalog,
+- bimodal watch time (about half the views bounce in the first seconds,
+  a spike of completions at or past 100%),
+- subscriptions billed in 24-day months, each month renewing with a fixed
+  probability, so cancellations and right-censored active subs both appear,
+- mystical-calendar dates (year / month / day_of_month / day name) over the
+  same date range as the real data.
+
+Categorical columns (names, genres, languages, regions, ages, durations,
+...) are resampled from the real tables in SEED_ROOT. Users and events
+scale linearly; the catalog (content, publishers) scales with sqrt(scale)
+so per-publisher audiences grow too.
+
+Event tables are generated in chunks of adventurers and written as
+year/month-partitioned parquet datasets under synthetic/x<scale>/, each
+named like the real file (content_views.parquet/ is a directory), so
+pd.read_parquet(root / "content_views.parquet") works unchanged.
+
+Usage:
+    python synthetic_data.py            # 10x
+    python synthetic_data.py 10 100 1000
+"""
+
+import shutil
+import sys
+import time
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent
+P = lambda name: ROOT / name
+
+SEED_ROOT = ROOT
+OUT_ROOT = P("synthetic")
+CHUNK_USERS = 200_000
+SEED = 42
+
+MONTH_ORDER = ["Frostmere", "Emberfall", "Lunaris", "Verdantia", "Solstice",
+               "Duskveil", "Starshade", "Aurorath", "Mysthaven", "Eclipsion"]
+DAYS_PER_MONTH = 24
+DAYS_PER_YEAR = len(MONTH_ORDER) * DAYS_PER_MONTH
+# ordinal % 6 -> day name, as in the real tables
+DAY_NAMES = ["Edgeday", "Bloomday", "ArcanaDay", "Hearthday", "Crownday", "Soulday"]
+
+# Real-data shapes (week6 parquet files)
+BASE_ADVENTURERS = 25_770
+BASE_CONTENT = 982
+BASE_PUBLISHERS = 26
+BASE_STUDIOS = 15
+START_ORDINAL = 2456160
+END_ORDINAL = 2456469
+VIEWS_PER_USER = (9.4, 5.9)         # mean, std (negative binomial)
+OPENS_PER_USER = (46.3, 17.0)       # mean, std (normal, >= 1)
+OPENS_PER_SESSION = 3.0             # geometric mean
+POPULARITY_EXPONENT = 1.67          # views ~ rank^-a within a catalog
+RENEW_PROB = 0.58                   # P(another 24-day month)
+BOUNCE_SHARE = 0.49                 # views with watch_pct < 0.1
+COMPLETE_SHARE = 0.15               # views with watch_pct >= ~1
+RATING_SHARE = 0.068
+
+TABLES = ["content_metadata", "adventurer_metadata", "subscriptions",
+          "cancellations", "content_views", "app_opens"]
+
+
+# ---------------------------------------------------------------------------
+# Helpers
+# ---------------------------------------------------------------------------
+
+def base36(n, width):
+    """Vectorized fixed-width base-36 ids (the real ids look like '4fq3')."""
+    alphabet = np.array(list("0123456789abcdefghijklmnopqrstuvwxyz"))
+    n = np.asarray(n, dtype=np.int64)
+    out = alphabet[n % 36]
+    for _ in range(width - 1):
+        n = n // 36
+        out = np.char.add(alphabet[n % 36], out)
+    return out
+
+
+def ordinal_columns(ordinal):
+    """Day ordinals -> the calendar columns used by every table."""
+    ordinal = np.asarray(ordinal, dtype=np.int64)
+    month_idx = (ordinal % DAYS_PER_YEAR) // DAYS_PER_MONTH
+    return {
+        'month': np.array(MONTH_ORDER)[month_idx],
+        'day': np.array(DAY_NAMES)[ordinal % len(DAY_NAMES)],
+        'day_of_month': (ordinal % DAYS_PER_MONTH + 1).astype(np.int64),
+        'year': (ordinal // DAYS_PER_YEAR).astype(np.int64),
+    }
+
+
+def negative_binomial(rng, mean, std, size):
+    """Counts >= 1 with the given mean/std (std^2 > mean)."""
+    var = max(std ** 2, mean + 1e-6)
+    p = mean / var
+    r = mean * p / (1 - p)
+    return np.maximum(rng.negative_binomial(r, p, size=size), 1)
+
+
+def power_law_weights(n, exponent):
+    return np.arange(1, n + 1, dtype=np.float64) ** -exponent
+
+
+def sample_within_groups(rng, group, group_offsets, cum_weights):
+    """
+    For each event in group g, sample an index in [offsets[g], offsets[g+1])
+    with per-group cumulative weights (normalised to end at 1 per group).
+    """
+    u = rng.random(len(group))
+    return np.searchsorted(cum_weights, group + u, side='right').clip(
+        group_offsets[group], group_offsets[group + 1] - 1)
+
+
+def write_partitioned(df, path):
+    """Append a chunk to a year/month-partitioned parquet dataset."""
+    pq.write_to_dataset(pa.Table.from_pandas(df, preserve_index=False), str(path),
+                        partition_cols=['year', 'month'])
+
+
+# ---------------------------------------------------------------------------
+# Generator
+# ---------------------------------------------------------------------------
+
+class SyntheticPotions:
+    """Draws every table from distributions measured on the seed data."""
+
+    def __init__(self, scale, seed_root=SEED_ROOT, seed=SEED):
+        self.scale = scale
+        self.rng = np.random.default_rng(seed)
+        self.seed_meta = pd.read_parquet(Path(seed_root) / "content_metadata.parquet")
+        self.seed_adv = pd.read_parquet(Path(seed_root) / "adventurer_metadata.parquet")
+        seed_subs = pd.read_parquet(Path(seed_root) / "subscriptions.parquet")
+        self.seed_subs_per_user = seed_subs.groupby('adventurer_id').size().to_numpy()
+        month_idx = seed_subs['month'].map({m: i for i, m in enumerate(MONTH_ORDER)}).to_numpy()
+        self.seed_sub_ordinals = (seed_subs['year'].to_numpy() * DAYS_PER_YEAR
+                                  + month_idx * DAYS_PER_MONTH + seed_subs['day_of_month'].to_numpy() - 1)
+        pub_share = seed_subs.groupby('publisher_id')['adventurer_id'].nunique().sort_values(ascending=False)
+        self.seed_pub_share = pub_share.to_numpy(np.float64) / pub_share.sum()
+        self.seed_ratings = pd.read_parquet(Path(seed_root) / "content_views.parquet",
+                                            columns=['rating'])['rating'].dropna().to_numpy()
+
+        catalog_scale = np.sqrt(scale)
+        self.n_adventurers = int(round(BASE_ADVENTURERS * scale))
+        self.n_content = int(round(BASE_CONTENT * catalog_scale))
+        self.n_publishers = max(1, int(round(BASE_PUBLISHERS * catalog_scale)))
+        self.n_studios = max(1, int(round(BASE_STUDIOS * catalog_scale)))
+        self.id_width = max(4, int(np.ceil(np.log(max(self.n_adventurers, self.n_content) * 8) / np.log(36))))
+
+    def publishers(self):
+        ids = np.char.add('p', base36((np.arange(self.n_publishers) * 7919 + 1296) % 36 ** (self.id_width - 1), self.id_width - 1))
+        # Subscriber shares follow the real (sorted) share curve, stretched over n publishers
+        x = np.linspace(0, 1, len(self.seed_pub_share))
+        share = np.interp(np.linspace(0, 1, self.n_publishers), x, self.seed_pub_share)
+        return ids, share / share.sum()
+
+    def content(self, pub_ids):
+        rng, n = self.rng, self.n_content
+        seed = self.seed_meta
+        pick = rng.integers(0, len(seed), size=n)
+        # Every publisher gets at least one item; catalog sizes vary like the real 17-59
+        pub = np.sort(np.r_[np.arange(len(pub_ids)), rng.integers(0, len(pub_ids), size=n - len(pub_ids))]) \
+            if n >= len(pub_ids) else np.arange(n) % len(pub_ids)
+        release = rng.integers(START_ORDINAL, END_ORDINAL + 1, size=n)
+        genre = seed['genre_id'].to_numpy()[pick]
+        lang = seed['language_code'].to_numpy()[pick]
+        studios = np.char.add('s', base36((np.arange(self.n_studios) * 104729 + 1296) % 36 ** (self.id_width - 1), self.id_width - 1))
+        df = pd.DataFrame({
+            'content_id': base36(np.arange(n) * 2654435761 % (36 ** self.id_width), self.id_width),
+            'studio': studios[rng.integers(0, len(studios), size=n)],
+            'title': seed['title'].to_numpy()[pick],
+            'genre_id': genre,
+            'minutes': seed['minutes'].to_numpy()[rng.integers(0, len(seed), size=n)],
+            'language_code': lang,
+            **ordinal_columns(release),
+        })
+        df['publisher_id'] = pub_ids[pub]
+        df['playlist_id'] = [f"{g}_{l}_{i % 97}" for g, l, i in zip(genre, lang, pub)]
+        return df
+
+    def adventurers(self, start, stop):
+        rng, seed = self.rng, self.seed_adv
+        n = stop - start
+        cols = {}
+        for col in ['name', 'honorific', 'gender', 'age', 'primary_language', 'favorite_genre', 'region']:
+            cols[col] = seed[col].to_numpy()[rng.integers(0, len(seed), size=n)]
+        ids = base36((np.arange(start, stop) * 48271 + 7) % (36 ** self.id_width), self.id_width)
+        return pd.DataFrame({'adventurer_id': ids, **cols})
+
+    def subscriptions(self, adv_ids, pub_share):
+        """One row per episode: adventurer index, publisher index, start, end (-1 = active)."""
+        rng = self.rng
+        k = self.seed_subs_per_user[rng.integers(0, len(self.seed_subs_per_user), size=len(adv_ids))]
+        user = np.repeat(np.arange(len(adv_ids)), k)
+        pub = rng.choice(len(pub_share), size=len(user), p=pub_share)
+        start = self.seed_sub_ordinals[rng.integers(0, len(self.seed_sub_ordinals), size=len(user))]
+        months = rng.geometric(1 - RENEW_PROB, size=len(user))
+        end = start + months * DAYS_PER_MONTH
+        end = np.where(end <= END_ORDINAL, end, -1)
+        return user, pub, start, end
+
+    def views(self, user, pub, start, end, content, pub_offsets, cum_weights):
+        rng = self.rng
+        n_users = user.max() + 1 if len(user) else 0
+        n_views = negative_binomial(rng, *VIEWS_PER_USER, size=n_users)
+        # Each view belongs to one of its user's episodes
+        ep_first = np.searchsorted(user, np.arange(n_users))
+        ep_count = np.bincount(user, minlength=n_users)
+        view_user = np.repeat(np.arange(n_users), n_views)
+        episode = ep_first[view_user] + (rng.random(len(view_user)) * ep_count[view_user]).astype(np.int64)
+        last_day = np.where(end[episode] >= 0, end[episode], END_ORDINAL)
+        ordinal = start[episode] + (rng.random(len(episode)) * (last_day - start[episode] + 1)).astype(np.int64)
+        item = sample_within_groups(rng, pub[episode], pub_offsets, cum_weights)
+
+        minutes = content['minutes'].to_numpy()[item]
+        kind = rng.random(len(item))
+        watch = np.where(kind < BOUNCE_SHARE, rng.exponential(0.02, len(item)),
+                         np.where(kind < BOUNCE_SHARE + COMPLETE_SHARE,
+                                  rng.uniform(0.95, 1.15, len(item)), rng.uniform(0.1, 0.95, len(item))))
+        seconds = np.floor(watch * minutes * 60)
+        rating = np.where(rng.random(len(item)) < RATING_SHARE,
+                          self.seed_ratings[rng.integers(0, len(self.seed_ratings), len(item))], np.nan)
+        return view_user, item, ordinal, seconds, rating
+
+    def app_opens(self, user, pub, start, end, content, pub_offsets):
+        """Opens come in sessions: same day, publisher and playlist."""
+        rng = self.rng
+        n_users = user.max() + 1 if len(user) else 0
+        n_opens = np.maximum(rng.normal(*OPENS_PER_USER, size=n_users).round(), 1).astype(np.int64)
+        n_sessions = np.maximum(np.ceil(n_opens / OPENS_PER_SESSION), 1).astype(np.int64)
+        ep_first = np.searchsorted(user, np.arange(n_users))
+        ep_count = np.bincount(user, minlength=n_users)
+        sess_user = np.repeat(np.arange(n_users), n_sessions)
+        episode = ep_first[sess_user] + (rng.random(len(sess_user)) * ep_count[sess_user]).astype(np.int64)
+        last_day = np.where(end[episode] >= 0, end[episode], END_ORDINAL)
+        day = start[episode] + (rng.random(len(episode)) * (last_day - start[episode] + 1)).astype(np.int64)
+        lo, hi = pub_offsets[pub[episode]], pub_offsets[pub[episode] + 1]
+        item = lo + (rng.random(len(episode)) * (hi - lo)).astype(np.int64)
+        size = rng.geometric(1 / OPENS_PER_SESSION, size=len(sess_user))
+        session = np.repeat(np.arange(len(sess_user)), size)
+        return sess_user[session], pub[episode][session], item[session], day[session]
+
+    def generate(self, out_dir, chunk_users=CHUNK_USERS):
+        out_dir = Path(out_dir)
+        if out_dir.exists():
+            shutil.rmtree(out_dir)
+        out_dir.mkdir(parents=True)
+
+        pub_ids, pub_share = self.publishers()
+        content = self.content(pub_ids)
+        pub_index = pd.Index(pub_ids).get_indexer(content['publisher_id'])
+        pub_offsets = np.r_[0, np.cumsum(np.bincount(pub_index, minlength=len(pub_ids)))]
+        # Popularity: power law over a random ranking of each publisher's catalog
+        cum_weights = np.empty(len(content))
+        for p in range(len(pub_ids)):
+            lo, hi = pub_offsets[p], pub_offsets[p + 1]
+            w = self.rng.permutation(power_law_weights(hi - lo, POPULARITY_EXPONENT))
+            cum_weights[lo:hi] = p + np.cumsum(w) / w.sum()
+        content.drop(columns=['publisher_id', 'playlist_id']).to_parquet(out_dir / "content_metadata.parquet", index=False)
+        content_ids = content['content_id'].to_numpy()
+        playlists = content['playlist_id'].to_numpy()
+
+        counts = dict.fromkeys(TABLES, 0)
+        counts['content_metadata'] = len(content)
+        adv_frames = []
+        for start in range(0, self.n_adventurers, chunk_users):
+            stop = min(self.n_adventurers, start + chunk_users)
+            adv = self.adventurers(start, stop)
+            adv_frames.append(adv)
+            adv_ids = adv['adventurer_id'].to_numpy()
+
+            user, pub, sub_start, sub_end = self.subscriptions(adv_ids, pub_share)
+            subs = pd.DataFrame({'adventurer_id': adv_ids[user], 'publisher_id': pub_ids[pub],
+                                 **ordinal_columns(sub_start)})
+            cancelled = sub_end >= 0
+            cancels = pd.DataFrame({'adventurer_id': adv_ids[user[cancelled]],
+                                    'publisher_id': pub_ids[pub[cancelled]],
+                                    **ordinal_columns(sub_end[cancelled])})
+
+            v_user, item, ordinal, seconds, rating = self.views(
+                user, pub, sub_start, sub_end, content, pub_offsets, cum_weights)
+            views = pd.DataFrame({
+                'content_id': content_ids[item],
+                'seconds_viewed': seconds,
+                'rating': rating,
+                'adventurer_id': adv_ids[v_user],
+                'publisher_id': pub_ids[pub_index[item]],
+                'playlist_id': playlists[item],
+                **ordinal_columns(ordinal),
+            })
+
+            o_user, o_pub, o_item, o_day = self.app_opens(user, pub, sub_start, sub_end, content, pub_offsets)
+            opens = pd.DataFrame({'adventurer_id': adv_ids[o_user], 'publisher_id': pub_ids[o_pub],
+                                  'playlist_id': playlists[o_item], **ordinal_columns(o_day)})
+
+            for name, df in [('subscriptions', subs), ('cancellations', cancels),
+                             ('content_views', views), ('app_opens', opens)]:
+                write_partitioned(df, out_dir / f"{name}.parquet")
+                counts[name] += len(df)
+            print(f"   adventurers {stop:,}/{self.n_adventurers:,}")
+
+        pd.concat(adv_frames, ignore_index=True).to_parquet(out_dir / "adventurer_metadata.parquet", index=False)
+        counts['adventurer_metadata'] = self.n_adventurers
+        return counts
+
+
+def dataset_dir(scale):
+    return OUT_ROOT / f"x{scale:g}"
+
+
+def generate(scale, out_dir=None, seed=SEED):
+    """Generate one scale; returns the output folder."""
+    out_dir = Path(out_dir) if out_dir else dataset_dir(scale)
+    start = time.perf_counter()
+    counts = SyntheticPotions(scale, seed=seed).generate(out_dir)
+    print(f"   {scale:g}x written to {out_dir} in {time.perf_counter() - start:.1f}s")
+    for name, n in counts.items():
+        print(f"     {name:<22} {n:>14,}")
+    return out_dir
+
+
+if __name__ == "__main__":
+    scales = [float(s) for s in sys.argv[1:]] or [10]
+    print("SYNTHETIC POTIONS DATA")
+    for scale in scales:
+        print(f"\n[{scale:g}x]")
+        generate(scale)
@@ -0,0 +1,215 @@
+"""
+Multi-cutoff churn training sets.
+
+churn.py trains on the subscriptions active at one cutoff (two months back),
+so the training set is capped at one day's active subs. This stacks the
+point-in-time examples (feature_store.ChurnFeatureStore) of many monthly
+cutoffs whose labels have matured, and writes them as a hive-partitioned
+parquet dataset:
+
+    churn_training/
+        _manifest.json                  cutoffs, horizon, feature columns, data key
+        cutoff=2456208/part-0.parquet
+        cutoff=2456232/part-0.parquet
+        ...
+
+Cutoffs are computed BATCH_CUTOFFS at a time (one feature-store sweep per
+batch) and written as soon as they are done, so memory stays bounded by the
+batch, not the whole set. When the manifest matches (same data, horizon and
+features) partitions that already exist are reused, so adding a month only
+computes the new cutoff.
+
+A subscription that stays active for months shows up at every cutoff with
+nearly the same features. --max-per-sub N keeps only its N most recent
+examples: rows are keyed by a 64-bit hash of (adventurer, publisher,
+subscription date) and counted across batches (newest batch first) with
+sorted key arrays, so no per-row Python runs. Older cutoffs then keep
+mostly subscriptions that ended before the next cutoff, so their churn rate
+is inflated; leave it off unless the repeats are a problem.
+
+    frame = load()                                  # all cutoffs
+    frame = load(cutoffs=[2456400, 2456424])        # partition pruning
+
+Usage:
+    python training_set.py                  # 10 monthly cutoffs ending at churn.py's train_cutoff
+    python training_set.py --months 6 --max-per-sub 1
+"""
+
+import argparse
+import json
+import shutil
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from app_opens import AppOpens
+from feature_store import ChurnFeatureStore, CHURN_FEATURES, HORIZON
+
+ROOT = Path(__file__).resolve().parent
+P = lambda name: ROOT / name
+
+sys.path.insert(0, str(ROOT.parent / "week5"))
+import rec_pipeline as rp
+from arrow_cache import ArrowCache
+
+OUT_DIR = P("churn_training")
+CURRENT_ORDINAL = 10235 * rp.DAYS_PER_YEAR + rp.MONTH_TO_INDEX["Verdantia"] * rp.DAYS_PER_MONTH
+LAST_CUTOFF = CURRENT_ORDINAL - 2 * rp.DAYS_PER_MONTH    # churn.py's train_cutoff
+N_MONTHS = 10
+BATCH_CUTOFFS = 4
+MANIFEST = "_manifest.json"      # leading underscore: skipped by parquet readers
+KEY_COLUMNS = ['adventurer_id', 'publisher_id', 'sub_ordinal']
+
+
+def monthly_cutoffs(last=LAST_CUTOFF, n_months=N_MONTHS, step=rp.DAYS_PER_MONTH):
+    """n_months cutoffs, step days apart, ending at last (ascending)."""
+    return [last - k * step for k in range(n_months - 1, -1, -1)]
+
+
+def matured(cutoffs, now=CURRENT_ORDINAL, horizon=HORIZON):
+    """Cutoffs whose churn window (cutoff, cutoff + horizon] has fully passed."""
+    return [c for c in cutoffs if c + horizon <= now]
+
+
+def subscription_keys(frame):
+    """64-bit hash of (adventurer, publisher, subscription date) per row."""
+    return pd.util.hash_pandas_object(frame[KEY_COLUMNS].astype({'adventurer_id': str, 'publisher_id': str}),
+                                      index=False).to_numpy()
+
+
+class SubscriptionCounter:
+    """How many examples of each subscription key have been kept so far."""
+
+    def __init__(self):
+        self.keys = np.array([], dtype=np.uint64)
+        self.counts = np.array([], dtype=np.int64)
+
+    def seen(self, keys):
+        if not len(self.keys):
+            return np.zeros(len(keys), dtype=np.int64)
+        pos = np.minimum(np.searchsorted(self.keys, keys), len(self.keys) - 1)
+        return np.where(self.keys[pos] == keys, self.counts[pos], 0)
+
+    def add(self, keys):
+        self.keys, inverse = np.unique(np.r_[self.keys, keys], return_inverse=True)
+        weights = np.r_[self.counts, np.ones(len(keys), dtype=np.int64)]
+        self.counts = np.bincount(inverse, weights=weights, minlength=len(self.keys)).astype(np.int64)
+
+
+def limit_per_subscription(frame, counter, max_per_sub):
+    """Keep each subscription's newest examples, max_per_sub in total across calls."""
+    frame = frame.sort_values('cutoff', ascending=False, kind='stable')
+    keys = subscription_keys(frame)
+    # Rank of each row among its subscription's rows (0 = newest cutoff)
+    order = np.argsort(keys, kind='stable')
+    sorted_keys = keys[order]
+    starts = np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]])
+    rank = np.empty(len(keys), dtype=np.int64)
+    rank[order] = np.arange(len(keys)) - np.repeat(starts, np.diff(np.r_[starts, len(keys)]))
+    keep = counter.seen(keys) + rank < max_per_sub
+    counter.add(keys[keep])
+    return frame[keep].sort_values('cutoff', kind='stable')
+
+
+def partition_path(out_dir, cutoff):
+    return Path(out_dir) / f"cutoff={cutoff}" / "part-0.parquet"
+
+
+def _settings(root, horizon, max_per_sub):
+    return {'data_key': ArrowCache(root).key, 'horizon': horizon,
+            'features': CHURN_FEATURES, 'max_per_sub': max_per_sub}
+
+
+def generate(cutoffs, root=ROOT, out_dir=OUT_DIR, horizon=HORIZON, max_per_sub=None,
+             batch_cutoffs=BATCH_CUTOFFS, now=CURRENT_ORDINAL, tables=None, opens=None):
+    """Write the labeled examples of every matured cutoff; returns the manifest."""
+    out_dir = Path(out_dir)
+    cutoffs = matured(sorted(set(int(c) for c in cutoffs)), now, horizon)
+    settings = _settings(root, horizon, max_per_sub)
+    manifest_path = out_dir / MANIFEST
+    old = json.loads(manifest_path.read_text()) if manifest_path.exists() else None
+    reusable = old is not None and all(old.get(k) == v for k, v in settings.items())
+    if max_per_sub is not None:
+        # The per-subscription limit depends on every cutoff in the set
+        reusable = reusable and old['cutoffs'] == cutoffs
+    if not reusable and out_dir.exists():
+        shutil.rmtree(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    for stale in out_dir.glob("cutoff=*"):
+        if int(stale.name.split("=")[1]) not in cutoffs:
+            shutil.rmtree(stale)
+
+    todo = [c for c in cutoffs if not (reusable and partition_path(out_dir, c).exists())]
+    rows = dict(old['rows']) if reusable else {}
+    rows = {int(c): n for c, n in rows.items() if int(c) in cutoffs}
+    print(f"   {len(cutoffs)} cutoffs, {len(cutoffs) - len(todo)} reused, {len(todo)} to compute")
+    if todo:
+        if tables is None:
+            tables = rp.load_tables(root, cache=True)
+        if opens is None:
+            opens = AppOpens.stream(root)
+        store = ChurnFeatureStore(tables, opens, horizon=horizon)
+        counter = SubscriptionCounter()
+        # Newest first, so --max-per-sub keeps the most recent examples
+        todo = sorted(todo, reverse=True)
+        for start in range(0, len(todo), batch_cutoffs):
+            batch = todo[start:start + batch_cutoffs]
+            t0 = time.perf_counter()
+            frame = store.build(batch)
+            for c in batch:
+                store.cache.pop(c, None)
+            if max_per_sub is not None:
+                frame = limit_per_subscription(frame, counter, max_per_sub)
+            cutoff_col = frame['cutoff'].to_numpy()
+            for c in batch:
+                part = frame[cutoff_col == c]
+                path = partition_path(out_dir, c)
+                path.parent.mkdir(parents=True, exist_ok=True)
+                pq.write_table(pa.Table.from_pandas(part.drop(columns='cutoff'), preserve_index=False), path)
+                rows[int(c)] = len(part)
+            print(f"   cutoffs {min(batch)}..{max(batch)}: {len(frame):,} rows "
+                  f"({time.perf_counter() - t0:.2f}s)")
+
+    manifest = dict(settings, cutoffs=cutoffs, rows={str(c): rows.get(c, 0) for c in cutoffs})
+    manifest_path.write_text(json.dumps(manifest, indent=2))
+    return manifest
+
+
+def load(out_dir=OUT_DIR, cutoffs=None, columns=None):
+    """The stacked training set (optionally only some cutoffs / columns)."""
+    filters = [('cutoff', 'in', [int(c) for c in cutoffs])] if cutoffs is not None else None
+    frame = pd.read_parquet(out_dir, columns=columns, filters=filters)
+    if 'cutoff' in frame.columns:
+        frame['cutoff'] = frame['cutoff'].astype(np.int64)
+    return frame
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument('--months', type=int, default=N_MONTHS, help="number of monthly cutoffs")
+    parser.add_argument('--last', type=int, default=LAST_CUTOFF, help="latest cutoff ordinal")
+    parser.add_argument('--max-per-sub', type=int, default=None,
+                        help="keep at most this many examples per subscription")
+    parser.add_argument('--out', default=str(OUT_DIR))
+    args = parser.parse_args()
+
+    print("CHURN TRAINING SET")
+    cutoffs = monthly_cutoffs(args.last, args.months)
+    print(f"Cutoffs: {cutoffs[0]}..{cutoffs[-1]} ({len(cutoffs)} monthly)")
+
+    print("\n[1] Generating examples")
+    t0 = time.perf_counter()
+    manifest = generate(cutoffs, out_dir=args.out, max_per_sub=args.max_per_sub)
+    print(f"   Done in {time.perf_counter() - t0:.2f}s")
+
+    print("\n[2] Summary")
+    frame = load(args.out, columns=['cutoff', 'churn'])
+    summary = frame.groupby('cutoff')['churn'].agg(rows='size', churn_rate='mean')
+    print(summary.round(3).to_string())
+    print(f"   Total: {len(frame):,} examples ({len(frame) / max(summary['rows'].max(), 1):.1f}x one cutoff)")
+    print(f"\n   ✓ Saved {args.out}")
@@ -4,6 +4,7 @@ Week 7: User Personas via Clustering
 Emanuel Gonzalez
 """
 
+import sys
 import numpy as np
 import pandas as pd
 from pathlib import Path
@@ -19,14 +20,23 @@ warnings.filterwarnings('ignore')
 ROOT = Path(__file__).resolve().parent
 P = lambda name: ROOT / name
 
+sys.path.insert(0, str(ROOT.parent / "week6"))
+sys.path.insert(0, str(ROOT.parent / "week5"))
+from stage_profiler import StageProfiler
+from app_opens import AppOpens
+import rec_pipeline as rp
+
+prof = StageProfiler("personas", report_dir=P("profiles"))
+
 
 print("WEEK 7: USER PERSONA DISCOVERY")
 print("\n[1] Loading data")
-df_views = pd.read_parquet(P("content_views.parquet"))
-df_metadata = pd.read_parquet(P("content_metadata.parquet"))
-df_adventurers = pd.read_parquet(P("adventurer_metadata.parquet"))
-df_subs = pd.read_parquet(P("subscriptions.parquet"))
-df_cancels = pd.read_parquet(P("cancellations.parquet"))
+prof.step("load")
+# Memory-mapped Arrow cache (arrow_cache.py): compact dtypes, ordinals and
+# categorical IDs without decoding parquet on every start
+tables = rp.load_tables(ROOT, cache=True)
+df_views, df_metadata, df_adventurers = tables['views'], tables['metadata'], tables['adventurers']
+df_subs, df_cancels = tables['subs'], tables['cancels']
 
 print(f"    Views: {len(df_views):,}")
 print(f"    Adventurers: {len(df_adventurers):,}")
@@ -38,6 +48,7 @@ print(f"    Cancellation columns: {df_cancels.columns.tolist()}")
 
 
 print("\n[2] Cleaning data")
+prof.step("clean")
 
 # Remove duplicates
 df_views = df_views.sort_values('seconds_viewed', ascending=False)\
@@ -60,6 +71,7 @@ df_views_clean = df_merged[
 print(f"    Clean views: {len(df_views_clean):,}")
 
 print("\n[3] Building user profiles")
+prof.step("profiles")
 
 # VIEWING BEHAVIOR
 viewing_features = df_views_clean.groupby('adventurer_id').agg({
@@ -85,6 +97,10 @@ sub_features.columns = ['adventurer_id', 'num_subscriptions', 'num_publishers']
 # CHURN BEHAVIOR - just count how many times they churned
 churn_features = df_cancels.groupby('adventurer_id').size().reset_index(name='num_churns')
 
+# APP OPENS - streamed by row group into daily counters (week6/app_opens.py);
+# opens, open days, sessions and recency per adventurer
+open_features = AppOpens.stream(ROOT).profiles()
+
 # CONTENT PREFERENCES
 df_views_enriched = df_views_clean.merge(
     df_metadata[['content_id', 'genre_id', 'language_code']], 
@@ -101,7 +117,7 @@ lang_diversity.columns = ['adventurer_id', 'lang_diversity']
 # MERGE EVERYTHING
 user_profiles = df_adventurers[['adventurer_id', 'age']].copy()
 
-for df in [viewing_features, sub_features, churn_features, 
+for df in [viewing_features, sub_features, churn_features, open_features,
            genre_diversity, lang_diversity]:
     user_profiles = user_profiles.merge(df, on='adventurer_id', how='left')
 
@@ -112,6 +128,7 @@ print(f"    Features: {user_profiles.columns.tolist()}")
 
 
 print("\n[4] Preparing features for clustering")
+prof.step("prepare")
 
 # Select features (behavioral only for clustering)
 clustering_features = [
@@ -136,6 +153,7 @@ X_scaled = scaler.fit_transform(X)
 
 print(f"    Scaled features: mean=0, std=1")
 print("\n[5] Finding optimal number of clusters")
+prof.step("choose_k")
 
 results = []
 K_range = range(3, 9)
@@ -182,6 +200,7 @@ best_silhouette = results_df['silhouette'].max()
 print(f"\n     Optimal k: {optimal_k} (Silhouette: {best_silhouette:.3f})")
 
 print(f"\n[6] Clustering with k={optimal_k}")
+prof.step("cluster")
 
 kmeans_final = KMeans(n_clusters=optimal_k, random_state=42, n_init=20)
 user_profiles['cluster'] = kmeans_final.fit_predict(X_scaled)
@@ -193,6 +212,7 @@ for cluster_id in sorted(user_profiles['cluster'].unique()):
     print(f"      Cluster {cluster_id}: {count:,} users ({pct:.1f}%)")
 
 print("\n[7] Describing clusters")
+prof.step("describe")
 
 # Add age back for description
 description_features = clustering_features + ['age']
@@ -205,6 +225,7 @@ cluster_summary.to_csv(P('cluster_summary.csv'))
 print(f"\n    Saved cluster_summary.csv")
 
 print("\n[8] Creating visualizations")
+prof.step("visualize")
 
 # PCA for 2D visualization
 pca = PCA(n_components=2, random_state=42)
@@ -232,6 +253,7 @@ plt.savefig(P('cluster_visualization.png'), dpi=300, bbox_inches='tight')
 print(f"    Saved cluster_visualization.png")
 
 print("\n[9] Creating persona profiles")
+prof.step("personas")
 
 # For each cluster, get typical characteristics
 persona_insights = []
@@ -257,6 +279,7 @@ persona_df.to_csv(P('persona_insights.csv'), index=False)
 print(f"\nSaved persona_insights.csv")
 
 print("\n[10] Saving results")
+prof.step("save")
 
 user_profiles.to_csv(P('user_profiles_with_clusters.csv'), index=False)
 print(f"    Saved user_profiles_with_clusters.csv")
@@ -270,4 +293,6 @@ print("  - user_profiles_with_clusters.csv")
 print("\nNext steps:")
 print("  1. Analyze cluster_summary.csv to name your personas")
 print("  2. Create compelling visualizations")
-print("  3. Write writeup.md connecting to churn/recommendations")
\ No newline at end of file
+print("  3. Write writeup.md connecting to churn/recommendations")
+
+prof.finish()